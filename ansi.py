@@ -0,0 +1,498 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BACKENDS = ("auto", "ansi", "rich")
+
+CSI = "\x1b["
+RESET = CSI + "0m"
+ENTER_SCREEN = CSI + "?1049h" + CSI + "?25l" + CSI + "2J" # Alternate screen, hide cursor
+LEAVE_SCREEN = RESET + CSI + "?25h" + CSI + "?1049l"
+CLEAR_SCREEN = RESET + CSI + "2J"
+HUD_STYLE = CSI + "0;1;97;40m" # Bold white on black
+SYNC_BEGIN = CSI + "?2026h" # DEC synchronized update: terminal holds the screen...
+SYNC_END = CSI + "?2026l" # ...until the frame is complete
+
+SYNC_MODES = ("auto", "on", "off")
+# TERM / TERM_PROGRAM substrings of terminals known to implement mode 2026
+SYNC_TERMS = ("kitty", "foot", "alacritty", "wezterm", "ghostty", "contour", "iterm", "vscode", "rio", "tmux")
+
+# Colour encodings, richest first. 'quantized' is truecolor with 8 levels per
+# channel, which makes longer runs of identical colour.
+DEPTHS = ("truecolor", "quantized", "256", "16")
+
+# Backpressure levels: (colour depth, frame rate multiplier), mildest first
+BACKPRESSURE_LEVELS = (("truecolor", 1.0), ("quantized", 1.0), ("256", 1.0), ("16", 1.0), ("16", 0.5))
+RATE_LEVELS = (("truecolor", 1.0), ("truecolor", 0.5), ("truecolor", 0.25)) # Rich: frame rate only
+
+# User-selectable colour depth ('color_depth'); 'auto' reads COLORTERM/TERM
+COLOR_DEPTHS = ("auto", "truecolor", "256", "16")
+
+# xterm's default values for the 16 ANSI colours
+XTERM_16 = ((0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0), (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+            (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0), (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255))
+LUT_BITS = 5 # Per channel: palette LUTs are 32x32x32
+LUT_WEIGHTS = (2.0, 4.0, 3.0) # Rough perceptual weighting of the RGB distance
+
+_lut_cache: Dict[str, Any] = {}
+
+def palette(depth: str) -> Tuple[Any, Any]:
+    """(indices, rgb) of the palette for '256' or '16'. 256 skips the 16 user-themed entries."""
+    if depth == "16":
+        return np.arange(16), np.array(XTERM_16, dtype=np.float32)
+    levels = np.array([0, 95, 135, 175, 215, 255], dtype=np.float32)
+    cube = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), -1).reshape(-1, 3)
+    grey = np.repeat((8 + 10 * np.arange(24, dtype=np.float32))[:, None], 3, axis=1)
+    return np.arange(16, 256), np.concatenate([cube, grey])
+
+def palette_lut(depth: str) -> Any:
+    """
+    (32, 32, 32) uint8 table of the nearest palette index for each 5-bit RGB
+    cell, built once per depth. Quantizing a plane is then one gather.
+    """
+    lut = _lut_cache.get(depth)
+    if lut is None:
+        idx, pal = palette(depth)
+        n = 1 << LUT_BITS
+        step = 256 // n
+        centres = np.arange(n, dtype=np.float32) * step + step // 2
+        cells = np.stack(np.meshgrid(centres, centres, centres, indexing='ij'), -1).reshape(-1, 3)
+        # Weighted nearest neighbour: argmin |p|^2 - 2 x.p (|x|^2 is the same for every p)
+        scale = np.sqrt(np.array(LUT_WEIGHTS, dtype=np.float32))
+        x, p = cells * scale, pal * scale
+        d = (p * p).sum(1)[None, :] - 2.0 * (x @ p.T)
+        lut = idx[np.argmin(d, axis=1)].astype(np.uint8).reshape(n, n, n)
+        _lut_cache[depth] = lut
+    return lut
+
+def quantize(rgb: Any, depth: str) -> Any:
+    """(..., 3) uint8 colours to uint32 palette indices for '256' or '16'."""
+    shift = 8 - LUT_BITS
+    return palette_lut(depth)[rgb[..., 0] >> shift, rgb[..., 1] >> shift, rgb[..., 2] >> shift].astype(np.uint32)
+
+def detect_depth(env: Optional[Dict[str, str]] = None) -> str:
+    """Colour depth the terminal advertises through COLORTERM / TERM."""
+    env = os.environ if env is None else env
+    if env.get("COLORTERM", "").lower() in ("truecolor", "24bit"): return "truecolor"
+    if env.get("WT_SESSION"): return "truecolor" # Windows Terminal
+    term = env.get("TERM", "").lower()
+    if "direct" in term or "truecolor" in term: return "truecolor"
+    if "256" in term: return "256"
+    return "16"
+
+def resolve_depth(mode: str, env: Optional[Dict[str, str]] = None) -> str:
+    return mode if mode in COLOR_DEPTHS[1:] else detect_depth(env)
+
+def poorer_depth(a: str, b: str) -> str:
+    """The lower of two DEPTHS (a user limit combined with backpressure)."""
+    return a if DEPTHS.index(a) >= DEPTHS.index(b) else b
+
+def resolve_backend(name: str, fd: int) -> str:
+    """'auto' picks the raw ANSI path on POSIX terminals and Rich everywhere else."""
+    if name == "auto":
+        try: tty = os.isatty(fd)
+        except Exception: tty = False
+        return "ansi" if tty and os.name != "nt" else "rich"
+    return name if name in BACKENDS else "rich"
+
+def sync_supported(mode: str = "auto", env: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Whether to wrap frames in synchronized-update sequences. 'auto' guesses from
+    the environment; terminals without mode 2026 ignore it, so a wrong guess only
+    costs a few bytes.
+    """
+    if mode in ("on", "off"): return mode == "on"
+    env = os.environ if env is None else env
+    if env.get("WT_SESSION"): return True # Windows Terminal
+    term = (env.get("TERM", "") + " " + env.get("TERM_PROGRAM", "")).lower()
+    return any(t in term for t in SYNC_TERMS)
+
+def hud_sequence(hud: str, top: int = 0) -> str:
+    """The HUD's lines (newline separated), one per screen row from row `top`."""
+    return "".join(f"{CSI}{top + i + 1};1H{HUD_STYLE}{line}" for i, line in enumerate(hud.split("\n")))
+
+class AnsiEncoder:
+    """
+    Encodes a FrameBuffer straight to SGR escape sequences.
+
+    Each row starts with a cursor move (so a miscounted wide glyph cannot shift
+    later rows). Cells are coalesced into runs of identical colours, and only the
+    changed half (fg or bg) is re-emitted between runs. Colour sequences are
+    pre-encoded once per colour and cached. A black background is left to the
+    terminal default, like the Rich path.
+
+    `depth` (see DEPTHS) selects the colour encoding; reduced depths also merge
+    similar colours into longer runs.
+    """
+    def __init__(self, depth: str = "truecolor") -> None:
+        self.depth = depth
+        self.fg_seq: Dict[int, str] = {}
+        self.bg_seq: Dict[int, str] = {}
+
+    def set_depth(self, depth: str) -> None:
+        if depth != self.depth:
+            self.depth = depth
+            self.fg_seq.clear()
+            self.bg_seq.clear()
+
+    def _sgr(self, key: int, ground: int) -> str:
+        """SGR for colour `key` in the current depth; `ground` is 3 (fg) or 4 (bg)."""
+        if self.depth == "256": return f"{CSI}{ground}8;5;{key}m"
+        if self.depth == "16": return f"{CSI}{ground + 6 if key > 7 else ground}{key & 7}m"
+        return f"{CSI}{ground}8;2;{key >> 16};{(key >> 8) & 255};{key & 255}m"
+
+    def _fg(self, key: int) -> str:
+        seq = self.fg_seq.get(key)
+        if seq is None:
+            if len(self.fg_seq) > 4096: self.fg_seq.clear()
+            seq = self.fg_seq[key] = self._sgr(key, 3)
+        return seq
+
+    def _bg(self, key: int) -> str:
+        seq = self.bg_seq.get(key)
+        if seq is None:
+            if len(self.bg_seq) > 4096: self.bg_seq.clear()
+            black = 16 if self.depth == "256" else 0
+            seq = self.bg_seq[key] = self._sgr(key, 4) if key != black else CSI + "49m"
+        return seq
+
+    def color_keys(self, rgb: Any) -> Any:
+        """(..., 3) uint8 colours to uint32 keys of the current depth (0xRRGGBB or a palette index)."""
+        if self.depth in ("256", "16"): return quantize(rgb, self.depth)
+        c = rgb.astype(np.uint32)
+        if self.depth == "quantized":
+            c = (c >> 5) * 255 // 7
+        return (c[..., 0] << 16) | (c[..., 1] << 8) | c[..., 2]
+
+    def planes(self, fb: Any, scale: Any = None) -> Tuple[Any, Any, Any]:
+        """
+        (chars, fg_keys, bg_keys) with colours as keys of the current depth,
+        upscaled to the screen by `scale` (a framebuffer.ScaleMap; None = 1:1).
+        Colours are converted at frame size, before the upscale.
+        """
+        planes = (fb.chars, self.color_keys(fb.fg), self.color_keys(fb.bg))
+        if scale is None: return planes
+        return tuple(scale.apply(p) for p in planes)
+
+    def encode(self, fb: Any, scale: Any = None, top: int = 0, hud: Optional[str] = None) -> bytes:
+        """
+        Bytes for a whole frame: optional HUD lines (newline separated) from
+        screen row `top`, then the framebuffer below them (upscaled by `scale`).
+        """
+        parts: List[str] = []
+        if hud is not None:
+            parts.append(hud_sequence(hud, top))
+            top += hud.count("\n") + 1
+        self.emit(parts, *self.planes(fb, scale), None, top)
+        return "".join(parts).encode('utf-8')
+
+    def emit(self, parts: List[str], chars: Any, fg_keys: Any, bg_keys: Any, draw: Any, top: int) -> None:
+        """
+        Append the SGR stream for the cells selected by the boolean mask `draw`
+        (None = every cell). Each horizontal span of selected cells starts with a
+        cursor move; inside a span a new run starts wherever fg or bg changes.
+        """
+        h, w = chars.shape
+        if w == 0 or h == 0: return
+        if draw is None:
+            draw = np.ones((h, w), dtype=bool)
+
+        # Span starts (selected cell after an unselected one or the row start)
+        jump = draw.copy()
+        jump[:, 1:] &= ~draw[:, :-1]
+        # Span ends, exclusive (the last column always ends a span, so spans never wrap)
+        last = draw.copy()
+        last[:, :-1] &= ~draw[:, 1:]
+        # Run starts: span starts plus colour changes inside a span
+        start = np.zeros((h, w), dtype=bool)
+        np.not_equal(fg_keys[:, 1:], fg_keys[:, :-1], out=start[:, 1:])
+        start[:, 1:] |= bg_keys[:, 1:] != bg_keys[:, :-1]
+        start &= draw
+        start |= jump
+
+        starts = np.flatnonzero(start)
+        if len(starts) == 0: return
+        span_ends = np.flatnonzero(last) + 1
+        ends = span_ends[np.searchsorted(span_ends, starts, side='right')]
+        np.minimum(ends[:-1], starts[1:], out=ends[:-1])
+        jumps = jump.ravel()[starts].tolist()
+        run_fg = fg_keys.ravel()[starts].tolist()
+        run_bg = bg_keys.ravel()[starts].tolist()
+        starts = starts.tolist()
+        ends = ends.tolist()
+
+        text = chars.tobytes().decode('utf-32-le')
+        cur_fg = cur_bg = -1
+        parts.append(RESET)
+        for i in range(len(starts)):
+            a = starts[i]
+            if jumps[i]:
+                parts.append(f"{CSI}{top + a // w + 1};{a % w + 1}H")
+            f, g = run_fg[i], run_bg[i]
+            if f != cur_fg:
+                parts.append(self._fg(f))
+                cur_fg = f
+            if g != cur_bg:
+                parts.append(self._bg(g))
+                cur_bg = g
+            parts.append(text[a:ends[i]])
+        parts.append(RESET)
+
+class DiffPresenter:
+    """
+    Damage-tracking output: keeps the last presented frame and emits only the
+    cells that changed since then.
+
+    The comparison runs on the logical planes before upscaling (one vectorized
+    compare per plane); a screen cell is dirty when its source cell is. Clean gaps of up to MERGE_GAP cells between dirty cells on a row are
+    redrawn rather than skipped, since a cursor move costs more than a few
+    cells. When more than `threshold` of the screen changed, or after
+    `invalidate()`, the whole frame is repainted instead (with a screen clear
+    if the size changed).
+
+    `snapshot` is an immutable record of the screen after the last frame;
+    `rebase()` makes the next diff relative to an older one (used when a queued
+    frame is dropped before it reached the terminal).
+    """
+    MERGE_GAP = 4
+
+    def __init__(self, encoder: Optional[AnsiEncoder] = None) -> None:
+        self.encoder = encoder or AnsiEncoder()
+        self.snapshot: Any = None # (chars, fg, bg, scale, hud, depth) as last presented
+        self.dirty_fraction = 1.0 # Of the last frame
+        self.full = True # Whether the last frame was a full repaint
+
+    def invalidate(self) -> None:
+        """Forget the screen contents (after a clear, resize or foreign output)."""
+        self.snapshot = None
+
+    def rebase(self, snapshot: Any) -> None:
+        """Diff the next frame against `snapshot` (None = unknown screen)."""
+        self.snapshot = snapshot
+
+    def present(self, fb: Any, scale: Any = None, hud: Optional[str] = None, threshold: float = 0.5) -> bytes:
+        """Bytes that bring the screen from the last presented frame to `fb` upscaled by `scale` (HUD lines on top)."""
+        prev = self.snapshot
+        depth = self.encoder.depth
+        if prev is None or prev[0].shape != fb.chars.shape or prev[3] is not scale or prev[5] != depth:
+            dirty = None
+        else:
+            dirty = fb.chars != prev[0]
+            dirty |= (fb.fg != prev[1]).any(axis=2)
+            dirty |= (fb.bg != prev[2]).any(axis=2)
+        self.dirty_fraction = 1.0 if dirty is None else float(np.count_nonzero(dirty)) / max(1, dirty.size)
+        self.full = dirty is None or self.dirty_fraction > threshold
+
+        parts: List[str] = []
+        if prev is None or prev[0].shape != fb.chars.shape or prev[3] is not scale:
+            parts.append(CLEAR_SCREEN)
+        if hud is not None and (self.full or hud != prev[4]):
+            parts.append(hud_sequence(hud))
+        top = 0 if hud is None else hud.count("\n") + 1
+        if self.full:
+            self.encoder.emit(parts, *self.encoder.planes(fb, scale), None, top)
+        elif self.dirty_fraction > 0:
+            draw = self._bridge(dirty)
+            if scale is not None: draw = scale.apply(draw)
+            self.encoder.emit(parts, *self.encoder.planes(fb, scale), draw, top)
+
+        # Remember what is on screen now (fresh copies: older snapshots may still be referenced)
+        self.snapshot = (fb.chars.copy(), fb.fg.copy(), fb.bg.copy(), scale, hud, depth)
+        return "".join(parts).encode('utf-8')
+
+    def _bridge(self, dirty: Any) -> Any:
+        """Dirty mask with short clean gaps between dirty cells of the same row filled in."""
+        h, w = dirty.shape
+        pos = np.flatnonzero(dirty)
+        if len(pos) < 2: return dirty
+        gap = pos[1:] - pos[:-1] - 1
+        same_row = (pos[1:] // w) == (pos[:-1] // w)
+        sel = same_row & (gap > 0) & (gap <= self.MERGE_GAP)
+        if not sel.any(): return dirty
+        # +1 after the left dirty cell, -1 at the right one; the running sum marks the gap
+        marks = np.zeros(h * w + 1, dtype=np.int32)
+        marks[pos[:-1][sel] + 1] = 1
+        marks[pos[1:][sel]] = -1
+        return dirty | (np.cumsum(marks[:-1]) > 0).reshape(h, w)
+
+class TerminalWriter:
+    """Alternate-screen session on a file descriptor; each frame is one os.write."""
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+
+    def __enter__(self) -> "TerminalWriter":
+        self.write(ENTER_SCREEN.encode())
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        try: self.write(LEAVE_SCREEN.encode())
+        except OSError: pass
+
+class FrameWriter:
+    """
+    Writer stage of the output pipeline: a thread that drains encoded frames to
+    a TerminalWriter while the render thread composes the next one.
+
+    The queue is one pending slot plus the frame being written (a double
+    buffer). Submitting while a frame is still pending drops the older one, so
+    a slow terminal gets the newest frame instead of a growing backlog. Each
+    frame carries the presenter snapshot it leaves on screen; `discard_pending()`
+    returns the snapshot of the last frame the writer took, so the replacement
+    can be diffed against what the terminal will actually show.
+
+    Throughput accounting: `busy_time` (read by Backpressure) is the total time
+    spent writing or held back by the `max_bandwidth` cap (bytes/s, 0 = unlimited);
+    `throughput`, a moving average of bytes/s while writing, is exported as a metric.
+    """
+    def __init__(self, term: TerminalWriter) -> None:
+        self.term = term
+        self.cond = threading.Condition()
+        self.pending: Any = None # (data, snapshot) waiting for the writer
+        self.on_screen: Any = None # Snapshot of the last frame taken by the writer
+        self.busy = False
+        self.running = True
+        self.error: Optional[BaseException] = None
+        self.written = 0
+        self.dropped = 0
+        self.max_bandwidth = 0 # Bytes per second, 0 = unlimited
+        self.next_slot = 0.0 # Earliest start of the next write under the cap
+        self.busy_time = 0.0
+        self.bytes_written = 0
+        self.throughput = 0.0
+        self.on_write: Optional[Callable[[int], None]] = None # Called with each write's duration (ns), on the writer thread
+        self.thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def discard_pending(self) -> Any:
+        """
+        Drop the pending frame, if any. Returns the snapshot of the last frame the
+        writer took (the screen state once it finishes), or False if nothing was
+        pending and the caller's own last snapshot still holds.
+        """
+        with self.cond:
+            if self.pending is None: return False
+            self.pending = None
+            self.dropped += 1
+            return self.on_screen
+
+    def submit(self, data: bytes, snapshot: Any = None) -> None:
+        """Queue a frame for writing, replacing any frame still pending."""
+        if self.error is not None: raise self.error
+        with self.cond:
+            if self.pending is not None: self.dropped += 1
+            self.pending = (data, snapshot)
+            self.cond.notify()
+
+    def drain(self, timeout: float = 1.0) -> None:
+        """Wait until everything queued has been written (before foreign output)."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while (self.pending is not None or self.busy) and self.error is None:
+                left = deadline - time.monotonic()
+                if left <= 0: break
+                self.cond.wait(left)
+
+    def close(self) -> None:
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1.0)
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while self.pending is None and self.running:
+                    self.cond.wait()
+                if self.pending is None: return
+                t0 = time.monotonic()
+                # Bandwidth cap: hold off until the budget allows another write, then take the newest frame
+                while self.running and self.max_bandwidth > 0:
+                    delay = self.next_slot - time.monotonic()
+                    if delay <= 0: break
+                    self.cond.wait(delay)
+                if self.pending is None: continue # Discarded while waiting
+                data, self.on_screen = self.pending
+                self.pending = None
+                self.busy = True
+            t1 = time.monotonic()
+            try:
+                self.term.write(data)
+                self.written += 1
+            except OSError as e:
+                self.error = e
+            t2 = time.monotonic()
+            if self.on_write is not None: self.on_write(int((t2 - t1) * 1e9))
+            n = len(data)
+            self.bytes_written += n
+            rate = n / max(t2 - t1, 1e-6)
+            self.throughput = rate if self.throughput <= 0 else self.throughput * 0.8 + rate * 0.2
+            cap = self.max_bandwidth
+            self.next_slot = t1 + n / cap if cap > 0 else 0.0
+            with self.cond:
+                self.busy_time += t2 - t0
+                self.busy = False
+                self.cond.notify_all()
+            if self.error is not None: return
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+class Backpressure:
+    """
+    Adapts output cost to what the terminal can take.
+
+    Every WINDOW seconds the writer's utilisation (share of wall time spent
+    writing, or waiting on the bandwidth cap) is checked. Above HIGH the level
+    steps down (see BACKPRESSURE_LEVELS: coarser colours first, then a lower
+    frame rate); after RECOVER_SEC below LOW it steps back up.
+    """
+    WINDOW = 0.5
+    HIGH = 0.85
+    LOW = 0.4
+    RECOVER_SEC = 3.0
+
+    def __init__(self, levels: Tuple[Tuple[str, float], ...] = BACKPRESSURE_LEVELS) -> None:
+        self.levels = levels
+        self.level = 0
+        self.utilisation = 0.0
+        now = time.monotonic()
+        self.mark = (now, 0.0) # (time, busy_time) at the start of the window
+        self.calm_since = now
+
+    @property
+    def depth(self) -> str: return self.levels[self.level][0]
+
+    @property
+    def fps_scale(self) -> float: return self.levels[self.level][1]
+
+    def update(self, busy_time: float, now: Optional[float] = None) -> None:
+        """Feed the writer's cumulative busy time (seconds)."""
+        now = time.monotonic() if now is None else now
+        t, busy = self.mark
+        if now - t < self.WINDOW: return
+        self.utilisation = min(1.0, (busy_time - busy) / (now - t))
+        self.mark = (now, busy_time)
+        if self.utilisation > self.HIGH:
+            self.level = min(len(self.levels) - 1, self.level + 1)
+            self.calm_since = now
+        elif self.utilisation < self.LOW:
+            if self.level > 0 and now - self.calm_since >= self.RECOVER_SEC:
+                self.level -= 1
+                self.calm_since = now
+        else:
+            self.calm_since = now
@@ -0,0 +1,295 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+from framebuffer import codes
+
+try:
+    from PIL import Image, ImageSequence # type: ignore
+except ImportError:
+    Image = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_BUDGET_MB = 64
+ALPHA_MIN = 50 # Alpha below this is transparent
+MAX_ASSET_SHARE = 0.5 # One image may use at most this share of the budget (caps long GIFs)
+CELL_BYTES = 4 + 3 + 1 + 1 + 1 + 4 # Per cell and frame: RGBA frames plus an ImageLayer's planes
+
+MISSING = object() # Cache lookup sentinel (None is a cached "unreadable" result)
+
+class AssetCache:
+    """
+    LRU cache bounded by a byte budget. Every entry is stored with its size;
+    inserting past the budget evicts the least recently used entries (the
+    newest one always stays, even if it alone is over budget). Thread-safe:
+    the asset loader fills it while the renderer reads.
+    """
+    def __init__(self, budget: int = DEFAULT_BUDGET_MB << 20) -> None:
+        self.budget = budget
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.lock = threading.RLock()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        with self.lock:
+            self.pop(key)
+            self.entries[key] = (value, nbytes)
+            self.used += nbytes
+            self.evict()
+
+    def pop(self, key: Hashable) -> None:
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None: self.used -= old[1]
+
+    def set_budget(self, budget: int) -> None:
+        if budget != self.budget:
+            with self.lock:
+                self.budget = budget
+                self.evict()
+
+    def evict(self) -> None:
+        with self.lock:
+            while self.used > self.budget and len(self.entries) > 1:
+                _, (_, nbytes) = self.entries.popitem(last=False)
+                self.used -= nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+class ImageLayer:
+    """
+    An image (all frames of a GIF) at one cell size, with everything compositing
+    needs precomputed per frame:
+
+    - rgb: (n, h, w, 3) uint8
+    - lum: (n, h, w) uint8 luminance
+    - visible: (n, h, w) bool, opaque and at least `thresh` bright (background layer)
+    - opaque: (n, h, w) bool, alpha only (foreground texture)
+    - chars: (n, h, w) uint32 codepoint of the luminance ramp in `char_set`
+
+    Planes are filled frame by frame (capacity grows by doubling, so the frame
+    count need not be known up front); only the first `n_ready` frames are
+    valid, so an animation can play while it is still being decoded.
+    """
+    PLANES = (("rgb", np.uint8, (3,)), ("lum", np.uint8, ()), ("opaque", bool, ()), ("visible", bool, ()), ("chars", np.uint32, ())) if np else ()
+
+    def __init__(self, capacity: int, h: int, w: int, char_set: str, thresh: float) -> None:
+        self.h, self.w = h, w
+        self.thresh = thresh
+        self.ramp = codes(char_set) if char_set else codes(" ")
+        self.capacity = 0
+        self.nbytes = 0
+        self.n_ready = 0
+        self.complete = False
+        self.reserve(max(1, capacity))
+
+    def reserve(self, capacity: int) -> bool:
+        """Make room for `capacity` frames. Returns True if the planes were reallocated."""
+        if capacity <= self.capacity: return False
+        for name, dtype, tail in self.PLANES:
+            plane = np.zeros((capacity, self.h, self.w) + tail, dtype=dtype)
+            if self.n_ready: plane[:self.n_ready] = getattr(self, name)[:self.n_ready]
+            setattr(self, name, plane) # Frames below n_ready are valid in both old and new planes
+        self.capacity = capacity
+        self.nbytes = sum(getattr(self, name).nbytes for name, _, _ in self.PLANES)
+        return True
+
+    def set_frames(self, start: int, rgba: Any) -> None:
+        """Fill frames start..start+len(rgba) from (k, h, w, 4) RGBA and publish them."""
+        end = start + len(rgba)
+        self.rgb[start:end] = rgba[..., :3]
+        alpha = rgba[..., 3]
+        lum = (0.299 * rgba[..., 0] + 0.587 * rgba[..., 1] + 0.114 * rgba[..., 2]) / 255.0
+        self.lum[start:end] = lum * 255.0
+        self.opaque[start:end] = alpha > ALPHA_MIN
+        self.visible[start:end] = (alpha >= ALPHA_MIN) & (lum >= self.thresh)
+        n = len(self.ramp)
+        self.chars[start:end] = self.ramp[np.clip((lum * (n - 1)).astype(int), 0, n - 1)]
+        self.n_ready = max(self.n_ready, end) # Last: readers only look at frames below n_ready
+
+    @property
+    def n_frames(self) -> int: return self.n_ready
+
+    def finish(self) -> None:
+        """Decoding ended: release unused capacity."""
+        n = max(1, self.n_ready)
+        if self.capacity > n:
+            for name, _, _ in self.PLANES:
+                setattr(self, name, getattr(self, name)[:n].copy())
+            self.capacity = n
+            self.nbytes = sum(getattr(self, name).nbytes for name, _, _ in self.PLANES)
+        self.complete = True
+
+    def frame(self, tick: int) -> int:
+        """Frame index for an animation tick (over the frames decoded so far)."""
+        return tick % max(1, self.n_ready)
+
+def _max_frames(cache: AssetCache, w: int, h: int) -> int:
+    return max(1, int(cache.budget * MAX_ASSET_SHARE) // max(1, w * h * CELL_BYTES))
+
+def _open_frames(path: str, w: int, h: int) -> Iterator[Any]:
+    """
+    (h, w, 4) RGBA arrays of the frames of the image at `path`, resized to (w, h)
+    cells, decoded lazily (the frame count of a GIF is not asked for: Pillow
+    would scan the whole file first).
+    """
+    im = Image.open(path)
+    frame_iter = ImageSequence.Iterator(im) if getattr(im, "is_animated", False) else [im]
+    for frame in frame_iter:
+        # Force RGBA for alpha channel support
+        yield np.asarray(frame.copy().resize((w, h)).convert("RGBA"), dtype=np.uint8)
+
+def layer_key(path: str, w: int, h: int, char_set: str, thresh: float) -> Tuple[Any, ...]:
+    return ("layer", path, w, h, char_set, thresh)
+
+def load_layer(path: str, w: int, h: int, char_set: str, thresh: float, cache: AssetCache,
+               cancelled: Optional[Callable[[], bool]] = None) -> Optional[ImageLayer]:
+    """
+    Build the ImageLayer for `path` at (w, h) into `cache`. Decoded frames are
+    cached separately once complete, so a new char set or threshold does not
+    read the file again. Otherwise frames are decoded one at a time and the
+    layer is put in the cache after the first one, so GIFs start playing
+    while the rest streams in. If `cancelled()` turns true between frames, the
+    partial layer is removed and None returned. Unreadable paths are cached as None.
+    """
+    key = layer_key(path, w, h, char_set, thresh)
+    frames_key = ("frames", path, w, h)
+    rgba = cache.get(frames_key)
+    if rgba is not None:
+        layer = ImageLayer(len(rgba), h, w, char_set, thresh)
+        layer.set_frames(0, rgba)
+        layer.finish()
+        cache.put(key, layer, layer.nbytes)
+        return layer
+
+    if not path or not os.path.exists(path) or Image is None or w <= 0 or h <= 0:
+        cache.put(key, None, 0)
+        return None
+    layer = None
+    try:
+        max_frames = _max_frames(cache, w, h)
+        decoded = []
+        for i, frame in enumerate(_open_frames(path, w, h)):
+            if i >= max_frames: break
+            if cancelled is not None and cancelled():
+                cache.pop(key)
+                return None
+            if layer is None:
+                layer = ImageLayer(1, h, w, char_set, thresh)
+            elif layer.reserve(min(max_frames, 2 * layer.capacity) if i >= layer.capacity else 0):
+                cache.put(key, layer, layer.nbytes) # Re-account the grown planes
+            layer.set_frames(i, frame[None])
+            decoded.append(frame)
+            if i == 0: cache.put(key, layer, layer.nbytes)
+        if layer is None: raise ValueError("no frames")
+        layer.finish()
+        cache.put(key, layer, layer.nbytes)
+        rgba = np.stack(decoded)
+        cache.put(frames_key, rgba, rgba.nbytes)
+        return layer
+    except Exception:
+        cache.put(key, None, 0)
+        return None
+
+# Shared by the renderer's background and foreground layers
+ASSETS = AssetCache()
+
+def image_layer(path: str, w: int, h: int, char_set: str, thresh: float, cache: AssetCache = ASSETS) -> Optional[ImageLayer]:
+    """ImageLayer for `path` at (w, h), from the cache or loaded synchronously."""
+    layer = cache.get(layer_key(path, w, h, char_set, thresh), MISSING)
+    if layer is not MISSING: return layer
+    return load_layer(path, w, h, char_set, thresh, cache)
+
+class AssetLoader:
+    """
+    Loads image layers on a worker thread so a new path or a resize never
+    stalls a frame.
+
+    Each slot (e.g. "bg", "fg") has at most one job: requesting a different
+    layer replaces a job that has not started and cancels one that is decoding
+    (checked between GIF frames), so rapid resizes do not queue up work.
+    Until the new layer has its first frame, `layer()` keeps returning the
+    slot's previous layer (possibly another size) or None.
+    """
+    def __init__(self, cache: AssetCache = ASSETS) -> None:
+        self.cache = cache
+        self.cond = threading.Condition()
+        self.pending: Dict[str, Tuple[Any, ...]] = {} # slot -> job args, not started
+        self.active: Dict[str, Any] = {} # slot -> key of the job being decoded
+        self.cancel: Dict[str, bool] = {} # slot -> cancel flag of the active job
+        self.shown: Dict[str, Any] = {} # slot -> last layer returned
+        self.thread: Optional[threading.Thread] = None
+
+    def layer(self, slot: str, path: str, w: int, h: int, char_set: str, thresh: float) -> Optional[ImageLayer]:
+        """The layer to draw in `slot` this frame (non-blocking)."""
+        key = layer_key(path, w, h, char_set, thresh)
+        layer = self.cache.get(key, MISSING)
+        if layer is not MISSING:
+            self._supersede(slot, key)
+            self.shown[slot] = layer
+            return layer
+        self._submit(slot, key, (path, w, h, char_set, thresh))
+        return self.shown.get(slot)
+
+    def busy(self) -> bool:
+        with self.cond:
+            return bool(self.pending or self.active)
+
+    def _supersede(self, slot: str, key: Any) -> None:
+        """Drop or cancel work in `slot` that is not for `key`."""
+        with self.cond:
+            job = self.pending.get(slot)
+            if job is not None and job[0] != key: del self.pending[slot]
+            if slot in self.active and self.active[slot] != key: self.cancel[slot] = True
+
+    def _submit(self, slot: str, key: Any, args: Tuple[Any, ...]) -> None:
+        with self.cond:
+            if self.active.get(slot) == key and not self.cancel.get(slot): return # Already decoding
+            job = self.pending.get(slot)
+            if job is not None and job[0] == key: return # Already queued
+            if slot in self.active: self.cancel[slot] = True
+            self.pending[slot] = (key,) + args
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="asset-loader", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                slot, job = next(iter(self.pending.items()))
+                del self.pending[slot]
+                self.active[slot] = job[0]
+                self.cancel[slot] = False
+            try:
+                load_layer(*job[1:], self.cache, cancelled=lambda: self.cancel.get(slot, False))
+            finally:
+                with self.cond:
+                    del self.active[slot]
+                    self.cancel.pop(slot, None)
@@ -1,68 +1,381 @@
 import threading
 import time
-from typing import Optional, List, Any
+from typing import Optional, Any, NamedTuple
 from logger import setup_logger
+from beat import BeatTracker
+from filterbank import bin_freqs
+from audio_sources import AudioSource, SoundDeviceSource
 
 logger = setup_logger("AudioEngine")
 
 try:
-    import sounddevice as sd # type: ignore
     import numpy as np
-    AUDIO_AVAILABLE = True
+except ImportError as e:
+    np = None
+    logger.critical(f"Audio libraries missing: {e}")
+
+try:
+    import sounddevice as sd # type: ignore
 except (ImportError, OSError) as e:
     sd = None
-    np = None
-    AUDIO_AVAILABLE = False
     logger.critical(f"Audio libraries missing: {e}")
 
+# Live capture needs both; file / pipe / synthetic sources only need numpy
+AUDIO_AVAILABLE = sd is not None and np is not None
+
+# Capture / STFT Settings
+FFT_SIZE = 2048 # Analysis window length (samples)
+HOP_SIZE = 512 # New samples between two spectrum frames
+MAX_FFT_SIZE = 16384
+RING_CAPACITY = 1 << 16 # ~1.5s @ 44.1kHz
+MAX_PENDING_HOPS = 4 # Drop stale hops instead of building up latency
+CAPTURE_MODES = ("blocking", "callback")
+ANALYSIS_MODES = ("stft", "multires")
+
+# Multi-resolution analysis
+MR_DECIMATION = 8 # Low band runs at sample_rate / 8 (~5.5kHz)
+MR_LONG_SIZE = 1024 # Decimated samples in the long window (~186ms, ~5.4Hz bins)
+MR_SHORT_SIZE = 512 # Full-rate samples in the short window (~12ms)
+MR_CROSSOVER = 500.0 # Hz, below: long window, above: short window
+MR_TAPS = 63 # Anti-alias FIR length
+MR_BINS = 1024 # Log-spaced output bins
+
+class AudioRing:
+    """
+    Preallocated float32 ring buffer fed by the PortAudio callback.
+
+    Single producer (callback) / single consumer (analysis thread), no locks:
+    the writer fills the samples first and only then advances `written`.
+    Every block is stored twice (mirrored halves), so any window of up to
+    `capacity` frames is a single contiguous slice and can be read without copying.
+    """
+    def __init__(self, capacity: int, channels: int) -> None:
+        self.capacity = capacity
+        self.channels = channels
+        self.data = np.zeros((capacity * 2, channels), dtype=np.float32)
+        self.written = 0 # Total frames written since creation (monotonic)
+        self.write_time = 0.0 # time.monotonic() of the last write
+        self.clock_start: Optional[float] = None # Offline sources: frames are timed by position from here
+        self.data_ready = threading.Event()
+
+    def write(self, block: Any) -> None:
+        """Copy a (frames, channels) block into the ring. Called from the audio callback."""
+        n = len(block)
+        total = n
+        if n > self.capacity:
+            block = block[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        pos = (self.written + total - n) % cap
+        first = min(n, cap - pos)
+        self.data[pos:pos + first] = block[:first]
+        self.data[pos + cap:pos + cap + first] = block[:first]
+        rest = n - first
+        if rest:
+            self.data[:rest] = block[first:]
+            self.data[cap:cap + rest] = block[first:]
+
+        self.write_time = time.monotonic()
+        self.written += total # Publish only after the samples are in place
+        self.data_ready.set()
+
+    def window(self, n: int, end: Optional[int] = None) -> Any:
+        """Zero-copy view of the `n` frames ending at absolute frame `end` (default: newest)."""
+        if end is None: end = self.written
+        start = (end - n) % self.capacity
+        return self.data[start:start + n]
+
+    def time_at(self, pos: int, rate: int) -> float:
+        """
+        Capture time of absolute frame `pos`: by sample position when the ring has a
+        `clock_start` (offline sources, which may run faster than real time), else
+        approximated from the wall-clock time of the last write.
+        """
+        if self.clock_start is not None:
+            return self.clock_start + pos / rate
+        return self.write_time - (self.written - pos) / rate
+
+class SpectrumAnalyzer:
+    """
+    Batched log-magnitude spectra for a stereo pair, allocation-free after construction.
+
+    The Hann window and every work buffer are cached per `size`. Left and right are
+    windowed into one (2, size) float32 stack and transformed by a single rfft; the
+    mono spectrum is derived as (L + R) / 2 in the complex domain (the FFT is linear),
+    so there is no third transform.
+    """
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.n_bins = size // 2
+        n_freqs = size // 2 + 1
+
+        self.window = np.hanning(size).astype(np.float32)
+        self.frames = np.empty((2, size), dtype=np.float32)
+        self.spec = np.empty((3, n_freqs), dtype=np.complex64) # mono, left, right
+        self.mag = np.empty((3, n_freqs), dtype=np.float32)
+        self.db = np.empty((3, self.n_bins), dtype=np.float32)
+        self._rfft_out = True # numpy < 2.0 has no out= on rfft
+
+    def process(self, left: Any, right: Any) -> Any:
+        """Returns a (3, n_bins) dB array (mono, left, right). Reused on the next call."""
+        np.multiply(left, self.window, out=self.frames[0])
+        np.multiply(right, self.window, out=self.frames[1])
+
+        lr = self.spec[1:]
+        if self._rfft_out:
+            try:
+                np.fft.rfft(self.frames, axis=-1, out=lr)
+            except TypeError:
+                self._rfft_out = False
+        if not self._rfft_out:
+            lr[...] = np.fft.rfft(self.frames, axis=-1)
+
+        np.add(lr[0], lr[1], out=self.spec[0])
+        self.spec[0] *= 0.5
+
+        # Log scaling
+        np.abs(self.spec, out=self.mag)
+        np.add(self.mag[:, :self.n_bins], 1e-9, out=self.db)
+        np.log10(self.db, out=self.db)
+        self.db *= 20
+        return self.db
+
+class MultiResAnalyzer:
+    """
+    Two-resolution spectra merged onto one log-frequency grid (MR_BINS bins, see filterbank.bin_freqs).
+
+    - Low band: the input is low-pass filtered and decimated incrementally (only the new
+      samples of each hop are filtered) into a mirrored history; a long window over that
+      history resolves bass notes a few Hz apart without a huge full-rate FFT.
+    - High band: a short full-rate window follows transients (hi-hats, snares) closely.
+    Both transforms are SpectrumAnalyzers (cached windows and buffers). Levels are
+    corrected to match a `ref_size` STFT so noise floor / sensitivity settings carry over,
+    and the merge is a precomputed two-tap interpolation into a preallocated output.
+    """
+    def __init__(self, sample_rate: int, ref_size: int) -> None:
+        self.sample_rate = sample_rate
+        self.ref_size = ref_size
+        self.n_bins = MR_BINS
+        self.decim = MR_DECIMATION
+        self.short_size = min(MR_SHORT_SIZE, ref_size)
+        self.long = SpectrumAnalyzer(MR_LONG_SIZE)
+        self.short = SpectrumAnalyzer(self.short_size)
+
+        # Windowed-sinc low-pass at 90% of the decimated Nyquist
+        n = np.arange(MR_TAPS) - (MR_TAPS - 1) / 2.0
+        fir = np.sinc(2 * (0.45 / self.decim) * n) * np.hamming(MR_TAPS)
+        self.fir = (fir / fir.sum()).astype(np.float32)
+
+        # Decimated stereo history (mirrored: the long window is always one slice)
+        self.hist = np.zeros((2, MR_LONG_SIZE * 2), dtype=np.float32)
+        self.hist_count = 0
+        self.last_end: Optional[int] = None # Absolute frame position of the last input
+        self.stereo = np.empty((2, ref_size), dtype=np.float32)
+
+        # Merge map: output bin -> two source bins in [long | short] and a blend weight
+        n_long = self.long.n_bins
+        n_short = self.short.n_bins
+        long_hz = (sample_rate / self.decim) / MR_LONG_SIZE
+        short_hz = sample_rate / self.short_size
+        freqs = bin_freqs("log", sample_rate, MR_BINS)
+        low = freqs < MR_CROSSOVER
+        pos = np.where(low, np.clip(freqs / long_hz, 0, n_long - 1),
+                       n_long + np.clip(freqs / short_hz, 0, n_short - 1))
+        self.i0 = np.floor(pos).astype(np.intp)
+        seg_end = np.where(low, n_long - 1, n_long + n_short - 1)
+        self.i1 = np.minimum(self.i0 + 1, seg_end) # Never blend across the crossover
+        self.w1 = (pos - self.i0).astype(np.float32)
+        self.w0 = (1.0 - self.w1).astype(np.float32)
+
+        # Window length gain: a tone's peak grows with the window, match the ref_size STFT
+        self.long_gain = float(20 * np.log10(ref_size / MR_LONG_SIZE))
+        self.short_gain = float(20 * np.log10(ref_size / self.short_size))
+        self.src = np.empty((3, n_long + n_short), dtype=np.float32)
+        self.tmp = np.empty((3, MR_BINS), dtype=np.float32)
+        self.db = np.empty((3, MR_BINS), dtype=np.float32)
+
+    def _decimate(self, left: Any, right: Any, end_pos: int) -> None:
+        """Filter and decimate the samples of this block not seen before into the history."""
+        n = len(left)
+        block_start = end_pos - n # Absolute position of left[0]
+        first_valid = block_start + MR_TAPS - 1 # First output with a full filter history
+        if self.last_end is None or self.last_end < first_valid or self.last_end > end_pos:
+            # First call or a gap (silence / skipped hops): restart the history
+            self.hist.fill(0.0)
+            lo = first_valid
+        else:
+            lo = self.last_end
+        self.last_end = end_pos
+
+        q0 = -(-lo // self.decim) * self.decim # Outputs sit on multiples of the decimation factor
+        if q0 >= end_pos: return
+        count = (end_pos - 1 - q0) // self.decim + 1
+
+        self.stereo[0, :n] = left
+        self.stereo[1, :n] = right
+        r0 = q0 - block_start - (MR_TAPS - 1) # Window start of the first output
+        taps = np.lib.stride_tricks.sliding_window_view(self.stereo[:, :n], MR_TAPS, axis=-1)
+        out = taps[:, r0:r0 + (count - 1) * self.decim + 1:self.decim] @ self.fir # (2, count)
+
+        cap = MR_LONG_SIZE
+        out = out[:, -cap:]
+        count = out.shape[1]
+        pos = self.hist_count % cap
+        first = min(count, cap - pos)
+        self.hist[:, pos:pos + first] = out[:, :first]
+        self.hist[:, pos + cap:pos + cap + first] = out[:, :first]
+        if count > first:
+            self.hist[:, :count - first] = out[:, first:]
+            self.hist[:, cap:cap + count - first] = out[:, first:]
+        self.hist_count += count
+
+    def process(self, left: Any, right: Any, end_pos: int) -> Any:
+        """`left`/`right` end at absolute frame `end_pos`. Returns a reused (3, MR_BINS) dB array."""
+        self._decimate(left, right, end_pos)
+
+        n_long = self.long.n_bins
+        start = self.hist_count % MR_LONG_SIZE
+        long_db = self.long.process(self.hist[0, start:start + MR_LONG_SIZE], self.hist[1, start:start + MR_LONG_SIZE])
+        np.add(long_db, self.long_gain, out=self.src[:, :n_long])
+        short_db = self.short.process(left[-self.short_size:], right[-self.short_size:])
+        np.add(short_db, self.short_gain, out=self.src[:, n_long:])
+
+        np.take(self.src, self.i0, axis=1, out=self.db)
+        self.db *= self.w0
+        np.take(self.src, self.i1, axis=1, out=self.tmp)
+        self.tmp *= self.w1
+        self.db += self.tmp
+        return self.db
+
+class AudioFrame(NamedTuple):
+    """
+    Immutable snapshot of one analysis hop.
+
+    AudioPump builds a complete frame and publishes it with a single reference swap,
+    so readers always see left/right/mono data, volume and beat state from the same
+    window. Arrays are read-only. `seq` increases by one per published frame.
+    """
+    seq: int
+    timestamp: float # time.monotonic() of the newest sample in the window
+    sample_rate: int
+    raw_fft: Any # dB spectra (fft_size // 2 bins)
+    raw_fft_left: Any
+    raw_fft_right: Any
+    raw_pcm: Any # Mono
+    raw_pcm_left: Any
+    raw_pcm_right: Any
+    volume: float
+    is_beat: bool
+    beat_confidence: float
+    bpm: float
+    beat_phase: float # 0 on the beat, rising towards 1 before the next one
+    beat_count: int # Beats detected so far; lets slower readers catch beats between snapshots
+    freq_layout: str = "linear" # Bin spacing of the spectra: "linear" (STFT) or "log" (multi-resolution)
+
 class AudioPump(threading.Thread):
     """
     Handles audio input, FFT processing, and beat detection in a separate thread.
+    Spectra are produced by a sliding-window STFT (`fft_size` window every `hop_size` frames).
     """
-    def __init__(self) -> None:
+    def __init__(self, source: Optional[AudioSource] = None) -> None:
         super().__init__()
         self.daemon = True
-        self.running: bool = True if AUDIO_AVAILABLE else False
+        self.source = source # None = live sounddevice input
+        self.running: bool = True if (AUDIO_AVAILABLE or (source is not None and np is not None)) else False
         self.device_index: Optional[int] = None
         self.lock = threading.Lock()
 
-        # Shared Data
-        if AUDIO_AVAILABLE:
-            self.raw_fft: Any = np.zeros(1024)
-            self.raw_fft_left: Any = np.zeros(1024)
-            self.raw_fft_right: Any = np.zeros(1024)
-            self.raw_pcm: Any = np.zeros(2048) # Mono
-            self.raw_pcm_left: Any = np.zeros(2048)
-            self.raw_pcm_right: Any = np.zeros(2048)
+        # Shared Data: one immutable AudioFrame, replaced with a single reference swap
+        if np is not None:
+            empty_fft: Any = np.zeros(FFT_SIZE // 2)
+            empty_pcm: Any = np.zeros(FFT_SIZE)
         else:
-            self.raw_fft = []
-            self.raw_fft_left = []
-            self.raw_fft_right = []
-            self.raw_pcm = []
-            self.raw_pcm_left = []
-            self.raw_pcm_right = []
-
-        self.volume: float = 0.0
+            empty_fft = []
+            empty_pcm = []
+        self.frame: AudioFrame = AudioFrame(0, 0.0, 44100, empty_fft, empty_fft, empty_fft,
+                                            empty_pcm, empty_pcm, empty_pcm, 0.0, False, 0.0, 0.0, 0.0, 0)
+        self._seq: int = 0
+        self._beat_count: int = 0
+        self.frame_ready = threading.Condition() # Notified on every published frame
+
         self.status: str = "IDLE"
         self.connected_device: str = "None"
         self.target_device_name: Optional[str] = None
 
-        # Beat Detection
-        self.is_beat: bool = False
-        self.beat_confidence: float = 0.0
-        self.last_beat_time: float = 0.0
-        self.energy_history: List[float] = []
+        # Beat Detection (spectral flux onsets + autocorrelation tempo)
         self.beat_thresh: float = 1.4 # Default
-        self.glitch_enabled: bool = False
+        self._beat_tracker: Optional[BeatTracker] = None
+
+        # Capture
+        self.capture_mode: str = "blocking"
+        self.overflow_count: int = 0
+        self.reconnect_count: int = 0 # Stream failures retried on the live device
+        self.analysis_mode: str = "stft"
+
+        # STFT (window length and hop are independent of the capture block size)
+        self.fft_size: int = FFT_SIZE
+        self.hop_size: int = HOP_SIZE
+        self.sample_rate: int = 44100
+        self._mono_buf: Any = np.zeros(FFT_SIZE, dtype=np.float32) if np is not None else None
+        self._analyzer: Optional[SpectrumAnalyzer] = None
+        self._mr_analyzer: Optional[MultiResAnalyzer] = None
+
+        # Last hop's analysis: compute time, and capture-to-publish latency (seconds)
+        self.analysis_time: float = 0.0
+        self.analysis_latency: float = 0.0
 
         self.sd = sd if AUDIO_AVAILABLE else None
-        self.np = np if AUDIO_AVAILABLE else None
+        self.np = np
+
+    # Legacy per-field access, all served from the current snapshot
+    raw_fft = property(lambda self: self.frame.raw_fft)
+    raw_fft_left = property(lambda self: self.frame.raw_fft_left)
+    raw_fft_right = property(lambda self: self.frame.raw_fft_right)
+    raw_pcm = property(lambda self: self.frame.raw_pcm)
+    raw_pcm_left = property(lambda self: self.frame.raw_pcm_left)
+    raw_pcm_right = property(lambda self: self.frame.raw_pcm_right)
+    volume = property(lambda self: self.frame.volume)
+    is_beat = property(lambda self: self.frame.is_beat)
+    beat_confidence = property(lambda self: self.frame.beat_confidence)
+    bpm = property(lambda self: self.frame.bpm)
+    beat_phase = property(lambda self: self.frame.beat_phase)
+    freq_layout = property(lambda self: self.frame.freq_layout)
+
+    def _publish(self, frame: "AudioFrame") -> None:
+        """Make `frame` the current snapshot (one atomic reference swap) and wake waiting renderers."""
+        self._seq += 1
+        frame = frame._replace(seq=self._seq)
+        with self.frame_ready:
+            self.frame = frame
+            self.frame_ready.notify_all()
+
+    def wait_for_frame(self, after_seq: int, timeout: float) -> "AudioFrame":
+        """Block until a frame newer than `after_seq` is published or `timeout` expires."""
+        with self.frame_ready:
+            if self.frame.seq == after_seq and timeout > 0:
+                self.frame_ready.wait_for(lambda: self.frame.seq != after_seq, timeout)
+            return self.frame
+
+    def _publish_silence(self, timestamp: Optional[float] = None) -> None:
+        """Keep the last spectra but report no volume and no beat."""
+        frame = self.frame
+        if timestamp is None: timestamp = time.monotonic()
+        self._publish(frame._replace(timestamp=timestamp, volume=0.0, is_beat=False, beat_confidence=0.0))
 
     def set_config(self, config: dict) -> None:
         """Update audio engine config safely."""
         try:
             self.beat_thresh = 1.0 + float(config.get('bass_thresh', 0.7)) # 0.7 -> 1.7 threshold
-            self.glitch_enabled = (float(config.get('glitch', 0.0)) > 0.0)
+            mode = str(config.get('capture_mode', 'blocking'))
+            if mode in CAPTURE_MODES: self.capture_mode = mode
+            mode = str(config.get('analysis_mode', 'stft'))
+            if mode in ANALYSIS_MODES: self.analysis_mode = mode
+
+            fft_size = int(config.get('fft_size', FFT_SIZE))
+            fft_size = max(256, min(MAX_FFT_SIZE, fft_size))
+            self.hop_size = max(64, min(fft_size, int(config.get('hop_size', HOP_SIZE))))
+            self.fft_size = fft_size
         except Exception: pass
 
     def set_device(self, dev_name: str) -> None:
@@ -137,19 +450,129 @@ class AudioPump(threading.Thread):
         except:
             self.device_index = None
 
-    def _process_fft(self, signal):
-        """Helper to compute FFT log magnitude"""
-        if len(signal) == 0: return np.zeros(1024)
-        win = signal * self.np.hanning(len(signal))
-        fft = self.np.abs(self.np.fft.rfft(win))[:1024]
-        # Log scaling
-        db = 20 * self.np.log10(fft + 1e-9)
-        return db
+    def _analyze_block(self, left: Any, right: Any, mono: Any, timestamp: float, end_pos: int = 0) -> None:
+        """Volume, FFTs and beat tracking for one STFT window of PCM, published as one AudioFrame."""
+        start = time.perf_counter()
+        volume = float(self.np.linalg.norm(mono) * 10) # Rough volume
+
+        if self.analysis_mode == "multires":
+            # Long decimated window for the bass, short window for the treble, on a log grid
+            mr = self._mr_analyzer
+            if mr is None or mr.sample_rate != self.sample_rate or mr.ref_size != len(left):
+                mr = self._mr_analyzer = MultiResAnalyzer(self.sample_rate, len(left))
+            spectra = mr.process(left, right, end_pos)
+            n_bins, layout = mr.n_bins, "log"
+        else:
+            # Compute FFTs (single batched pass: rows are mono, left, right)
+            if self._analyzer is None or self._analyzer.size != len(left):
+                self._analyzer = SpectrumAnalyzer(len(left))
+            spectra = self._analyzer.process(left, right)
+            n_bins, layout = self._analyzer.n_bins, "linear"
+
+        # Beat Detection (on the mono spectrum, constant cost per hop)
+        tracker = self._beat_tracker
+        if (tracker is None or tracker.n_bins != n_bins or tracker.layout != layout
+                or tracker.hop_size != self.hop_size or tracker.sample_rate != self.sample_rate):
+            tracker = self._beat_tracker = BeatTracker(self.sample_rate, self.hop_size, n_bins, layout)
+        if tracker.process(spectra[0], timestamp, self.beat_thresh):
+            self._beat_count += 1
+
+        # Snapshot: the work buffers are reused next hop, so copy out once into read-only arrays
+        fft = spectra.copy()
+        pcm = self.np.empty((3, len(mono)), dtype=self.np.float32)
+        pcm[0] = mono
+        pcm[1] = left
+        pcm[2] = right
+        fft.flags.writeable = False
+        pcm.flags.writeable = False
+
+        self._publish(AudioFrame(0, timestamp, self.sample_rate, fft[0], fft[1], fft[2],
+                                 pcm[0], pcm[1], pcm[2], volume, tracker.is_beat,
+                                 tracker.beat_confidence, tracker.bpm, tracker.beat_phase, self._beat_count, layout))
+        self.analysis_time = time.perf_counter() - start
+        self.analysis_latency = max(0.0, time.monotonic() - timestamp) # Ahead of the clock in fast offline mode
+
+    def _analyze_ring(self, ring: AudioRing, read_pos: int) -> int:
+        """
+        Sliding-window STFT: one spectrum per `hop_size` new frames, each over the
+        last `fft_size` frames in the ring. Returns the updated read position.
+        """
+        n = self.fft_size
+        hop = self.hop_size
+
+        # Behind by more than a few hops? Jump to the newest data.
+        if ring.written - read_pos > hop * MAX_PENDING_HOPS:
+            read_pos = ring.written - hop
+
+        while ring.written - read_pos >= hop:
+            read_pos += hop
+            block = ring.window(n, read_pos)
+            timestamp = ring.time_at(read_pos, self.sample_rate)
+
+            if not self.np.any(block):
+                self._publish_silence(timestamp)
+                continue
+
+            left = block[:, 0]
+            if ring.channels == 2:
+                right = block[:, 1]
+                if len(self._mono_buf) != n:
+                    self._mono_buf = self.np.zeros(n, dtype=self.np.float32)
+                mono = self._mono_buf
+                self.np.add(left, right, out=mono)
+                mono *= 0.5
+            else:
+                right = left
+                mono = left
+
+            self._analyze_block(left, right, mono, timestamp, read_pos)
+
+        return read_pos
+
+    def _run_source(self, source: AudioSource, keep_going: Optional[Any] = None) -> bool:
+        """
+        Pump `source` through the ring and the STFT until it ends (returns True),
+        the thread stops, or `keep_going()` turns False (returns False).
+        """
+        ring = AudioRing(RING_CAPACITY, source.channels)
+        self.sample_rate = source.sample_rate
+        read_pos = 0
+        reported_overflows = source.overflow_count
+
+        with source:
+            source.open(ring)
+            if source.sample_clock: ring.clock_start = time.monotonic()
+            while self.running and (keep_going is None or keep_going()):
+                if not source.fill(self.hop_size):
+                    return True
+
+                if source.overflow_count != reported_overflows:
+                    missed = source.overflow_count - reported_overflows
+                    self.overflow_count += missed
+                    logger.warning(f"Audio buffer overflow ({missed} since last report)")
+                    reported_overflows = source.overflow_count
+
+                read_pos = self._analyze_ring(ring, read_pos)
+        return False
 
     def run(self) -> None:
         if not self.running:
             return
 
+        if self.source is not None:
+            # Offline source (file / pipe / synthetic): play it once, then idle
+            self.connected_device = self.source.description
+            self.status = "STREAMING"
+            logger.info(f"Streaming from {self.connected_device}")
+            try:
+                self._run_source(self.source)
+                self.status = "END OF STREAM"
+            except Exception as e:
+                self.status = f"CRITICAL: {str(e)[:20]}"
+                logger.critical(f"Audio source failed: {e}", exc_info=True)
+            self._publish_silence()
+            return
+
         while self.running:
             try:
                 if self.device_index is None:
@@ -172,94 +595,22 @@ class AudioPump(threading.Thread):
                     time.sleep(1)
                     continue
 
-                # Open Stream in Blocking Mode (Robust)
+                # Open Stream (blocking reads by default, PortAudio callback when configured)
                 try:
-                    dev_info = self.sd.query_devices(self.device_index, 'input')
-                    rate = int(dev_info['default_samplerate'])
-                    self.connected_device = f"{dev_info['name']} @ {rate}Hz"
+                    mode = self.capture_mode
+                    source = SoundDeviceSource(self.sd, self.device_index, mode, self.hop_size)
+                    self.connected_device = source.description
                     self.status = "CONNECTED"
-                    logger.info(f"Connected to {self.connected_device}")
-
-                    # Safe blocksize logic
-                    blocksize = 2048
-
-                    # Try to open with 2 channels, but fallback if device only supports 1
-                    channels = 2
-                    if dev_info['max_input_channels'] < 2:
-                        channels = 1
-                        logger.info("Device only supports 1 channel. Forcing mono.")
-
-                    with self.sd.InputStream(device=self.device_index, channels=channels, samplerate=rate, blocksize=blocksize) as stream:
-                        while self.running and self.device_index is not None:
-                            # Check stream status
-                            if not stream.active:
-                                raise OSError("Stream inactive")
-
-                            # READ RAW DATA
-                            data, overflow = stream.read(blocksize)
-                            if overflow:
-                                logger.warning("Audio buffer overflow")
-
-                            if self.np.any(data):
-                                # Extract Channels
-                                if channels == 2:
-                                    left = data[:, 0]
-                                    right = data[:, 1]
-                                    # Mono mix for beat detection
-                                    mono = (left + right) / 2
-                                else:
-                                    # Mono Device
-                                    if len(data.shape) > 1:
-                                        mono = data[:, 0]
-                                    else:
-                                        mono = data
-                                    left = mono
-                                    right = mono
-
-                                # Store Raw PCM
-                                self.raw_pcm = mono
-                                self.raw_pcm_left = left
-                                self.raw_pcm_right = right
-
-                                self.volume = float(self.np.linalg.norm(mono) * 10) # Rough volume
-
-                                # Beat Detection (Simple Energy Based)
-                                if self.glitch_enabled:
-                                    # Focus on Bass frequencies (approx 20-150Hz)
-                                    # Assuming 44.1kHz / 2048 samples -> ~21.5Hz per bin.
-                                    # So bass is roughly first 10 bins
-                                    bass_energy = float(self.np.sum(self.np.abs(mono))) # Simplified overall energy for now
-
-                                    curr_time = time.time()
-                                    self.energy_history.append(bass_energy)
-                                    if len(self.energy_history) > 40: # ~1-2 seconds history
-                                        self.energy_history.pop(0)
-
-                                    avg_energy = sum(self.energy_history) / len(self.energy_history)
-
-                                    # Threshold: Instant energy > Thresh * average
-                                    if bass_energy > avg_energy * self.beat_thresh and (curr_time - self.last_beat_time) > 0.3:
-                                        self.is_beat = True
-                                        self.beat_confidence = min(1.0, (bass_energy / (avg_energy + 1e-5)) - 1.0)
-                                        self.last_beat_time = curr_time
-                                    else:
-                                        self.is_beat = False
-                                        self.beat_confidence = max(0.0, self.beat_confidence * 0.8) # Decay
-                                else:
-                                    self.is_beat = False
-
-                                # Compute FFTs
-                                self.raw_fft = self._process_fft(mono)
-                                self.raw_fft_left = self._process_fft(left)
-                                self.raw_fft_right = self._process_fft(right)
-                            else:
-                                self.volume = 0.0
-                                self.is_beat = False
+                    logger.info(f"Connected to {self.connected_device} ({mode} capture)")
+
+                    # Runs until the device or capture mode changes (or the stream fails)
+                    self._run_source(source, lambda: self.device_index is not None and self.capture_mode == mode)
                 except (OSError, self.sd.PortAudioError) as e:
                     self.status = f"AUDIO ERROR: {str(e)[:15]}... RETRYING"
                     logger.error(f"Audio stream error: {e}")
-                    self.volume = 0.0
+                    self._publish_silence()
                     self.device_index = None # Force re-resolution
+                    self.reconnect_count += 1
                     time.sleep(2) # Cooldown before reconnect
 
             except KeyboardInterrupt:
@@ -268,5 +619,5 @@ class AudioPump(threading.Thread):
             except Exception as e:
                 self.status = f"CRITICAL: {str(e)[:20]}"
                 logger.critical(f"Unexpected error in audio loop: {e}", exc_info=True)
-                self.volume = 0.0
+                self._publish_silence()
                 time.sleep(2)
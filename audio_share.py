@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+from typing import Any, Optional
+from logger import setup_logger
+from audio_engine import AudioPump, AudioFrame, FFT_SIZE, MAX_FFT_SIZE
+from audio_sources import AudioSource
+
+logger = setup_logger("AudioShare")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python < 3.8
+    shared_memory = None
+
+SHM_NAME = "pyviz_audio"
+MAGIC = 0x5A495650 # "PVIZ"
+LAYOUT_VERSION = 2
+N_SLOTS = 32 # Frames kept in the slot ring (~0.37s @ 44.1kHz / 512 hop)
+MAX_BINS = MAX_FFT_SIZE // 2
+MAX_PCM = MAX_FFT_SIZE
+TEXT_LEN = 64
+HEARTBEAT_SEC = 0.5 # Analyzer refreshes the header this often, even in silence
+STALE_SEC = 3.0 # Heartbeat older than this: analyzer is gone
+POLL_SEC = 0.001 # Reader poll interval while waiting for a new frame
+
+if np is not None:
+    HEADER_DTYPE = np.dtype([
+        ('magic', '<u4'), ('version', '<u4'), ('n_slots', '<u4'), ('max_bins', '<u4'), ('max_pcm', '<u4'),
+        ('pid', '<u4'), ('latest', '<i8'), ('heartbeat', '<f8'), ('overflow_count', '<i8'),
+        ('status', f'S{TEXT_LEN}'), ('device', f'S{TEXT_LEN}'),
+    ], align=True)
+    SLOT_DTYPE = np.dtype([
+        ('seq', '<i8'), ('timestamp', '<f8'), ('sample_rate', '<i8'), ('n_bins', '<i8'), ('n_pcm', '<i8'),
+        ('volume', '<f8'), ('is_beat', '<i8'), ('beat_confidence', '<f8'), ('bpm', '<f8'),
+        ('beat_phase', '<f8'), ('beat_count', '<i8'), ('log_bins', '<i8'),
+    ], align=True)
+
+def _align(n: int) -> int:
+    return (n + 63) & ~63
+
+def _layout_size() -> int:
+    return (_align(HEADER_DTYPE.itemsize) + _align(SLOT_DTYPE.itemsize * N_SLOTS)
+            + N_SLOTS * 3 * (MAX_BINS + MAX_PCM) * 4)
+
+def _map_layout(buf: Any) -> tuple:
+    """numpy views over the shared block: header, slot table, spectra, PCM."""
+    off = 0
+    header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buf, offset=off)
+    off += _align(HEADER_DTYPE.itemsize)
+    slots = np.ndarray((N_SLOTS,), dtype=SLOT_DTYPE, buffer=buf, offset=off)
+    off += _align(SLOT_DTYPE.itemsize * N_SLOTS)
+    fft = np.ndarray((N_SLOTS, 3, MAX_BINS), dtype=np.float32, buffer=buf, offset=off)
+    off += fft.nbytes
+    pcm = np.ndarray((N_SLOTS, 3, MAX_PCM), dtype=np.float32, buffer=buf, offset=off)
+    return header, slots, fft, pcm
+
+def _attach(name: str) -> Any:
+    """Open an existing block without handing it to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 every attach is tracked and unlinked when *this* process exits
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception: pass
+    return shm
+
+def analyzer_running(name: str = SHM_NAME) -> bool:
+    """True if an analysis server is publishing under `name`."""
+    if shared_memory is None or np is None: return False
+    try:
+        shm = _attach(name)
+    except (FileNotFoundError, OSError, ValueError):
+        return False
+    ok = False
+    if shm.size >= _layout_size():
+        header = _map_layout(shm.buf)[0]
+        ok = (int(header['magic'][0]) == MAGIC and int(header['version'][0]) == LAYOUT_VERSION
+              and time.monotonic() - float(header['heartbeat'][0]) < STALE_SEC)
+        del header # Release the view before closing the mapping
+    shm.close()
+    return ok
+
+class SharedAudioServer:
+    """
+    Writer side of the shared analysis block.
+
+    The block holds a header and a ring of N_SLOTS frame slots (scalars, 3 spectra,
+    3 PCM windows). Publishing uses a per-slot seqlock: the slot's `seq` is set to -1,
+    the data is written, then `seq` is set to the frame's sequence number and only
+    after that the header's `latest` is advanced. Readers check `seq` before and
+    after reading, so a torn slot is never accepted.
+    """
+    def __init__(self, name: str = SHM_NAME) -> None:
+        self.name = name
+        size = _layout_size()
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if analyzer_running(name):
+                raise RuntimeError(f"Audio analyzer already running ({name})")
+            # Left behind by a crashed analyzer: take it over
+            logger.warning(f"Removing stale shared audio block '{name}'")
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.header, self.slots, self.fft, self.pcm = _map_layout(self.shm.buf)
+        self.slots['seq'] = -1
+        h = self.header[0]
+        h['n_slots'] = N_SLOTS
+        h['max_bins'] = MAX_BINS
+        h['max_pcm'] = MAX_PCM
+        h['pid'] = os.getpid()
+        h['latest'] = 0
+        h['version'] = LAYOUT_VERSION
+        h['magic'] = MAGIC # Last: marks the block as initialised
+        self.heartbeat("IDLE", "None", 0)
+
+    def write(self, frame: AudioFrame) -> None:
+        i = frame.seq % N_SLOTS
+        slot = self.slots[i]
+        slot['seq'] = -1 # Odd state: readers will retry
+
+        n_bins = min(len(frame.raw_fft), MAX_BINS)
+        n_pcm = min(len(frame.raw_pcm), MAX_PCM)
+        fft = self.fft[i]
+        fft[0, :n_bins] = frame.raw_fft[:n_bins]
+        fft[1, :n_bins] = frame.raw_fft_left[:n_bins]
+        fft[2, :n_bins] = frame.raw_fft_right[:n_bins]
+        pcm = self.pcm[i]
+        pcm[0, :n_pcm] = frame.raw_pcm[:n_pcm]
+        pcm[1, :n_pcm] = frame.raw_pcm_left[:n_pcm]
+        pcm[2, :n_pcm] = frame.raw_pcm_right[:n_pcm]
+
+        slot['timestamp'] = frame.timestamp
+        slot['sample_rate'] = frame.sample_rate
+        slot['n_bins'] = n_bins
+        slot['n_pcm'] = n_pcm
+        slot['volume'] = frame.volume
+        slot['is_beat'] = 1 if frame.is_beat else 0
+        slot['beat_confidence'] = frame.beat_confidence
+        slot['bpm'] = frame.bpm
+        slot['beat_phase'] = frame.beat_phase
+        slot['beat_count'] = frame.beat_count
+        slot['log_bins'] = 1 if frame.freq_layout == "log" else 0
+        slot['seq'] = frame.seq
+        self.header[0]['latest'] = frame.seq
+
+    def heartbeat(self, status: str, device: str, overflow_count: int) -> None:
+        h = self.header[0]
+        h['status'] = status.encode('utf-8', 'replace')[:TEXT_LEN]
+        h['device'] = device.encode('utf-8', 'replace')[:TEXT_LEN]
+        h['overflow_count'] = overflow_count
+        h['heartbeat'] = time.monotonic()
+
+    def close(self) -> None:
+        self.header[0]['heartbeat'] = 0.0 # Tell readers we are gone
+        del self.header, self.slots, self.fft, self.pcm
+        self.shm.close()
+        try: self.shm.unlink()
+        except FileNotFoundError: pass
+
+class SharedAudioPump(AudioPump):
+    """AudioPump that also publishes every frame into a SharedAudioServer."""
+    def __init__(self, server: SharedAudioServer, source: Optional[AudioSource] = None) -> None:
+        super().__init__(source)
+        self.server = server
+
+    def _publish(self, frame: AudioFrame) -> None:
+        super()._publish(frame)
+        self.server.write(self.frame)
+
+    def heartbeat(self) -> None:
+        self.server.heartbeat(self.status, self.connected_device, self.overflow_count)
+
+class SharedAudioClient:
+    """
+    Read-only view of a running analysis server, usable wherever an AudioPump is.
+
+    Each new frame's spectra and PCM are copied out of its slot between the two
+    seqlock checks, so a frame stays intact however long it is held after the
+    analyzer has reused the slot (one ~37 KB copy per published hop). Device and analysis settings
+    belong to the analyzer, which reads the settings file itself; set_config and
+    set_device are accepted and ignored.
+    """
+    def __init__(self, name: str = SHM_NAME) -> None:
+        if shared_memory is None or np is None:
+            raise RuntimeError("Shared audio needs numpy and Python 3.8+")
+        self.name = name
+        self.shm = _attach(name)
+        if self.shm.size < _layout_size():
+            self.shm.close()
+            raise RuntimeError(f"Shared audio block '{name}' has an unexpected size")
+        self.header, self.slots, self.fft, self.pcm = _map_layout(self.shm.buf)
+        h = self.header[0]
+        if int(h['magic']) != MAGIC or int(h['version']) != LAYOUT_VERSION:
+            self.close()
+            raise RuntimeError(f"Shared audio block '{name}' has an unknown layout")
+
+        self.running = True
+        self._frame: AudioFrame = AudioFrame(0, 0.0, 44100, np.zeros(FFT_SIZE // 2), np.zeros(FFT_SIZE // 2),
+                                             np.zeros(FFT_SIZE // 2), np.zeros(FFT_SIZE), np.zeros(FFT_SIZE),
+                                             np.zeros(FFT_SIZE), 0.0, False, 0.0, 0.0, 0.0, 0)
+
+    # Thread-style lifecycle, so the engine can treat it like an AudioPump
+    def start(self) -> None: pass
+    def is_alive(self) -> bool: return self.shm is not None
+    def join(self, timeout: Optional[float] = None) -> None: self.close()
+
+    def set_config(self, config: dict) -> None: pass
+    def set_device(self, dev_name: str) -> None: pass
+
+    def close(self) -> None:
+        self.running = False
+        if self.shm is None: return
+        shm, self.shm = self.shm, None
+        del self.header, self.slots, self.fft, self.pcm
+        try:
+            shm.close()
+        except BufferError:
+            pass # Frames still referenced; the mapping goes away with the process
+
+    @property
+    def alive(self) -> bool:
+        """Analyzer heartbeat is recent."""
+        return self.shm is not None and time.monotonic() - float(self.header[0]['heartbeat']) < STALE_SEC
+
+    @property
+    def frame(self) -> AudioFrame:
+        """Newest complete frame (cached until the analyzer publishes another one)."""
+        if self.shm is None: return self._frame
+        for _ in range(8):
+            latest = int(self.header[0]['latest'])
+            if latest == self._frame.seq or latest <= 0: return self._frame
+            i = latest % N_SLOTS
+            slot = self.slots[i]
+            if int(slot['seq']) != latest: continue # Being rewritten, retry
+            meta = slot.copy()
+            n_bins = int(meta['n_bins'])
+            n_pcm = int(meta['n_pcm'])
+            fft = self.fft[i, :, :n_bins].copy()
+            pcm = self.pcm[i, :, :n_pcm].copy()
+            if int(slot['seq']) != latest: continue # Overwritten while copying
+
+            fft.flags.writeable = False
+            pcm.flags.writeable = False
+            self._frame = AudioFrame(latest, float(meta['timestamp']), int(meta['sample_rate']),
+                                     fft[0], fft[1], fft[2], pcm[0], pcm[1], pcm[2],
+                                     float(meta['volume']), bool(meta['is_beat']), float(meta['beat_confidence']),
+                                     float(meta['bpm']), float(meta['beat_phase']), int(meta['beat_count']),
+                                     "log" if meta['log_bins'] else "linear")
+            break
+        return self._frame
+
+    def wait_for_frame(self, after_seq: int, timeout: float) -> AudioFrame:
+        """Poll the header until a frame newer than `after_seq` appears or `timeout` expires."""
+        deadline = time.monotonic() + timeout
+        while self.shm is not None and int(self.header[0]['latest']) == after_seq:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            time.sleep(min(POLL_SEC, remaining))
+        return self.frame
+
+    # AudioPump-compatible read-only fields
+    raw_fft = property(lambda self: self.frame.raw_fft)
+    raw_fft_left = property(lambda self: self.frame.raw_fft_left)
+    raw_fft_right = property(lambda self: self.frame.raw_fft_right)
+    raw_pcm = property(lambda self: self.frame.raw_pcm)
+    raw_pcm_left = property(lambda self: self.frame.raw_pcm_left)
+    raw_pcm_right = property(lambda self: self.frame.raw_pcm_right)
+    volume = property(lambda self: self.frame.volume)
+    is_beat = property(lambda self: self.frame.is_beat)
+    beat_confidence = property(lambda self: self.frame.beat_confidence)
+    bpm = property(lambda self: self.frame.bpm)
+    beat_phase = property(lambda self: self.frame.beat_phase)
+    sample_rate = property(lambda self: self.frame.sample_rate)
+    freq_layout = property(lambda self: self.frame.freq_layout)
+
+    @property
+    def status(self) -> str:
+        if not self.alive: return "ANALYZER OFFLINE"
+        return "SHARED " + bytes(self.header[0]['status']).decode('utf-8', 'replace')
+
+    @property
+    def connected_device(self) -> str:
+        if self.shm is None: return "None"
+        return bytes(self.header[0]['device']).decode('utf-8', 'replace')
+
+    @property
+    def overflow_count(self) -> int:
+        if self.shm is None: return 0
+        return int(self.header[0]['overflow_count'])
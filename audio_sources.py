@@ -0,0 +1,326 @@
+import os
+import struct
+import sys
+import time
+from typing import Any, Optional, BinaryIO
+from logger import setup_logger
+
+logger = setup_logger("AudioSources")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SYNTH_KINDS = ("sine", "sweep", "noise", "clicks")
+
+class AudioSource:
+    """
+    Something the analysis pipeline can pull PCM from.
+
+    A source is opened against an AudioRing and then asked to `fill()` it: each call
+    blocks until roughly one hop of new float32 (frames, channels) data has been
+    written, and returns False once the stream has ended. Offline sources pace
+    themselves to real time unless `realtime` is False (benchmark mode).
+
+    `sample_clock` sources are timed by sample position rather than by when their
+    blocks arrive, so beat timing stays right however fast they are pumped.
+    """
+    sample_clock = True
+
+    def __init__(self, sample_rate: int = 44100, channels: int = 2, realtime: bool = True) -> None:
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.realtime = realtime
+        self.overflow_count = 0
+        self.description = "Source"
+        self.ring: Any = None
+        self._t0 = 0.0
+        self._frames_out = 0
+
+    def open(self, ring: Any) -> None:
+        self.ring = ring
+        self._t0 = time.monotonic()
+        self._frames_out = 0
+
+    def fill(self, hop: int) -> bool:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.ring = None
+
+    def __enter__(self) -> "AudioSource":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _pace(self, frames: int) -> None:
+        """Sleep so that output does not run ahead of the wall clock (real-time sources only)."""
+        self._frames_out += frames
+        if not self.realtime: return
+        target = self._t0 + self._frames_out / self.sample_rate
+        wait = target - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        elif wait < -0.5:
+            # Stalled (debugger, suspend): restart the clock rather than bursting to catch up
+            self._t0 = time.monotonic() - self._frames_out / self.sample_rate
+
+class SoundDeviceSource(AudioSource):
+    """Live input through sounddevice, with blocking reads or a PortAudio callback."""
+    sample_clock = False # Blocks arrive in real time; stamp them on arrival
+
+    def __init__(self, sd: Any, device_index: int, mode: str = "blocking", blocksize: int = 512) -> None:
+        super().__init__()
+        self.sd = sd
+        self.device_index = device_index
+        self.mode = mode
+        self.blocksize = blocksize
+        self.stream: Any = None
+
+        dev_info = sd.query_devices(device_index, 'input')
+        self.sample_rate = int(dev_info['default_samplerate'])
+        self.description = f"{dev_info['name']} @ {self.sample_rate}Hz"
+
+        # Try to open with 2 channels, but fallback if device only supports 1
+        self.channels = 2
+        if dev_info['max_input_channels'] < 2:
+            self.channels = 1
+            logger.info("Device only supports 1 channel. Forcing mono.")
+
+    def open(self, ring: Any) -> None:
+        super().open(ring)
+        if self.mode == "callback":
+            def on_audio(indata, frames, time_info, status):
+                # Runs on the PortAudio thread: no logging, no allocation
+                if status and status.input_overflow:
+                    self.overflow_count += 1
+                ring.write(indata)
+
+            self.stream = self.sd.InputStream(device=self.device_index, channels=self.channels,
+                                              samplerate=self.sample_rate, dtype='float32', callback=on_audio)
+        else:
+            self.stream = self.sd.InputStream(device=self.device_index, channels=self.channels,
+                                              samplerate=self.sample_rate, blocksize=self.blocksize)
+        self.stream.start()
+
+    def fill(self, hop: int) -> bool:
+        if self.mode == "callback":
+            # PortAudio writes into the ring on its own; just wait for it
+            if not self.ring.data_ready.wait(timeout=1.0):
+                raise OSError("Stream inactive")
+            self.ring.data_ready.clear()
+            return True
+
+        # Check stream status
+        if not self.stream.active:
+            raise OSError("Stream inactive")
+
+        # READ RAW DATA
+        data, overflow = self.stream.read(hop)
+        if overflow:
+            self.overflow_count += 1
+        self.ring.write(data)
+        return True
+
+    def close(self) -> None:
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception: pass
+            self.stream = None
+        super().close()
+
+class FileSource(AudioSource):
+    """
+    WAV or headerless f32le file, memory-mapped so blocks are read straight from the page cache.
+
+    WAV supports 8/16/32-bit integer and 32-bit float PCM. `loop` restarts at the end;
+    `realtime=False` streams as fast as the analyzer can consume (benchmarks).
+    """
+    def __init__(self, path: str, loop: bool = False, realtime: bool = True,
+                 sample_rate: int = 44100, channels: int = 2) -> None:
+        super().__init__(sample_rate, channels, realtime)
+        self.path = path
+        self.loop = loop
+        self.pos = 0
+
+        if path.lower().endswith(".wav"):
+            dtype, offset, n_bytes = self._parse_wav(path)
+        else:
+            # Raw f32le: caller supplies rate and channel count
+            dtype, offset = np.dtype('<f4'), 0
+            n_bytes = os.path.getsize(path)
+
+        frame_bytes = dtype.itemsize * self.channels
+        self.frames = n_bytes // frame_bytes
+        if self.frames <= 0:
+            raise ValueError(f"No audio data in {path}")
+
+        self.data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(self.frames, self.channels))
+        # Integer PCM is rescaled to [-1, 1) while copying into the scratch block
+        self.offset, self.scale = 0.0, 1.0
+        if dtype.kind == 'u': self.offset, self.scale = 128.0, 1.0 / 128.0
+        elif dtype.kind == 'i': self.scale = 1.0 / float(2 ** (8 * dtype.itemsize - 1))
+        self.scratch = np.zeros((0, self.channels), dtype=np.float32)
+        self.description = f"{os.path.basename(path)} @ {self.sample_rate}Hz"
+
+    def _parse_wav(self, path: str) -> Any:
+        """Walk the RIFF chunks for 'fmt ' and 'data'. Returns (dtype, data offset, data bytes)."""
+        with open(path, 'rb') as f:
+            riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError(f"Not a WAV file: {path}")
+
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"WAV file has no data chunk: {path}")
+                chunk_id, size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(size)
+                    if size % 2: f.read(1)
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        raise ValueError(f"WAV data before fmt chunk: {path}")
+                    offset = f.tell()
+                    n_bytes = min(size, os.path.getsize(path) - offset)
+                    break
+                else:
+                    f.seek(size + (size % 2), 1)
+
+        tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+        if tag == 0xFFFE and len(fmt) >= 26: # WAVE_FORMAT_EXTENSIBLE: real tag in the subformat GUID
+            tag = struct.unpack('<H', fmt[24:26])[0]
+
+        if tag == 3 and bits == 32: dtype = np.dtype('<f4')
+        elif tag == 1 and bits == 8: dtype = np.dtype('u1')
+        elif tag == 1 and bits == 16: dtype = np.dtype('<i2')
+        elif tag == 1 and bits == 32: dtype = np.dtype('<i4')
+        else:
+            raise ValueError(f"Unsupported WAV format (tag {tag}, {bits} bit): {path}")
+
+        self.sample_rate = rate
+        self.channels = channels
+        return dtype, offset, n_bytes
+
+    def fill(self, hop: int) -> bool:
+        if self.pos >= self.frames:
+            if not self.loop: return False
+            self.pos = 0
+
+        n = min(hop, self.frames - self.pos)
+        if len(self.scratch) < n:
+            self.scratch = np.zeros((n, self.channels), dtype=np.float32)
+        block = self.scratch[:n]
+        np.copyto(block, self.data[self.pos:self.pos + n], casting='unsafe')
+        if self.offset: block -= self.offset
+        if self.scale != 1.0: block *= self.scale
+
+        self.ring.write(block)
+        self.pos += n
+        self._pace(n)
+        return True
+
+class PipeSource(AudioSource):
+    """Interleaved f32le samples from a pipe, e.g. `ffmpeg ... -f f32le - | pyviz.py --engine --source pipe`."""
+    def __init__(self, stream: Optional[BinaryIO] = None, sample_rate: int = 44100, channels: int = 2) -> None:
+        super().__init__(sample_rate, channels, realtime=False) # The writer sets the pace
+        self.stream = stream if stream is not None else sys.stdin.buffer
+        self.raw = bytearray(0)
+        self.description = f"stdin f32le @ {sample_rate}Hz"
+
+    def fill(self, hop: int) -> bool:
+        n_bytes = hop * self.channels * 4
+        if len(self.raw) != n_bytes:
+            self.raw = bytearray(n_bytes)
+        view = memoryview(self.raw)
+
+        got = 0
+        while got < n_bytes:
+            n = self.stream.readinto(view[got:])
+            if not n: break # EOF
+            got += n
+
+        frames = got // (self.channels * 4)
+        if frames == 0: return False
+        block = np.frombuffer(self.raw, dtype='<f4', count=frames * self.channels).reshape(frames, self.channels)
+        self.ring.write(block)
+        self._pace(frames)
+        return True
+
+class SyntheticSource(AudioSource):
+    """
+    Deterministic test signals, identical on every run for a given seed:
+    - sine: steady tone at `freq`
+    - sweep: logarithmic 20 Hz -> 20 kHz sweep repeating every `period` seconds
+    - noise: white noise
+    - clicks: decaying noise bursts on a `bpm` grid (beat tracker reference)
+    """
+    def __init__(self, kind: str = "sweep", sample_rate: int = 44100, channels: int = 2, realtime: bool = True,
+                 seed: int = 0, freq: float = 440.0, period: float = 10.0, bpm: float = 120.0, amp: float = 0.5) -> None:
+        super().__init__(sample_rate, channels, realtime)
+        if kind not in SYNTH_KINDS:
+            raise ValueError(f"Unknown synthetic signal '{kind}' (choose from {', '.join(SYNTH_KINDS)})")
+        self.kind = kind
+        self.seed = seed
+        self.freq = freq
+        self.period = period
+        self.bpm = bpm
+        self.amp = amp
+        self.rng = np.random.default_rng(seed)
+        self.t = 0 # Samples generated so far
+        self.phase = 0.0
+        self.mono = np.zeros(0, dtype=np.float32)
+        self.block = np.zeros((0, channels), dtype=np.float32)
+        self.description = f"synth:{kind} @ {sample_rate}Hz"
+
+    def fill(self, hop: int) -> bool:
+        if len(self.mono) != hop:
+            self.mono = np.zeros(hop, dtype=np.float32)
+            self.block = np.zeros((hop, self.channels), dtype=np.float32)
+        sr = self.sample_rate
+        x = self.mono
+        t = (self.t + np.arange(hop)) / sr
+
+        if self.kind == "sine":
+            np.sin(2 * np.pi * self.freq * t, out=x, casting='unsafe')
+        elif self.kind == "sweep":
+            # Instantaneous frequency, integrated into a continuous phase
+            f = 20.0 * (1000.0 ** ((t % self.period) / self.period))
+            phase = self.phase + np.cumsum(2 * np.pi * f / sr)
+            np.sin(phase, out=x, casting='unsafe')
+            self.phase = float(phase[-1] % (2 * np.pi))
+        elif self.kind == "noise":
+            self.rng.standard_normal(out=x, dtype=np.float32)
+            x *= 0.3
+        else: # clicks
+            beat_len = 60.0 / self.bpm
+            since = t % beat_len
+            burst = self.rng.standard_normal(hop).astype(np.float32)
+            np.multiply(burst, np.exp(-since / 0.01), out=x, casting='unsafe')
+
+        x *= self.amp
+        self.block[:] = x[:, None]
+        self.ring.write(self.block)
+        self.t += hop
+        self._pace(hop)
+        return True
+
+def create_source(spec: str, loop: bool = False, realtime: bool = True, sample_rate: int = 44100,
+                  channels: int = 2, seed: int = 0) -> AudioSource:
+    """
+    Build a source from a command-line spec:
+    `file:PATH` (WAV or raw f32le), `pipe` (f32le on stdin), `synth:KIND` (sine/sweep/noise/clicks).
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "file":
+        return FileSource(arg, loop=loop, realtime=realtime, sample_rate=sample_rate, channels=channels)
+    if kind == "pipe":
+        return PipeSource(sample_rate=sample_rate, channels=channels)
+    if kind == "synth":
+        return SyntheticSource(arg or "sweep", sample_rate=sample_rate, channels=channels, realtime=realtime, seed=seed)
+    raise ValueError(f"Unknown audio source '{spec}'")
@@ -0,0 +1,183 @@
+import math
+from typing import Any
+from filterbank import bin_freqs
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Onset bands (Hz). Bass is weighted highest, hats/cymbals lowest.
+ONSET_BANDS = ((30, 150), (150, 400), (400, 1000), (1000, 2500), (2500, 6000), (6000, 16000))
+ONSET_WEIGHTS = (2.0, 1.2, 1.0, 0.8, 0.6, 0.5)
+
+HISTORY_SEC = 6.0 # Onset envelope kept for tempo estimation
+THRESH_SEC = 1.5 # Window for the adaptive threshold; spans a beat at MIN_BPM so the last onset is always in it
+TEMPO_EVERY_SEC = 0.5 # Re-estimate tempo this often
+MIN_BPM = 60.0
+MAX_BPM = 200.0
+PRIOR_BPM = 120.0 # Resolves octave ambiguity towards common tempos
+
+class BeatTracker:
+    """
+    Spectral-flux onset detection and autocorrelation tempo tracking.
+
+    Fed one dB spectrum per STFT hop. Per-band rectified flux is stored in a fixed
+    numpy ring (mirrored, so the last HISTORY_SEC is always one contiguous slice);
+    the threshold comes from a running mean/variance over the last THRESH_SEC, and
+    the tempo from an FFT autocorrelation of the envelope every TEMPO_EVERY_SEC.
+    Every call does a fixed amount of work regardless of how long it has run.
+    """
+    def __init__(self, sample_rate: int, hop_size: int, n_bins: int, layout: str = "linear") -> None:
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.n_bins = n_bins
+        self.layout = layout # Bin spacing of the incoming spectra (see filterbank.bin_freqs)
+        self.frame_rate = sample_rate / hop_size # Spectra per second
+
+        # Band layout (reduceat starts over the dB spectrum)
+        freqs = bin_freqs(layout, sample_rate, n_bins)
+        edges = []
+        for lo, hi in ONSET_BANDS:
+            a = min(n_bins - 1, max(1, int(np.searchsorted(freqs, lo))))
+            b = min(n_bins, max(a + 1, int(np.searchsorted(freqs, hi))))
+            edges.append((a, b))
+        self.starts = np.array([a for a, _ in edges], dtype=np.intp)
+        self.stop = edges[-1][1]
+        # reduceat sums each band up to the next start; the last one up to `stop`
+        ends = np.append(self.starts[1:], self.stop)
+        self.counts = np.maximum(1, ends - self.starts).astype(np.float32)
+        self.weights = np.array(ONSET_WEIGHTS, dtype=np.float32)
+        self.band = np.zeros(len(edges), dtype=np.float32)
+        self.diff = np.zeros(len(edges), dtype=np.float32)
+        self.prev_band = np.zeros(len(edges), dtype=np.float32)
+        self.primed = False
+
+        # Onset envelope ring
+        self.hist_len = max(64, int(HISTORY_SEC * self.frame_rate))
+        self.env = np.zeros(self.hist_len * 2, dtype=np.float32)
+        self.count = 0 # Total frames seen
+
+        # Running threshold statistics
+        self.thresh_len = max(4, int(THRESH_SEC * self.frame_rate))
+        self.run_sum = 0.0
+        self.run_sq = 0.0
+        self.prev_flux = 0.0
+
+        # Tempo
+        self.tempo_every = max(1, int(TEMPO_EVERY_SEC * self.frame_rate))
+        lags = np.arange(self.hist_len, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            bpm_of_lag = 60.0 * self.frame_rate / np.maximum(lags, 1e-9)
+        self.min_lag = max(1, int(60.0 * self.frame_rate / MAX_BPM))
+        self.max_lag = min(self.hist_len - 2, int(60.0 * self.frame_rate / MIN_BPM) + 1)
+        # Log-Gaussian tempo prior
+        self.prior = np.exp(-0.5 * (np.log2(np.maximum(bpm_of_lag, 1e-9) / PRIOR_BPM)) ** 2)
+
+        # Published results
+        self.is_beat = False
+        self.beat_confidence = 0.0
+        self.bpm = 0.0
+        self.beat_phase = 0.0
+        self.last_beat_time = 0.0
+        self.next_beat_time = 0.0
+
+    def process(self, spectrum_db: Any, now: float, thresh_mult: float = 1.7) -> bool:
+        """Consume one mono dB spectrum captured at `now` (monotonic). Returns is_beat."""
+        spec = spectrum_db[:self.stop]
+        np.add.reduceat(spec, self.starts, out=self.band)
+        self.band /= self.counts
+
+        # Half-wave rectified, weighted log-spectral flux
+        if self.primed:
+            np.subtract(self.band, self.prev_band, out=self.diff)
+            np.maximum(self.diff, 0.0, out=self.diff)
+            flux = float(np.dot(self.weights, self.diff))
+        else:
+            flux = 0.0
+            self.primed = True
+        self.prev_band[:] = self.band
+
+        # Push into the mirrored ring, update running stats over the threshold window
+        pos = self.count % self.hist_len
+        old = float(self.env[(self.count - self.thresh_len) % self.hist_len]) if self.count >= self.thresh_len else 0.0
+        self.env[pos] = flux
+        self.env[pos + self.hist_len] = flux
+        self.count += 1
+
+        self.run_sum += flux - old
+        self.run_sq += flux * flux - old * old
+        n = min(self.count, self.thresh_len)
+        mean = max(0.0, self.run_sum / n)
+        std = math.sqrt(max(0.0, self.run_sq / n - mean * mean))
+
+        # Adaptive threshold: above the local mean by the configured ratio and one deviation
+        threshold = mean * thresh_mult + 0.5 * std + 1e-3
+        min_gap = 0.3
+        if self.bpm > 0: min_gap = min(min_gap, 0.5 * 60.0 / self.bpm)
+
+        rising = flux >= self.prev_flux
+        self.prev_flux = flux
+        if flux > threshold and rising and (now - self.last_beat_time) > min_gap:
+            self.is_beat = True
+            self.beat_confidence = min(1.0, flux / threshold - 1.0)
+            self.last_beat_time = now
+        else:
+            self.is_beat = False
+            self.beat_confidence = max(0.0, self.beat_confidence * 0.8) # Decay
+
+        if self.count % self.tempo_every == 0:
+            self._resync_stats()
+            if self.count >= self.hist_len // 2:
+                self._estimate_tempo()
+
+        self._update_phase(now)
+        return self.is_beat
+
+    def _resync_stats(self) -> None:
+        """Recompute the running sums exactly so float error cannot accumulate."""
+        n = min(self.count, self.thresh_len)
+        end = self.count % self.hist_len + self.hist_len
+        recent = self.env[end - n:end]
+        self.run_sum = float(recent.sum())
+        self.run_sq = float(np.dot(recent, recent))
+
+    def _estimate_tempo(self) -> None:
+        """Autocorrelation of the onset envelope over the last HISTORY_SEC."""
+        start = self.count % self.hist_len
+        env = self.env[start:start + self.hist_len]
+        x = env - env.mean()
+        spec = np.fft.rfft(x, n=self.hist_len * 2)
+        ac = np.fft.irfft(spec.real ** 2 + spec.imag ** 2)[:self.hist_len]
+        if ac[0] <= 0: return
+
+        # Onsets on a fractional period alternate between two neighbouring lags,
+        # so each lag is scored with its neighbours (box[k] is centred on lag k + 1)
+        box = ac[:-2] + ac[1:-1] + ac[2:]
+        scored = box[self.min_lag - 1:self.max_lag] * self.prior[self.min_lag:self.max_lag + 1]
+        i = int(np.argmax(scored))
+        if scored[i] <= 0.05 * ac[0]: return # No periodicity worth reporting
+        lag = float(i + self.min_lag)
+
+        # Parabolic interpolation for a sub-frame lag
+        if 0 < i < len(scored) - 1:
+            a, b, c = scored[i - 1], scored[i], scored[i + 1]
+            denom = a - 2 * b + c
+            if denom != 0: lag += 0.5 * (a - c) / denom
+
+        bpm = 60.0 * self.frame_rate / lag
+        # Smooth, but jump straight to a clearly different tempo
+        if self.bpm <= 0 or abs(bpm - self.bpm) > 0.15 * self.bpm:
+            self.bpm = bpm
+        else:
+            self.bpm = self.bpm * 0.8 + bpm * 0.2
+
+    def _update_phase(self, now: float) -> None:
+        """Phase in [0, 1) since the last beat on the tracked tempo grid."""
+        if self.bpm <= 0 or self.last_beat_time <= 0:
+            self.beat_phase = 0.0
+            return
+        period = 60.0 / self.bpm
+        elapsed = now - self.last_beat_time
+        self.beat_phase = (elapsed / period) % 1.0
+        self.next_beat_time = now + (1.0 - self.beat_phase) * period
@@ -2,13 +2,18 @@ CONFIG_FILE = "pyviz_settings.json"
 PRESETS_FILE = "pyviz_presets.json"
 
 DEFAULT_STATE = {
-    "dev_name": "Default",
+    "dev_name": "Default", "capture_mode": "blocking", "shared_analyzer": False,
+    "fft_size": 2048, "hop_size": 512, "analysis_mode": "stft",
     "sens": 1.0, "auto_gain": True, "noise_floor": -60.0,
     "rise_speed": 0.6, "gravity": 0.25, "smoothing": 0.15,
-    "style": 2, "mirror": False, "glitch": 0.0, "bass_thresh": 0.7,
+    "style": 2, "subcell_mode": "off", "mirror": False, "freq_scale": "log", "band_agg": "max", "glitch": 0.0, "bass_thresh": 0.7,
     "matrix_rain": False, "pong_mode": False, "waterfall_mode": False,
     "scope_mode": False, "lissajous_mode": False, "life_mode": False,
-    "fps": 30,
+    "fps": 30, "min_fps": 10, "render_sync": "audio", "output_backend": "auto", "repaint_threshold": 0.5,
+    "sync_output": "auto", "max_bandwidth": 0, "color_depth": "auto",
+    "render_max_cells": 12800, "render_width": 0, "render_height": 0, "quality_governor": True,
+    "profile_hud": False, "profile_dump": 0,
+    "metrics_endpoint": "", "metrics_jsonl": "", "metrics_interval": 10,
     "color_mode": "Theme", "solid_color": [0, 255, 128],
     "grad_start": [0, 0, 255], "grad_end": [0, 255, 255], "theme_name": "Vaporeon",
     "stars": True, "show_vu": False, "peaks_on": True, "peak_gravity": 0.15,
@@ -18,7 +23,7 @@ DEFAULT_STATE = {
     "afk_enabled": True, "afk_timeout": 30, "afk_text": "brb", "force_afk": False,
     "img_bg_path": "", "img_bg_on": False, "img_bg_flip": False,
     "img_fg_path": "", "img_fg_on": False, "img_fg_flip": False,
-    "img_char_set": "Blocks", "img_style": 2, "img_thresh": 0.05
+    "img_char_set": "Blocks", "img_style": 2, "img_thresh": 0.05, "asset_cache_mb": 64
 }
 
 CHAR_SETS = {
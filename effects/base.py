@@ -3,9 +3,20 @@ from typing import Tuple, List, Callable, Any
 class BaseEffect:
     """
     Abstract base class for visual effects.
+
+    Two draw contracts exist, selected by `api_version`:
+    - 1 (legacy): draw(buf, cbf, w, h, color_func) on nested lists. The renderer passes
+      row proxies from FrameBuffer.legacy_view(), so these effects keep working unchanged.
+    - 2: draw(fb) on a framebuffer.FrameBuffer; write whole slices / masks of
+      fb.chars (uint32 codepoints), fb.fg and fb.bg (uint8 RGB planes).
     """
+    api_version: int = 1
+
     def __init__(self) -> None:
         self.enabled: bool = True
+        self._last_beat_phase: float = 0.0
+        self._beat_index: int = 0 # Beat periods begun (phase wraps) while a tempo is locked
+        self._fired_beat: int = -1 # Index of the last beat on_beat fired for
 
     def update(self, state: dict, audio_data: Any) -> None:
         """
@@ -19,7 +30,8 @@ class BaseEffect:
 
     def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
         """
-        Draw to the character and color buffers.
+        Draw to the character and color buffers (api_version 1).
+        Version 2 effects override this as draw(self, fb) instead.
 
         Args:
             buf (list): 2D list of characters (strings).
@@ -29,3 +41,48 @@ class BaseEffect:
             color_func (callable): Function that takes (r,g,b) and returns color data.
         """
         pass
+
+    def beat_ahead(self, state: dict, audio_data: Any) -> bool:
+        """
+        True once per beat, one frame before the beat predicted by the tempo tracker.
+        Lets effects land on the beat instead of one analysis hop after it.
+
+        Args:
+            state (dict): The global configuration state (uses 'fps').
+            audio_data (object): The audio engine instance (uses bpm, beat_phase).
+        """
+        bpm = getattr(audio_data, 'bpm', 0.0)
+        phase = getattr(audio_data, 'beat_phase', 0.0)
+        prev = self._last_beat_phase
+        self._last_beat_phase = phase
+        if bpm <= 0: return False
+
+        fps = max(1, state.get('fps', 30))
+        mark = 1.0 - (bpm / 60.0) / fps # One frame, as a fraction of the beat period
+        return prev < mark <= phase
+
+    def on_beat(self, state: dict, audio_data: Any) -> bool:
+        """
+        True once per beat: on the predicted beat (see beat_ahead) while a tempo is
+        locked, else on the detected one. A locked beat the prediction missed (an
+        early detection resetting the phase, or frames slower than 'fps') fires on
+        the phase wrap or the detection instead. Call it every frame so the phase
+        stays tracked.
+        """
+        prev = self._last_beat_phase
+        predicted = self.beat_ahead(state, audio_data)
+        if getattr(audio_data, 'bpm', 0.0) <= 0: return bool(audio_data.is_beat)
+
+        phase = self._last_beat_phase
+        wrapped = prev - phase > 0.5 # Small steps back are tracker corrections, not a new beat
+        if wrapped: self._beat_index += 1
+        # Which beat this frame stands for: the coming one late in the period, else the one that began it
+        if predicted:
+            beat = self._beat_index + 1
+        elif wrapped or audio_data.is_beat:
+            beat = self._beat_index + (1 if phase >= 0.5 else 0)
+        else:
+            return False
+        if beat <= self._fired_beat: return False
+        self._fired_beat = beat
+        return True
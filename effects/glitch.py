@@ -1,13 +1,18 @@
 from .base import BaseEffect
 import random
 
+GLITCH_CHARS = "!@#$%^&*()_+"
+
 class GlitchEffect(BaseEffect):
+    api_version = 2
+
     def __init__(self):
         super().__init__()
         self.active = False
         self.duration = 0
 
     def update(self, state, audio_data):
+        beat = self.on_beat(state, audio_data) # Every frame, so the beat phase stays tracked
         intensity = float(state.get('glitch', 0.0))
         if intensity <= 0:
             self.active = False
@@ -17,7 +22,7 @@ class GlitchEffect(BaseEffect):
         # Base chance 30% at max intensity
         chance = 0.3 * intensity
 
-        if audio_data.is_beat and random.random() < chance:
+        if beat and random.random() < chance:
             self.active = True
             self.duration = 3
 
@@ -26,14 +31,17 @@ class GlitchEffect(BaseEffect):
         else:
             self.active = False
 
-    def draw(self, buf, cbf, w, h, color_func):
-        if not self.active: return
-
-        # Random character replacements
-        for _ in range(int(w * h * 0.05)): # 5% of screen
-            rx = random.randint(0, w-1)
-            ry = random.randint(0, h-1)
-            char_pool = "!@#$%^&*()_+"
-            buf[ry][rx] = random.choice(char_pool)
-            # Maybe random color too
-            cbf[ry][rx] = color_func((random.randint(0,255), random.randint(0,255), random.randint(0,255)))
+    def draw(self, fb):
+        if not self.active or fb.w <= 0 or fb.h <= 0: return
+        import numpy as np
+        from framebuffer import codes
+
+        # Random character replacements (5% of screen), scattered in one pass
+        n = int(fb.w * fb.h * 0.05)
+        ys = np.random.randint(0, fb.h, n)
+        xs = np.random.randint(0, fb.w, n)
+        pool = codes(GLITCH_CHARS)
+        fb.chars[ys, xs] = pool[np.random.randint(0, len(pool), n)]
+        # Random colour too
+        fb.fg[ys, xs] = np.random.randint(0, 256, (n, 3), dtype=np.uint8)
+        fb.bg[ys, xs] = 0
@@ -7,70 +7,61 @@ YELLOW = (255, 255, 0)
 BLACK = (0, 0, 0)
 
 class GameOfLifeEffect(BaseEffect):
+    api_version = 2
+
     def __init__(self) -> None:
         super().__init__()
         self.enabled = False
-        self.grid = []
+        self.grid: Any = None # (h, w) uint8, 1 = alive
         self.w = 0
         self.h = 0
         self.frame_skip = 0
+        self.every = 3 # Step the simulation every Nth frame
 
     def update(self, state: dict, audio_data: Any) -> None:
         self.enabled = state.get('life_mode', False)
         if not self.enabled: return
+        self.every = max(1, int(state.get('life_every', 3)))
 
         # Beat triggers random spawn
         if audio_data.is_beat:
              # Add random noise
              if self.w > 0 and self.h > 0:
-                 for _ in range(20):
-                     rx = random.randint(0, self.w-1)
-                     ry = random.randint(0, self.h-1)
-                     self.grid[ry][rx] = 1
+                 import numpy as np
+                 self.grid[np.random.randint(0, self.h, 20), np.random.randint(0, self.w, 20)] = 1
 
     def step(self):
         if self.w == 0 or self.h == 0: return
-        new_grid = [[0 for _ in range(self.w)] for _ in range(self.h)]
-
-        for y in range(self.h):
-            for x in range(self.w):
-                # Count neighbors
-                n = 0
-                for dy in [-1,0,1]:
-                    for dx in [-1,0,1]:
-                        if dx==0 and dy==0: continue
-                        nx, ny = x+dx, y+dy
-                        if 0 <= nx < self.w and 0 <= ny < self.h:
-                            if self.grid[ny][nx]: n += 1
+        import numpy as np
 
-                if self.grid[y][x]:
-                    if n == 2 or n == 3: new_grid[y][x] = 1
-                else:
-                    if n == 3: new_grid[y][x] = 1
+        # Count neighbors: sum of the 8 shifted views of a zero-padded grid (no wrap-around)
+        p = np.pad(self.grid, 1)
+        n = (p[:-2, :-2] + p[:-2, 1:-1] + p[:-2, 2:] +
+             p[1:-1, :-2] + p[1:-1, 2:] +
+             p[2:, :-2] + p[2:, 1:-1] + p[2:, 2:])
 
-        self.grid = new_grid
+        alive = self.grid.astype(bool)
+        self.grid = ((n == 3) | (alive & (n == 2))).astype(np.uint8)
 
-    def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
+    def draw(self, fb: Any) -> None:
         if not self.enabled: return
+        import numpy as np
+        w, h = fb.w, fb.h
 
         # Resize grid if needed
         if w != self.w or h != self.h:
             self.w = w
             self.h = h
-            self.grid = [[0 for _ in range(w)] for _ in range(h)]
             # Init random
-            for y in range(h):
-                for x in range(w):
-                    if random.random() < 0.2: self.grid[y][x] = 1
+            self.grid = (np.random.random((h, w)) < 0.2).astype(np.uint8)
 
         # Evolution speed control
         self.frame_skip += 1
-        if self.frame_skip > 2: # Every 3rd frame
+        if self.frame_skip >= self.every: # Every 3rd frame by default
             self.step()
             self.frame_skip = 0
 
-        for y in range(h):
-            for x in range(w):
-                if self.grid[y][x]:
-                    buf[y][x] = "o"
-                    cbf[y][x] = color_func(YELLOW, BLACK)
+        mask = self.grid.astype(bool)
+        fb.chars[mask] = ord("o")
+        fb.fg[mask] = YELLOW
+        fb.bg[mask] = BLACK
@@ -1,48 +1,67 @@
 from typing import List, Tuple, Callable, Any
 from .base import BaseEffect
+from subcell import PixelCanvas, cell_pixels
 
 CYAN = (0, 255, 255)
 MAGENTA = (255, 0, 255)
 BLACK = (0, 0, 0)
 
 class LissajousEffect(BaseEffect):
+    api_version = 2
+
     def __init__(self) -> None:
         super().__init__()
         self.enabled = False
         self.left = []
         self.right = []
+        self.subcell = "off"
+        self.canvas = PixelCanvas()
 
     def update(self, state: dict, audio_data: Any) -> None:
         self.enabled = state.get('lissajous_mode', False)
         if not self.enabled: return
+        self.subcell = state.get('subcell_mode', 'off')
         self.left = audio_data.raw_pcm_left
         self.right = audio_data.raw_pcm_right
 
-    def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
+    def draw(self, fb: Any) -> None:
         if not self.enabled: return
         if len(self.left) == 0 or len(self.right) == 0: return
+        w, h = fb.w, fb.h
+
+        import numpy as np
 
         # Plot Left vs Right
         # Downsample to a reasonable point count (e.g. 1000 points) to avoid too much density
-        step = max(1, len(self.left) // 1000)
-
-        center_x = w // 2
-        center_y = h // 2
+        n = min(len(self.left), len(self.right))
+        step = max(1, n // 1000)
+        idx = np.arange(0, n, step)
 
-        for i in range(0, len(self.left), step):
-            l = self.left[i] # X axis approx
-            r = self.right[i] # Y axis approx
+        # Sub-cell modes plot on the pixel grid
+        sub = self.subcell != "off"
+        if sub:
+            px, py = cell_pixels(self.subcell)
+            self.canvas.begin(w, h, self.subcell)
+            w, h = w * px, h * py
 
-            # Rotate 45 deg?
-            # Standard Lissajous: X=L, Y=R
+        # Standard Lissajous: X=L, Y=R
+        xs = (w // 2 + np.asarray(self.left)[idx] * (w * 0.4)).astype(int)
+        ys = (h // 2 - np.asarray(self.right)[idx] * (h * 0.4)).astype(int)
+        keep = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        xs, ys, idx = xs[keep], ys[keep], idx[keep]
 
-            x = int(center_x + l * (w * 0.4))
-            y = int(center_y - r * (h * 0.4))
+        # Color gradient based on index (time); later points win, as when drawn in order
+        fade = idx / n
+        if sub:
+            rgb = np.zeros((len(idx), 3), dtype=np.uint8)
+            rgb[:, 0] = 255 * fade
+            rgb[:, 2] = 255 * (1.0 - fade)
+            self.canvas.plot(ys, xs, rgb)
+            self.canvas.compose(fb)
+            return
 
-            if 0 <= x < w and 0 <= y < h:
-                buf[y][x] = "+"
-                # Color gradient based on index (time)
-                fade = i / len(self.left)
-                r_col = int(255 * fade)
-                b_col = int(255 * (1.0 - fade))
-                cbf[y][x] = color_func((r_col, 0, b_col), BLACK)
+        fb.chars[ys, xs] = ord("+")
+        fb.fg[ys, xs, 0] = (255 * fade).astype(np.uint8)
+        fb.fg[ys, xs, 1] = 0
+        fb.fg[ys, xs, 2] = (255 * (1.0 - fade)).astype(np.uint8)
+        fb.bg[ys, xs] = BLACK
@@ -68,7 +68,8 @@ class MatrixEffect(BaseEffect):
 
     def update(self, state: dict, audio_data: Any) -> None:
         self.vol = audio_data.volume
-        self.is_beat = audio_data.is_beat
+        # Anticipated beat while a tempo is locked, so the flash lands on the beat
+        self.is_beat = self.on_beat(state, audio_data)
         self.enabled = state.get('matrix_rain', False)
 
     def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
@@ -27,11 +27,12 @@ class PongEffect(BaseEffect):
         self.enabled = False
 
     def update(self, state: dict, audio_data: Any) -> None:
+        # Anticipated beat while a tempo is locked, so the surge lands on the beat
+        self.is_beat = self.on_beat(state, audio_data)
         self.enabled = state.get('pong_mode', False)
         if not self.enabled: return
 
         self.vol = audio_data.volume
-        self.is_beat = audio_data.is_beat
 
     def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
         if not self.enabled: return
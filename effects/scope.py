@@ -1,47 +1,71 @@
 from typing import List, Tuple, Callable, Any
 from .base import BaseEffect
+from subcell import PixelCanvas
 
 GREEN = (0, 255, 0)
 BLACK = (0, 0, 0)
 
 class OscilloscopeEffect(BaseEffect):
+    api_version = 2
+
     def __init__(self) -> None:
         super().__init__()
         self.enabled = False
         self.pcm = []
+        self.subcell = "off"
+        self.canvas = PixelCanvas()
 
     def update(self, state: dict, audio_data: Any) -> None:
         self.enabled = state.get('scope_mode', False)
         if not self.enabled: return
+        self.subcell = state.get('subcell_mode', 'off')
         self.pcm = audio_data.raw_pcm
 
-    def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
+    def draw(self, fb: Any) -> None:
         if not self.enabled: return
 
         if len(self.pcm) == 0: return
+        w, h = fb.w, fb.h
+        if w <= 0 or h <= 0: return
 
         import numpy as np
 
+        if self.subcell != "off":
+            self.draw_pixels(fb)
+            return
+
         # Resample PCM to screen width
         indices = np.linspace(0, len(self.pcm)-1, w).astype(int)
-        view = self.pcm[indices]
-
-        prev_y = h // 2
+        view = np.asarray(self.pcm)[indices]
 
-        for x in range(w):
-            sample = view[x] # Float -1.0 to 1.0
+        # Map to screen Y (float -1.0 to 1.0 -> rows)
+        ys = np.clip((((view * -0.5) + 0.5) * h).astype(int), 0, h - 1)
+        prev = np.empty_like(ys)
+        prev[0] = h // 2
+        prev[1:] = ys[:-1]
 
-            # Map to screen Y
-            y = int(((sample * -0.5) + 0.5) * h)
-            y = max(0, min(h-1, y))
+        # Vertical fill from the previous sample to this one: one mask over the whole screen
+        start = np.minimum(prev, ys)
+        end = np.maximum(prev, ys)
+        rows = np.arange(h)[:, None]
+        mask = (rows >= start) & (rows <= end)
+        fb.chars[mask] = ord("|")
+        fb.chars[ys, np.arange(w)] = ord("-")
+        fb.fg[mask] = GREEN
+        fb.bg[mask] = BLACK
 
-            # Draw line from prev_y to y
-            # Simple Bresenham-like vertical fill
-            start = min(prev_y, y)
-            end = max(prev_y, y)
-
-            for dy in range(start, end + 1):
-                buf[dy][x] = "-" if dy == y else "|"
-                cbf[dy][x] = color_func(GREEN, BLACK)
+    def draw_pixels(self, fb: Any) -> None:
+        """The trace on the sub-cell pixel grid (a connected line, no cell markers)."""
+        import numpy as np
 
-            prev_y = y
+        canvas = self.canvas
+        canvas.begin(fb.w, fb.h, self.subcell)
+        w, h = canvas.width, canvas.height
+        indices = np.linspace(0, len(self.pcm)-1, w).astype(int)
+        view = np.asarray(self.pcm)[indices]
+        ys = np.clip((((view * -0.5) + 0.5) * h).astype(int), 0, h - 1)
+        prev = np.empty_like(ys)
+        prev[0] = h // 2
+        prev[1:] = ys[:-1]
+        canvas.vspans(np.minimum(prev, ys), np.maximum(prev, ys), GREEN)
+        canvas.compose(fb)
@@ -1,4 +1,5 @@
 from typing import List, Tuple, Callable, Any
+from filterbank import get_band_mapper
 from .base import BaseEffect
 
 WHITE = (255, 255, 255)
@@ -7,57 +8,68 @@ CYAN = (0, 255, 255)
 BLACK = (0, 0, 0)
 
 class WaterfallEffect(BaseEffect):
+    api_version = 2
+
     def __init__(self) -> None:
         super().__init__()
         self.history = [] # List of rows (fft data)
         self.enabled = False
+        self.last_seq = None
+        self.sample_rate = 44100
+        self.scale = "log"
+        self.agg = "max"
+        self.layout = "linear"
 
     def update(self, state: dict, audio_data: Any) -> None:
         self.enabled = state.get('waterfall_mode', False)
         if not self.enabled: return
+        self.sample_rate = getattr(audio_data, 'sample_rate', 44100)
+        self.scale = state.get('freq_scale', 'log')
+        self.agg = state.get('band_agg', 'max')
+        layout = getattr(audio_data, 'freq_layout', 'linear')
+        if layout != self.layout:
+            self.history = [] # Rows of another bin layout cannot be mapped together
+            self.layout = layout
+
+        # Only push a row when the analyzer produced a new spectrum,
+        # otherwise fast render loops would duplicate rows.
+        seq = getattr(audio_data, 'seq', None)
+        if seq is not None and seq == self.last_seq: return
+        self.last_seq = seq
 
         # Store current FFT row
-        # Normalize?
         fft = audio_data.raw_fft
         if len(fft) > 0:
-            # Downsample to some reasonable width if needed, but we do that in draw usually.
-            # Let's store raw FFT for now.
-            self.history.insert(0, fft)
+            # Copy: rows outlive the snapshot, and shared-memory frames are recycled.
+            # They are mapped to screen bands in draw().
+            self.history.insert(0, fft.copy())
             if len(self.history) > 200: # Limit history depth
                 self.history.pop()
 
-    def draw(self, buf: List[List[str]], cbf: List[List[Any]], w: int, h: int, color_func: Callable) -> None:
+    def draw(self, fb: Any) -> None:
         if not self.enabled: return
+        w, h = fb.w, fb.h
+
+        rows = [r for r in self.history[:h] if len(r) == len(self.history[0])]
+        if not rows or w <= 0: return
+
+        # Map all visible rows in one filterbank pass (same bands as the bars)
+        import numpy as np
+        mapper = get_band_mapper(w, self.sample_rate, len(rows[0]), self.scale, self.agg, self.layout)
+        mapped = mapper.apply(np.array(rows))
+
+        # Color map based on intensity (dB value approx -60 to 0)
+        # -60 -> Blue, -30 -> Green, 0 -> Red
+        norm = np.clip((mapped + 60) / 60.0, 0.0, 1.0) # 0.0 to 1.0
+        mask = norm > 0.1
+
+        # Heatmap, history drawn top-down
+        n = len(rows)
+        fg = fb.fg[:n]
+        fg[mask, 0] = (norm[mask] * 255).astype(np.uint8)
+        fg[mask, 1] = ((1.0 - np.abs(0.5 - norm[mask]) * 2) * 255).astype(np.uint8)
+        fg[mask, 2] = ((1.0 - norm[mask]) * 255).astype(np.uint8)
+        fb.bg[:n][mask] = BLACK
 
-        # Draw history top-down
-        for y in range(h):
-            if y < len(self.history):
-                row_data = self.history[y]
-                # Resample row to width w
-                if len(row_data) == 0: continue
-
-                import numpy as np
-                indices = np.linspace(0, len(row_data)-1, w).astype(int)
-                resampled = row_data[indices]
-
-                for x in range(w):
-                    val = resampled[x] # dB value approx -60 to 0
-
-                    # Color map based on intensity
-                    # -60 -> Blue, -30 -> Green, 0 -> Red
-                    norm = (val + 60) / 60.0 # 0.0 to 1.0
-                    norm = max(0.0, min(1.0, norm))
-
-                    if norm > 0.1:
-                        # Heatmap
-                        r = int(norm * 255)
-                        g = int((1.0 - abs(0.5 - norm) * 2) * 255)
-                        b = int((1.0 - norm) * 255)
-
-                        char = " "
-                        if norm > 0.8: char = "#"
-                        elif norm > 0.5: char = ":"
-                        elif norm > 0.2: char = "."
-
-                        buf[y][x] = char
-                        cbf[y][x] = color_func((r,g,b), BLACK)
+        chars = np.select([norm > 0.8, norm > 0.5, norm > 0.2], [ord("#"), ord(":"), ord(".")], ord(" "))
+        fb.chars[:n][mask] = chars[mask]
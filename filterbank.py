@@ -0,0 +1,104 @@
+import math
+from typing import Any, Dict, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SCALES = ("linear", "log", "mel", "bark")
+AGGREGATES = ("max", "mean")
+LAYOUTS = ("linear", "log") # Bin spacing of the input spectrum
+
+MIN_FREQ = 20.0 # Hz, lower edge for the perceptual scales
+MAX_FREQ = 20000.0 # Hz, clipped to Nyquist
+LOG_MIN_FREQ = 20.0 # Hz, first bin of "log" layout spectra
+
+# Hz <-> scale unit conversions
+def _to_scale(f: float, scale: str) -> float:
+    if scale == "log": return math.log10(max(f, 1e-3))
+    if scale == "mel": return 2595.0 * math.log10(1.0 + f / 700.0)
+    if scale == "bark": return 26.81 * f / (1960.0 + f) - 0.53 # Traunmuller
+    return f
+
+def _from_scale(v: Any, scale: str) -> Any:
+    if scale == "log": return 10.0 ** v
+    if scale == "mel": return 700.0 * (10.0 ** (v / 2595.0) - 1.0)
+    if scale == "bark": return 1960.0 * (v + 0.53) / (26.28 - v)
+    return v
+
+def bin_freqs(layout: str, sample_rate: int, n_bins: int) -> Any:
+    """Centre frequency (Hz) of every bin of a spectrum with the given layout."""
+    nyquist = sample_rate / 2.0
+    if layout == "log":
+        return np.geomspace(LOG_MIN_FREQ, nyquist, n_bins)
+    return np.arange(n_bins) * (nyquist / n_bins) # rfft bins (n_bins = fft_size / 2)
+
+class BandMapper:
+    """
+    Maps a magnitude spectrum (dB) onto `n_bands` screen bands.
+
+    Built once per (bands, sample rate, bins, scale, aggregate) and reused every frame:
+    - "max": each band is the loudest bin it covers, via one np.maximum.reduceat.
+    - "mean": a (bins x bands) weight matrix; bands narrower than a bin interpolate
+      between their two neighbouring bins, so one matrix product maps the frame.
+    Both accept stacked spectra (..., n_bins), e.g. left/right or waterfall history.
+    The input bins may be linearly spaced (plain FFT) or log spaced (multi-resolution).
+    """
+    def __init__(self, n_bands: int, sample_rate: int, n_bins: int, scale: str = "log", agg: str = "max",
+                 layout: str = "linear") -> None:
+        self.n_bands = n_bands
+        self.sample_rate = sample_rate
+        self.n_bins = n_bins
+        self.scale = scale if scale in SCALES else "log"
+        self.agg = agg if agg in AGGREGATES else "max"
+        self.layout = layout if layout in LAYOUTS else "linear"
+
+        nyquist = sample_rate / 2.0
+        f_lo = 0.0 if self.scale == "linear" else MIN_FREQ
+        f_hi = min(MAX_FREQ, nyquist)
+
+        # Band edges, evenly spaced on the chosen scale, expressed in (fractional) bins
+        edges_scale = np.linspace(_to_scale(f_lo, self.scale), _to_scale(f_hi, self.scale), n_bands + 1)
+        edges_hz = _from_scale(edges_scale, self.scale)
+        edges = np.interp(edges_hz, bin_freqs(self.layout, sample_rate, n_bins), np.arange(n_bins))
+
+        self.stop = min(n_bins, int(np.ceil(edges[-1])) + 1)
+
+        # reduceat start indices: non-decreasing, sub-bin bands collapse onto their nearest bin
+        starts = np.floor(edges[:-1]).astype(np.intp)
+        self.starts = np.minimum(starts, self.stop - 1)
+
+        # Mean weights: box filter between edges, or linear interpolation for sub-bin bands
+        weights = np.zeros((self.stop, n_bands), dtype=np.float32)
+        for i in range(n_bands):
+            lo, hi = edges[i], edges[i + 1]
+            a, b = int(np.floor(lo)), int(np.ceil(hi))
+            if b - a <= 1:
+                centre = (lo + hi) / 2.0
+                j = min(int(centre), self.stop - 2)
+                frac = min(1.0, max(0.0, centre - j))
+                weights[j, i] = 1.0 - frac
+                weights[j + 1, i] = frac
+            else:
+                weights[a:b, i] = 1.0 / (b - a)
+        self.weights = weights
+
+    def apply(self, spectrum: Any) -> Any:
+        """(..., n_bins) dB spectrum -> (..., n_bands) band levels."""
+        spec = spectrum[..., :self.stop]
+        if self.agg == "mean":
+            return spec @ self.weights
+        return np.maximum.reduceat(spec, self.starts, axis=-1)
+
+# Cached construction (one mapper per layout)
+_MAPPER_CACHE: Dict[Tuple[int, int, int, str, str, str], BandMapper] = {}
+def get_band_mapper(n_bands: int, sample_rate: int, n_bins: int, scale: str = "log", agg: str = "max",
+                    layout: str = "linear") -> BandMapper:
+    key = (n_bands, int(sample_rate), n_bins, scale, agg, layout)
+    mapper = _MAPPER_CACHE.get(key)
+    if mapper is None:
+        if len(_MAPPER_CACHE) > 32: _MAPPER_CACHE.clear()
+        mapper = BandMapper(n_bands, int(sample_rate), n_bins, scale, agg, layout)
+        _MAPPER_CACHE[key] = mapper
+    return mapper
@@ -0,0 +1,148 @@
+import math
+from typing import Any, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SPACE = 32 # Codepoint of " "
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+_scale_maps: Dict[Tuple[int, int, int, int], "ScaleMap"] = {}
+
+def codes(s: str) -> Any:
+    """Codepoints of `s` as a uint32 array."""
+    return np.frombuffer(s.encode('utf-32-le'), dtype=np.uint32)
+
+def _rgb(c: Any) -> Tuple[int, int, int]:
+    """Clamp an (r, g, b) triple to 0..255 (legacy effects may overshoot, e.g. beat flashes)."""
+    return (min(255, max(0, int(c[0]))), min(255, max(0, int(c[1]))), min(255, max(0, int(c[2]))))
+
+class FrameBuffer:
+    """
+    One frame of terminal cells as numpy planes, reused across frames.
+
+    - chars: (h, w) uint32 Unicode codepoints
+    - fg, bg: (h, w, 3) uint8 RGB
+
+    Drawing code works on slices and boolean masks of these planes instead of
+    per-cell Python objects. `legacy_view()` exposes the old nested-list API.
+    """
+    def __init__(self, w: int = 0, h: int = 0) -> None:
+        self.w = 0
+        self.h = 0
+        self._legacy: Any = None
+        self.resize(w, h)
+
+    def resize(self, w: int, h: int) -> bool:
+        """Reallocate for a new size. Returns True if the planes were replaced."""
+        w, h = max(0, w), max(0, h)
+        if w == self.w and h == self.h and hasattr(self, 'chars'): return False
+        self.w, self.h = w, h
+        self.chars = np.full((h, w), SPACE, dtype=np.uint32)
+        self.fg = np.full((h, w, 3), 255, dtype=np.uint8)
+        self.bg = np.zeros((h, w, 3), dtype=np.uint8)
+        self._legacy = None
+        return True
+
+    def clear(self, fg: Tuple[int, int, int] = WHITE, bg: Tuple[int, int, int] = BLACK) -> None:
+        self.chars.fill(SPACE)
+        # Grey levels (the usual case) are plain memsets
+        if fg[0] == fg[1] == fg[2]: self.fg.fill(fg[0])
+        else: self.fg[...] = fg
+        if bg[0] == bg[1] == bg[2]: self.bg.fill(bg[0])
+        else: self.bg[...] = bg
+
+    def put(self, y: int, x: int, char: str, fg: Any, bg: Any = BLACK) -> None:
+        """Set one cell (ignored if outside the buffer)."""
+        if 0 <= y < self.h and 0 <= x < self.w:
+            self.chars[y, x] = ord(char)
+            self.fg[y, x] = fg
+            self.bg[y, x] = bg
+
+    def text(self, y: int, x: int, s: str, fg: Any, bg: Any = BLACK) -> None:
+        """Write `s` left to right from (y, x), clipped to the buffer."""
+        if not (0 <= y < self.h) or not s: return
+        a, b = max(0, x), min(self.w, x + len(s))
+        if a >= b: return
+        self.chars[y, a:b] = codes(s[a - x:b - x])
+        self.fg[y, a:b] = fg
+        self.bg[y, a:b] = bg
+
+    def legacy_view(self) -> Tuple[List[Any], List[Any]]:
+        """
+        (buf, cbf) row proxies for list-based effects: `buf[y][x] = ch` and
+        `cbf[y][x] = (fg, bg)` write straight into the planes. Only the cells an
+        effect touches are converted, so the adapter costs nothing for idle effects.
+        """
+        if self._legacy is None:
+            self._legacy = ([_CharRow(self, y) for y in range(self.h)],
+                            [_ColorRow(self, y) for y in range(self.h)])
+        return self._legacy
+
+def logical_size(w: int, h: int, max_cells: int = 0, fixed_w: int = 0, fixed_h: int = 0) -> Tuple[int, int]:
+    """
+    Render resolution for a w x h screen: `fixed_w`/`fixed_h` (if set, at most
+    the screen), then shrunk evenly in both directions to at most `max_cells`
+    cells (0 = no limit). Drawing cost depends on this size, not the screen's.
+    """
+    lw = min(w, fixed_w) if fixed_w > 0 else w
+    lh = min(h, fixed_h) if fixed_h > 0 else h
+    if max_cells > 0 and lw * lh > max_cells:
+        f = math.sqrt(max_cells / (lw * lh))
+        lw, lh = max(1, int(lw * f)), max(1, int(lh * f))
+    return max(0, lw), max(0, lh)
+
+class ScaleMap:
+    """
+    Nearest-neighbour upscaling of a logical lw x lh frame to a w x h screen by
+    precomputed index maps: screen cell (y, x) shows logical cell (rows[y], cols[x]).
+    Factors need not be integers (each logical row/column covers the floor or
+    ceiling of the ratio). Get instances from `scale_map()` so equal maps are
+    the same object.
+    """
+    def __init__(self, w: int, h: int, lw: int, lh: int) -> None:
+        self.w, self.h = w, h
+        self.lw, self.lh = lw, lh
+        self.rows = np.arange(h, dtype=np.intp) * lh // max(1, h)
+        self.cols = np.arange(w, dtype=np.intp) * lw // max(1, w)
+        self.identity = (w, h) == (lw, lh)
+
+    def apply(self, plane: Any) -> Any:
+        """A (lh, lw, ...) plane at screen size (the plane itself for an identity map)."""
+        if self.identity: return plane
+        return plane.take(self.rows, axis=0).take(self.cols, axis=1)
+
+def scale_map(w: int, h: int, lw: int, lh: int) -> ScaleMap:
+    """Cached ScaleMap from a lw x lh frame to a w x h screen."""
+    key = (w, h, lw, lh)
+    m = _scale_maps.get(key)
+    if m is None:
+        if len(_scale_maps) > 64: _scale_maps.clear()
+        m = _scale_maps[key] = ScaleMap(w, h, lw, lh)
+    return m
+
+class _CharRow:
+    __slots__ = ("fb", "y")
+    def __init__(self, fb: FrameBuffer, y: int) -> None:
+        self.fb = fb
+        self.y = y
+    def __len__(self) -> int: return self.fb.w
+    def __getitem__(self, x: int) -> str: return chr(self.fb.chars[self.y, x])
+    def __setitem__(self, x: int, ch: str) -> None: self.fb.chars[self.y, x] = ord(ch[0]) if ch else SPACE
+
+class _ColorRow:
+    __slots__ = ("fb", "y")
+    def __init__(self, fb: FrameBuffer, y: int) -> None:
+        self.fb = fb
+        self.y = y
+    def __len__(self) -> int: return self.fb.w
+    def __getitem__(self, x: int) -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
+        fb = self.fb
+        return (tuple(fb.fg[self.y, x].tolist()), tuple(fb.bg[self.y, x].tolist()))
+    def __setitem__(self, x: int, style: Any) -> None:
+        fg, bg = style
+        self.fb.fg[self.y, x] = _rgb(fg)
+        self.fb.bg[self.y, x] = _rgb(bg)
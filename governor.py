@@ -0,0 +1,81 @@
+import time
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Quality steps, cheapest loss first; each level keeps the cuts of the ones before it
+GOVERNOR_LEVELS = ("full", "stars", "life", "texture", "canvas", "colour")
+
+class QualityGovernor:
+    """
+    Holds the target frame rate by shedding rendering work.
+
+    Frame times (drawing and encoding, not the pacing wait) go into a ring of
+    the last WINDOW frames. Every CHECK_SEC the PERCENTILE of the ring is
+    compared with the frame budget (1 / fps): above HIGH of it the level steps
+    down one GOVERNOR_LEVELS entry; after RECOVER_SEC below LOW it steps back up.
+    The ring is cleared on every change so the next decision only sees frames
+    drawn at the new level.
+
+    `apply(state)` returns the state the frame is drawn with: the user's
+    settings with this level's cuts on top (the settings themselves are
+    never changed).
+    """
+    WINDOW = 60
+    PERCENTILE = 90
+    CHECK_SEC = 0.5
+    HIGH = 0.95
+    LOW = 0.6
+    RECOVER_SEC = 3.0
+
+    def __init__(self) -> None:
+        self.level = 0
+        self.times = np.zeros(self.WINDOW) if np else None
+        self.count = 0
+        self.frame_time = 0.0 # PERCENTILE of the ring at the last check
+        now = time.monotonic()
+        self.checked = now
+        self.calm_since = now
+
+    @property
+    def name(self) -> str: return GOVERNOR_LEVELS[self.level]
+
+    def reset(self) -> None:
+        self.level = 0
+        self.count = 0
+
+    def update(self, frame_time: float, fps: float, now: Optional[float] = None) -> None:
+        """Feed the time one frame took (seconds) at a target of `fps`."""
+        now = time.monotonic() if now is None else now
+        self.times[self.count % self.WINDOW] = frame_time
+        self.count += 1
+        if now - self.checked < self.CHECK_SEC or self.count < min(self.WINDOW, 10): return
+        self.checked = now
+        self.frame_time = float(np.percentile(self.times[:min(self.count, self.WINDOW)], self.PERCENTILE))
+        budget = 1.0 / max(1.0, fps)
+        if self.frame_time > budget * self.HIGH:
+            if self.level < len(GOVERNOR_LEVELS) - 1:
+                self.level += 1
+                self.count = 0
+            self.calm_since = now
+        elif self.frame_time < budget * self.LOW:
+            if self.level > 0 and now - self.calm_since >= self.RECOVER_SEC:
+                self.level -= 1
+                self.count = 0
+                self.calm_since = now
+        else:
+            self.calm_since = now
+
+    def apply(self, state: dict) -> dict:
+        """`state` with the cuts of the current level (the same dict at full quality)."""
+        if self.level == 0: return state
+        state = dict(state)
+        if self.level >= 1: state['star_density'] = 0.5 * state.get('star_density', 1.0)
+        if self.level >= 2: state['life_every'] = 2 * state.get('life_every', 3)
+        if self.level >= 3: state['img_fg_on'] = False
+        if self.level >= 4: state['render_scale'] = 0.5 * state.get('render_scale', 1.0)
+        if self.level >= 5 and state.get('color_depth', 'auto') != '16': state['color_depth'] = '256'
+        return state
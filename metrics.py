@@ -0,0 +1,234 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from logger import setup_logger
+
+logger = setup_logger("Metrics")
+
+DEFAULT_INTERVAL = 10.0 # Seconds between JSON-lines records
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8" # Prometheus text exposition format
+MAX_REQUEST = 8192 # Request bytes read before answering (the path is all that matters)
+
+PERCENTILES = ("50", "95", "99") # Of the profiler's stage percentiles (a gauge label: "quantile" is reserved for summaries)
+
+# (labels, value) of one sample; every metric family has one or more
+Sample = Tuple[Dict[str, str], float]
+
+def parse_endpoint(spec: str) -> Optional[Tuple[int, Any]]:
+    """
+    (address family, address) of a 'metrics_endpoint' setting, None when off:
+    'unix:PATH' for a Unix socket, 'HOST:PORT', or a bare 'PORT' on localhost.
+    """
+    spec = (spec or "").strip()
+    if not spec or spec.lower() == "off": return None
+    if spec.startswith("unix:"):
+        if not hasattr(socket, "AF_UNIX"): raise ValueError("Unix sockets are not available on this platform")
+        return (socket.AF_UNIX, spec[5:])
+    host, _, port = spec.rpartition(":")
+    return (socket.AF_INET, (host or "127.0.0.1", int(port)))
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+def parse_prometheus(text: str) -> Dict[str, float]:
+    """Samples of a Prometheus text page as {'name{labels}': value} (comments skipped)."""
+    out = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"): continue
+        key, _, value = line.rpartition(" ")
+        try: out[key] = float(value)
+        except ValueError: pass
+    return out
+
+def fetch(endpoint: str, timeout: float = 0.5) -> Dict[str, float]:
+    """Scrape a metrics endpoint (see parse_endpoint). Raises OSError if nothing answers or the endpoint is malformed."""
+    try: target = parse_endpoint(endpoint)
+    except ValueError as e: raise OSError(f"bad metrics endpoint {endpoint!r}: {e}") from e
+    if target is None: raise OSError("metrics endpoint is off")
+    family, address = target
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk: break
+            chunks.append(chunk)
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    status = head.split(b"\r\n", 1)[0].split()
+    if len(status) < 2 or status[1] != b"200": raise OSError(f"metrics endpoint answered {head[:40]!r}")
+    return parse_prometheus(body.decode("utf-8", "replace"))
+
+class MetricsHandler(socketserver.StreamRequestHandler):
+    """Minimal HTTP/1.0: GET / or /metrics returns the exporter's page, anything else 404."""
+    timeout = 2.0 # A client that never finishes its request does not hold a thread
+
+    def handle(self) -> None:
+        try:
+            request = self.rfile.readline(MAX_REQUEST)
+            read = len(request)
+            while read < MAX_REQUEST: # Skip headers up to the blank line
+                line = self.rfile.readline(MAX_REQUEST)
+                read += len(line)
+                if line in (b"\r\n", b"\n", b""): break
+        except OSError:
+            return
+        parts = request.split()
+        path = parts[1].split(b"?")[0] if len(parts) > 1 else b""
+        if parts and parts[0] in (b"GET", b"HEAD") and path in (b"/", b"/metrics"):
+            body = self.server.exporter.prometheus().encode("utf-8")
+            status = b"200 OK"
+        else:
+            body = b"not found\n"
+            status = b"404 Not Found"
+        head = (b"HTTP/1.0 " + status + b"\r\nContent-Type: " + CONTENT_TYPE.encode()
+                + b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n")
+        self.wfile.write(head if parts and parts[0] == b"HEAD" else head + body)
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+class MetricsExporter:
+    """
+    Counters and gauges of a running engine, for monitoring.
+
+    Nothing is pushed from the render or audio threads: every scrape reads the
+    counters the renderer, its governor and profiler, and the audio provider
+    already keep (plain attributes, so a reading may be a frame old). When
+    nothing scrapes, the cost to the hot path is zero.
+
+    `serve()` answers on a localhost port or a Unix socket in the Prometheus
+    text format; `write_jsonl()` appends one JSON record every `interval`
+    seconds to a file. Both run on daemon threads.
+    """
+    def __init__(self, renderer: Any, audio: Any) -> None:
+        self.renderer = renderer
+        self.audio = audio
+        self.started = time.time()
+        self.server: Any = None
+        self.socket_path: Optional[str] = None
+        self.stop = threading.Event()
+
+    def families(self) -> List[Tuple[str, str, str, List[Sample]]]:
+        """(name, type, help, samples) of every metric, read now."""
+        r, a = self.renderer, self.audio
+        frame = getattr(a, "frame", None)
+        status = str(getattr(a, "status", ""))
+        stages = [({"stage": name, "percentile": q}, p / 1e3) # Profiler percentiles are in ms
+                  for name, _, ps in r.profiler.stats() for q, p in zip(PERCENTILES, ps)]
+
+        def one(value: float) -> List[Sample]: return [({}, float(value))]
+        return [
+            ("pyviz_frames_generated_total", "counter", "Frames drawn", one(r.frames_generated)),
+            ("pyviz_frames_presented_total", "counter", "Frames written to the terminal", one(r.frames_presented)),
+            ("pyviz_frames_dropped_total", "counter", "Frames replaced by a newer one before they were written", one(r.frames_dropped)),
+            ("pyviz_generated_fps", "gauge", "Frames drawn per second", one(r.generated_fps)),
+            ("pyviz_presented_fps", "gauge", "Frames written per second", one(r.presented_fps)),
+            ("pyviz_output_bytes_total", "counter", "Bytes written to the terminal (ANSI backend)", one(r.bytes_written)),
+            ("pyviz_output_bytes_per_second", "gauge", "Terminal write throughput while writing (moving average)", one(r.output_rate)),
+            ("pyviz_backpressure_level", "gauge", "Output backpressure step (0 = full colour and rate)", one(r.backpressure.level)),
+            ("pyviz_quality_level", "gauge", "Quality governor step (0 = full quality)", one(r.governor.level)),
+            ("pyviz_frame_seconds", "gauge", "Frame time percentile seen by the quality governor", one(r.governor.frame_time)),
+            ("pyviz_stage_seconds", "gauge", "Per-stage frame time percentile over the profiler window", stages),
+            ("pyviz_audio_frames_total", "counter", "Audio analysis frames published", one(frame.seq if frame is not None else 0)),
+            ("pyviz_audio_overflows_total", "counter", "Audio input overflows (lost capture blocks)", one(getattr(a, "overflow_count", 0))),
+            ("pyviz_audio_reconnects_total", "counter", "Audio stream failures retried", one(getattr(a, "reconnect_count", 0))),
+            ("pyviz_audio_analysis_seconds", "gauge", "Compute time of the last analysis hop", one(getattr(a, "analysis_time", 0.0))),
+            ("pyviz_audio_latency_seconds", "gauge", "Capture to publish latency of the last analysis hop", one(getattr(a, "analysis_latency", 0.0))),
+            ("pyviz_audio_connected", "gauge", "1 while the audio input is delivering", one(status.endswith(("CONNECTED", "STREAMING")))),
+            ("process_cpu_seconds_total", "counter", "CPU time of the engine process", one(time.process_time())),
+            ("process_start_time_seconds", "gauge", "Engine start, seconds since the epoch", one(self.started)),
+        ]
+
+    def prometheus(self) -> str:
+        lines = []
+        for name, kind, help_text, samples in self.families():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """One JSON-lines record: the time plus every sample as 'name{labels}': value."""
+        record: Dict[str, Any] = {"time": round(time.time(), 3)}
+        for name, _, _, samples in self.families():
+            for labels, value in samples:
+                record[name + format_labels(labels)] = value
+        return record
+
+    def serve(self, endpoint: str) -> bool:
+        """Start answering scrapes at `endpoint`. Returns False (and logs why) if it can't bind."""
+        try:
+            target = parse_endpoint(endpoint)
+            if target is None: return False
+            family, address = target
+            if family == socket.AF_INET:
+                server = _TCPServer(address, MetricsHandler)
+            else:
+                if os.path.exists(address):
+                    # Only a socket nobody answers on is stale; a live one belongs to another engine
+                    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    try:
+                        probe.connect(address)
+                        raise OSError(f"{address} is in use")
+                    except ConnectionRefusedError:
+                        os.unlink(address)
+                    finally:
+                        probe.close()
+                server = _UnixServer(address, MetricsHandler)
+                self.socket_path = address
+        except (OSError, ValueError) as e:
+            logger.warning(f"Metrics endpoint {endpoint!r} unavailable: {e}")
+            return False
+        server.exporter = self
+        self.server = server
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics on {endpoint}")
+        return True
+
+    def write_jsonl(self, path: str, interval: float = DEFAULT_INTERVAL) -> None:
+        """Append a snapshot to `path` every `interval` seconds until close()."""
+        def run() -> None:
+            try:
+                with open(path, "a") as f:
+                    while not self.stop.wait(interval):
+                        f.write(json.dumps(self.snapshot()) + "\n")
+                        f.flush()
+            except OSError as e:
+                logger.warning(f"Metrics file {path!r} failed: {e}")
+        threading.Thread(target=run, name="metrics-jsonl", daemon=True).start()
+        logger.info(f"Writing metrics to {path} every {interval:g}s")
+
+    def close(self) -> None:
+        self.stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.socket_path:
+            try: os.unlink(self.socket_path)
+            except OSError: pass
+            self.socket_path = None
+
+def start_exporter(state: dict, renderer: Any, audio: Any) -> Optional[MetricsExporter]:
+    """The exporter the settings ask for ('metrics_endpoint', 'metrics_jsonl'), or None."""
+    endpoint = state.get('metrics_endpoint', '')
+    path = state.get('metrics_jsonl', '')
+    if not endpoint and not path: return None
+    exporter = MetricsExporter(renderer, audio)
+    if endpoint: exporter.serve(endpoint)
+    if path: exporter.write_jsonl(path, max(1.0, float(state.get('metrics_interval', DEFAULT_INTERVAL))))
+    return exporter
@@ -0,0 +1,84 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class StageProfiler:
+    """
+    Per-stage frame timings on time.perf_counter_ns.
+
+    Stages are timed as laps: `start()` at the top of a frame, then `lap(name)`
+    after each stage charges the time since the previous mark to `name`
+    (`skip()` moves the mark without charging, e.g. past the pacing wait).
+    `add()` records a duration measured elsewhere, such as the writer thread's
+    terminal writes. Everything is recorded from the render thread; other
+    threads (the metrics server) only read `stats()`.
+
+    Every stage keeps its last WINDOW samples in a ring; `percentiles()` gives
+    p50/p95/p99 over it, `summary()` a table for the log.
+    """
+    WINDOW = 300
+    HUD_EVERY_SEC = 0.5 # The HUD line is recomputed this often
+
+    def __init__(self) -> None:
+        self.rings: Dict[str, Any] = {}
+        self.counts: Dict[str, int] = {}
+        self.mark = time.perf_counter_ns()
+        self.hud = ""
+        self.hud_time = 0.0
+
+    def start(self) -> None:
+        self.mark = time.perf_counter_ns()
+
+    def skip(self) -> None:
+        self.mark = time.perf_counter_ns()
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter_ns()
+        self.add(name, now - self.mark)
+        self.mark = now
+
+    def add(self, name: str, ns: int) -> None:
+        ring = self.rings.get(name)
+        if ring is None:
+            ring = self.rings[name] = np.zeros(self.WINDOW, dtype=np.int64)
+            self.counts[name] = 0
+        n = self.counts[name]
+        ring[n % self.WINDOW] = ns
+        self.counts[name] = n + 1
+
+    def reset(self) -> None:
+        self.rings.clear()
+        self.counts.clear()
+
+    def percentiles(self, name: str) -> Tuple[float, float, float]:
+        """(p50, p95, p99) of a stage in milliseconds."""
+        n = min(self.counts.get(name, 0), self.WINDOW)
+        if n == 0: return (0.0, 0.0, 0.0)
+        p = np.percentile(self.rings[name][:n], (50, 95, 99)) / 1e6
+        return (float(p[0]), float(p[1]), float(p[2]))
+
+    def stats(self) -> List[Tuple[str, int, Tuple[float, float, float]]]:
+        """(stage, samples, percentiles) for every stage, slowest p95 first."""
+        # Snapshot the stage names: the render thread may add a stage while another thread reads
+        rows = [(name, self.counts.get(name, 0), self.percentiles(name)) for name in list(self.rings)]
+        rows.sort(key=lambda r: r[2][1], reverse=True)
+        return rows
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<22}{'frames':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+        for name, n, (p50, p95, p99) in self.stats():
+            lines.append(f"{name:<22}{n:>8}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}")
+        return "\n".join(lines)
+
+    def hud_line(self, now: Optional[float] = None) -> str:
+        """The slowest stages by p95 (ms), refreshed every HUD_EVERY_SEC."""
+        now = time.monotonic() if now is None else now
+        if now - self.hud_time >= self.HUD_EVERY_SEC:
+            self.hud_time = now
+            self.hud = "PROF p50/p95/p99 ms: " + " | ".join(
+                f"{name} {p50:.1f}/{p95:.1f}/{p99:.1f}" for name, _, (p50, p95, p99) in self.stats())
+        return self.hud
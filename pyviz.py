@@ -17,24 +17,78 @@ from config import CONFIG_FILE, PRESETS_FILE, DEFAULT_STATE, THEMES, FONT_MAP
 from audio_engine import AudioPump
 from renderer import Renderer
 
+# ==========================================
+# /// STATE ///
+# ==========================================
+class StateManager:
+    """Reloads the settings file when it changes and pushes audio settings to `audio`."""
+    def __init__(self, audio, push_device=True):
+        self.audio = audio
+        self.push_device = push_device # Offline sources and shared clients have no device to select
+        self.state = DEFAULT_STATE.copy()
+        self.last_load_time = 0
+        self.last_check = 0
+        # Set to None to ensure we trigger an update on first frame
+        self.last_dev_name = None
+
+    def get_state(self):
+        # Performance: Only check file system every 1.0 seconds
+        now = time.time()
+        if now - self.last_check > 1.0:
+            self.last_check = now
+            try:
+                if os.path.exists(CONFIG_FILE):
+                    mtime = os.path.getmtime(CONFIG_FILE)
+                    if mtime > self.last_load_time:
+                        with open(CONFIG_FILE, 'r') as f:
+                            new_state = DEFAULT_STATE.copy()
+                            new_state.update(json.load(f))
+                            self.state = new_state
+                            self.last_load_time = mtime
+            except Exception:
+                pass
+
+        # Push device update if changed
+        if self.push_device and self.state['dev_name'] != self.last_dev_name:
+            self.audio.set_device(self.state['dev_name'])
+            self.last_dev_name = self.state['dev_name']
+
+        # Push beat threshold
+        self.audio.set_config(self.state)
+
+        return self.state
+
 # ==========================================
 # /// VISUALIZER RENDERER ///
 # ==========================================
-def run_engine():
+def run_engine(source=None, shared=False):
     logger.info("Starting Visualizer Engine")
 
-    # 1. Start Audio Thread
-    audio = AudioPump()
+    # 1. Start Audio Thread (live device unless an offline source was given),
+    # or attach to a running analyzer
+    audio = None
+    if shared:
+        from audio_share import SharedAudioClient
+        try:
+            audio = SharedAudioClient()
+            logger.info("Attached to shared audio analyzer")
+        except (FileNotFoundError, RuntimeError) as e:
+            logger.warning(f"No shared analyzer ({e}), using local audio")
+            shared = False
+    if audio is None:
+        audio = AudioPump(source)
 
     # Ensure audio stops on exit
     import atexit
     _cleanup_done = False
+    exporter = None
 
     def cleanup():
         nonlocal _cleanup_done
         if _cleanup_done: return
         _cleanup_done = True
 
+        if exporter is not None: exporter.close()
         logger.info("Stopping audio thread...")
         audio.running = False
         if audio.is_alive():
@@ -47,45 +101,14 @@ def run_engine():
     # 2. Setup Renderer
     renderer = Renderer()
 
-    # 3. State Management Wrapper
-    class StateManager:
-        def __init__(self):
-            self.state = DEFAULT_STATE.copy()
-            self.last_load_time = 0
-            self.last_check = 0
-            # Set to None to ensure we trigger an update on first frame
-            self.last_dev_name = None
-
-        def get_state(self):
-            # Performance: Only check file system every 1.0 seconds
-            now = time.time()
-            if now - self.last_check > 1.0:
-                self.last_check = now
-                try:
-                    if os.path.exists(CONFIG_FILE):
-                        mtime = os.path.getmtime(CONFIG_FILE)
-                        if mtime > self.last_load_time:
-                            with open(CONFIG_FILE, 'r') as f:
-                                new_state = DEFAULT_STATE.copy()
-                                new_state.update(json.load(f))
-                                self.state = new_state
-                                self.last_load_time = mtime
-                except Exception:
-                    pass
-
-            # Push device update if changed
-            if self.state['dev_name'] != self.last_dev_name:
-                audio.set_device(self.state['dev_name'])
-                self.last_dev_name = self.state['dev_name']
-
-            # Push beat threshold
-            audio.set_config(self.state)
-
-            return self.state
-
-    manager = StateManager()
-
-    # 4. Hand over control to Rich Render Loop
+    # 3. State Management
+    manager = StateManager(audio, push_device=source is None and not shared)
+
+    # 4. Metrics endpoint / file, per the settings at startup
+    from metrics import start_exporter
+    exporter = start_exporter(manager.get_state(), renderer, audio)
+
+    # 5. Hand over control to Rich Render Loop
     try:
         renderer.render_loop(manager.get_state, audio)
     except KeyboardInterrupt:
@@ -99,6 +122,46 @@ def run_engine():
     finally:
         cleanup()
 
+# ==========================================
+# /// SHARED ANALYZER ///
+# ==========================================
+def run_analyzer(source=None):
+    """Headless audio analysis published to shared memory for any number of engines."""
+    from audio_share import SharedAudioServer, SharedAudioPump, HEARTBEAT_SEC
+    logger.info("Starting shared audio analyzer")
+    try:
+        server = SharedAudioServer()
+    except RuntimeError as e:
+        logger.info(str(e))
+        print(str(e))
+        return
+
+    # terminate() from the controller should still unlink the block
+    import signal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    audio = SharedAudioPump(server, source)
+    manager = StateManager(audio, push_device=source is None)
+    manager.get_state()
+    audio.start()
+    try:
+        while audio.is_alive():
+            manager.get_state()
+            audio.heartbeat()
+            time.sleep(HEARTBEAT_SEC)
+        audio.heartbeat() # Final status (e.g. END OF STREAM)
+        # Offline source finished: keep serving the last frame until stopped
+        while True:
+            audio.heartbeat()
+            time.sleep(HEARTBEAT_SEC)
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Analyzer stopped")
+    finally:
+        audio.running = False
+        if audio.is_alive():
+            audio.join(timeout=0.5)
+        server.close()
+
 # ==========================================
 # /// CONTROLLER ///
 # ==========================================
@@ -149,9 +212,25 @@ def run_controller():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PyViz Audio Visualizer")
     parser.add_argument("--engine", action="store_true", help="Run the rendering engine directly")
+    parser.add_argument("--analyzer", action="store_true", help="Run only the audio analysis and publish it to shared memory")
+    parser.add_argument("--shared", action="store_true", help="Engine reads audio from a running --analyzer instead of opening the device")
+    parser.add_argument("--source", default="", help="Audio source instead of the live device: file:PATH (WAV / raw f32le), pipe (f32le on stdin), synth:sine|sweep|noise|clicks")
+    parser.add_argument("--loop", action="store_true", help="Loop file sources")
+    parser.add_argument("--fast", action="store_true", help="Feed file / synthetic sources as fast as possible instead of in real time")
+    parser.add_argument("--rate", type=int, default=44100, help="Sample rate for raw, pipe and synthetic sources")
+    parser.add_argument("--channels", type=int, default=2, help="Channel count for raw, pipe and synthetic sources")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic sources")
     args = parser.parse_args()
 
-    if args.engine:
-        run_engine()
+    if args.engine or args.analyzer:
+        source = None
+        if args.source:
+            from audio_sources import create_source
+            source = create_source(args.source, loop=args.loop, realtime=not args.fast,
+                                   sample_rate=args.rate, channels=args.channels, seed=args.seed)
+        if args.analyzer:
+            run_analyzer(source)
+        else:
+            run_engine(source, shared=args.shared)
     else:
         run_controller()
@@ -1,8 +1,19 @@
+import collections
 import os
+import sys
 import random
 import time
 from typing import List, Tuple, Any, Callable, Optional, Union
 from config import THEMES, FONT_MAP, CHAR_SETS
+from filterbank import get_band_mapper
+from audio_engine import AudioFrame
+from framebuffer import FrameBuffer, ScaleMap, codes, logical_size, scale_map, SPACE
+from assets import ASSETS, DEFAULT_BUDGET_MB, AssetLoader
+from subcell import PixelCanvas, cell_pixels, mirror_braille
+from governor import QualityGovernor
+from profiler import StageProfiler
+from logger import setup_logger
+from ansi import Backpressure, DiffPresenter, FrameWriter, TerminalWriter, detect_depth, poorer_depth, resolve_backend, resolve_depth, sync_supported, SYNC_BEGIN, SYNC_END, RATE_LEVELS
 from effects.glitch import GlitchEffect
 from effects.matrix import MatrixEffect
 from effects.pong import PongEffect
@@ -17,10 +28,8 @@ from rich.panel import Panel
 from rich.console import Console
 
 try:
-    from PIL import Image, ImageSequence # type: ignore
     import numpy as np
 except ImportError:
-    Image = None
     np = None
 
 try:
@@ -29,57 +38,14 @@ try:
 except ImportError:
     HAS_FIGLET = False
 
+logger = setup_logger("Renderer")
+
 # Global Constants
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
+RICH_COLOR_SYSTEMS = {"truecolor": "truecolor", "256": "256", "16": "standard"} # color_depth -> Rich color_system
 
 # Helpers
-_IMG_CACHE = {}
-def process_image(path: str, w: int, h: int) -> Union[List[List[Tuple[int, int, int, int]]], List[List[List[Tuple[int, int, int, int]]]]]:
-    """
-    Returns either a single buffer (static image) or a list of buffers (animated GIF).
-    Buffer = List of Rows, Row = List of RGBA Tuples.
-    """
-    key = (path, w, h)
-    if key in _IMG_CACHE: return _IMG_CACHE[key]
-
-    if not path or not os.path.exists(path): return []
-    if Image is None: return []
-
-    try:
-        im = Image.open(path)
-
-        frames = []
-        is_animated = getattr(im, "is_animated", False)
-        # Proper Loop
-        frames = []
-        frame_iter = ImageSequence.Iterator(im) if is_animated else [im]
-        for frame in frame_iter:
-            # Force RGBA for alpha channel support
-            f_img = frame.copy().resize((w, h)).convert("RGBA")
-            px = f_img.load()
-            frame_buf = []
-            for y in range(h):
-                row = []
-                for x in range(w):
-                    r,g,b,a = px[x,y]
-                    row.append((r,g,b,a))
-                frame_buf.append(row)
-            frames.append(frame_buf)
-
-        result = frames if is_animated else frames[0]
-
-        # Simple cache eviction
-        if len(_IMG_CACHE) > 5: _IMG_CACHE.clear() # Lower limit for GIFs
-
-        # Memory Safety: Cap frames
-        if is_animated and len(result) > 100:
-            result = result[:100] # Limit to first 100 frames to prevent OOM
-
-        _IMG_CACHE[key] = result
-        return result
-    except Exception: return []
-
 # Cached gradient calculation
 _GRADIENT_CACHE = {}
 def get_gradient_color(y: int, h: int, start_rgb: Union[List[int], Tuple[int, int, int]], end_rgb: Union[List[int], Tuple[int, int, int]]) -> Tuple[int, int, int]:
@@ -100,6 +66,17 @@ def get_gradient_color(y: int, h: int, start_rgb: Union[List[int], Tuple[int, in
     _GRADIENT_CACHE[key] = res
     return res
 
+_GRADIENT_ROWS_CACHE = {}
+def gradient_rows(h: int, start_rgb: Union[List[int], Tuple[int, int, int]], end_rgb: Union[List[int], Tuple[int, int, int]]) -> Any:
+    """(h, 3) uint8 gradient, row 0 (top) = end colour, bottom row = start colour."""
+    key = (h, tuple(start_rgb), tuple(end_rgb))
+    rows = _GRADIENT_ROWS_CACHE.get(key)
+    if rows is None:
+        rows = np.array([get_gradient_color(h - 1 - y, h, start_rgb, end_rgb) for y in range(h)], dtype=np.uint8)
+        if len(_GRADIENT_ROWS_CACHE) > 64: _GRADIENT_ROWS_CACHE.clear()
+        _GRADIENT_ROWS_CACHE[key] = rows
+    return rows
+
 def col_style(fg: Tuple[int,int,int], bg: Tuple[int,int,int]=BLACK) -> Tuple[Tuple[int,int,int], Tuple[int,int,int]]:
     return (fg, bg)
 
@@ -120,20 +97,55 @@ class Star:
         if self.z <= 0.05:
             self.reset()
 
-    def draw(self, buf: List[List[str]], cbf: List[List[Tuple[Tuple[int,int,int], Tuple[int,int,int]]]], w: int, h: int, col_style_fn: Callable) -> None:
-        if self.z <= 0:
-            return
-
-        fx = int((self.x / self.z) * w * 0.5 + w / 2)
-        fy = int((self.y / self.z) * h * 0.5 + h / 2)
-
-        if 0 <= fx < w and 0 <= fy < h:
-            try:
-                if buf[fy][fx] == " ":
-                    buf[fy][fx] = '.'
-                    cbf[fy][fx] = col_style_fn((255, 255, 255))
-            except Exception:
-                pass
+def draw_stars(fb: FrameBuffer, stars: List[Star]) -> None:
+    """Project all stars at once; a star only shows on empty cells."""
+    if not stars or fb.w <= 0 or fb.h <= 0: return
+    xyz = np.array([(s.x, s.y, s.z) for s in stars])
+    xyz = xyz[xyz[:, 2] > 0]
+    w, h = fb.w, fb.h
+    fx = ((xyz[:, 0] / xyz[:, 2]) * w * 0.5 + w / 2).astype(int)
+    fy = ((xyz[:, 1] / xyz[:, 2]) * h * 0.5 + h / 2).astype(int)
+    keep = (fx >= 0) & (fx < w) & (fy >= 0) & (fy < h)
+    fx, fy = fx[keep], fy[keep]
+    empty = fb.chars[fy, fx] == SPACE
+    fx, fy = fx[empty], fy[empty]
+    fb.chars[fy, fx] = ord('.')
+    fb.fg[fy, fx] = WHITE
+    fb.bg[fy, fx] = BLACK
+
+# Rich output: one style string per (fg, bg) pair
+_STYLE_CACHE = {}
+def _style_for(key: int) -> str:
+    style = _STYLE_CACHE.get(key)
+    if style is None:
+        fg, bg = key >> 24, key & 0xFFFFFF
+        style = f"rgb({fg >> 16},{(fg >> 8) & 255},{fg & 255})"
+        if bg: # Black background is left to the terminal
+            style += f" on rgb({bg >> 16},{(bg >> 8) & 255},{bg & 255})"
+        if len(_STYLE_CACHE) > 4096: _STYLE_CACHE.clear()
+        _STYLE_CACHE[key] = style
+    return style
+
+def framebuffer_to_text(fb: FrameBuffer, scale: Optional[ScaleMap] = None) -> Text:
+    """Build Rich Text from the planes (upscaled by `scale`), one segment per run of identical colours."""
+    fg = fb.fg.astype(np.uint64)
+    bg = fb.bg.astype(np.uint64)
+    keys = (((fg[..., 0] << 16) | (fg[..., 1] << 8) | fg[..., 2]) << 24) | (bg[..., 0] << 16) | (bg[..., 1] << 8) | bg[..., 2]
+    chars = fb.chars
+    if scale is not None:
+        chars, keys = scale.apply(chars), scale.apply(keys)
+
+    screen_text = Text()
+    for y in range(chars.shape[0]):
+        line = Text()
+        row = chars[y].tobytes().decode('utf-32-le')
+        k = keys[y]
+        cuts = (np.flatnonzero(k[1:] != k[:-1]) + 1).tolist()
+        for a, b in zip([0] + cuts, cuts + [len(row)]):
+            line.append(row[a:b], style=_style_for(int(k[a])))
+        screen_text.append(line)
+        screen_text.append("\n")
+    return screen_text
 
 class Renderer:
     """
@@ -150,91 +162,76 @@ class Renderer:
             WaterfallEffect(), OscilloscopeEffect(), LissajousEffect(), GameOfLifeEffect()
         ]
 
-        self.buf_bg: Any = [] # List or List[List]
-        self.buf_fg: Any = []
-        self.last_w: int = 0
-        self.last_h: int = 0
-        self.last_bg_path: str = ""
-        self.last_fg_path: str = ""
+        self.fb: Optional[FrameBuffer] = None
+        self.canvas = PixelCanvas() # Sub-cell bar raster
+        self.assets = AssetLoader(ASSETS) # Decodes images off the render thread
         self.frame_idx = 0
         self.console = Console()
 
-        # Max resolution to prevent lag on huge terminals
-        self.MAX_BARS = 160
-
-    def generate_frame(self, state: dict, audio: Any, console_w: int, h: int) -> Text:
-        if not np:
-            return Text("Numpy missing - Cannot render", style="bold red")
-
-        if h <= 0 or console_w <= 0:
-            return Text("")
-
-        # Logic for downsampling / limiting bars
-        # If console width is huge, we calculate fewer bars and stretch them.
-        w = console_w
-        scale_x = 1
-
-        if w > self.MAX_BARS:
-            # e.g. w=200, MAX=160.
-            # We want to render self.MAX_BARS bars.
-            # But Rich Text needs full width.
-            # We can run logic at MAX_BARS resolution, then expand during Text build.
-            # Or simplified: if w > MAX_BARS, we set logical w = w // 2 (Double Width Mode)
-            # This is cleaner than arbitrary scaling.
-            scale_x = 2
-            w = console_w // 2
-
-        # D. Resize Buffers (Logical Width)
-        if len(self.bands) != w:
-            self.bands = np.zeros(w)
-            self.peak_heights = np.zeros(w)
-
-        # E. Reload Images (Logical Width OR Path Changed)
-        reload_images = False
-        if (w != self.last_w or h != self.last_h): reload_images = True
-        if (state['img_bg_path'] != self.last_bg_path): reload_images = True
-        if (state['img_fg_path'] != self.last_fg_path): reload_images = True
-
-        if reload_images:
-            if state['img_bg_path']: self.buf_bg = process_image(state['img_bg_path'], w, h)
-            if state['img_fg_path']: self.buf_fg = process_image(state['img_fg_path'], w, h)
-
-            self.last_w, self.last_h = w, h
-            self.last_bg_path = state['img_bg_path']
-            self.last_fg_path = state['img_fg_path']
-
-        # Cycle frames (approx 30fps base)
-        self.frame_idx += 1
-
-        # F. Process Audio Data
-        # STEREO LOGIC HERE
-        is_stereo = state.get('stereo', False) and hasattr(audio, 'raw_fft_left')
-
+        # Output accounting: frames drawn vs frames actually written to the terminal
+        self.frames_generated = 0
+        self.frames_presented = 0
+        self.frames_dropped = 0 # Encoded but replaced by a newer frame before the writer got to them
+        self.bytes_written = 0 # Terminal output of the ANSI backend
+        self.output_rate = 0.0 # Bytes/s the terminal takes while writing (moving average)
+        self.backpressure = Backpressure() # Replaced by each output loop
+        self.governor = QualityGovernor()
+        self.profiler = StageProfiler()
+        self.dump_request: Any = None # Last seen 'profile_dump' value
+        self.generated_fps = 0.0
+        self.presented_fps = 0.0
+        self.rate_mark = (time.monotonic(), 0, 0) # (time, generated, presented) at the last rate update
+
+        # Audio snapshot tracking
+        self.last_seq = -1
+        self.last_beat_count = 0
+        self.spectrum_key: Any = None # (seq, width, layout) of the spectrum in self.bands
+
+        # Logical render resolution -> screen (see draw_frame)
+        self.scale: Optional[ScaleMap] = None
+
+    def snapshot_audio(self, audio: Any) -> Any:
+        """
+        Take the provider's current AudioFrame once per render.
+        `is_beat` is latched on the beat counter so a beat that landed between two
+        renders is shown exactly once. Providers without frames are used as-is.
+        """
+        frame = getattr(audio, 'frame', None)
+        if not isinstance(frame, AudioFrame):
+            return audio
+
+        self.last_seq = frame.seq
+        if frame.beat_count != self.last_beat_count:
+            self.last_beat_count = frame.beat_count
+            if not frame.is_beat: frame = frame._replace(is_beat=True)
+        elif frame.is_beat:
+            frame = frame._replace(is_beat=False) # Already shown
+        return frame
+
+    def update_bands(self, state: dict, audio: Any, w: int, is_stereo: bool, sample_rate: int, scale: str, agg: str, layout: str = "linear") -> None:
+        """Map the snapshot's spectrum to `w` bands, normalize and smooth into self.bands."""
         if is_stereo:
             # Stereo Split
             mid = w // 2
-            left_w = mid
-            right_w = w - mid
-
             raw_l = audio.raw_fft_left
             raw_r = audio.raw_fft_right
-            if len(raw_l) == 0: raw_l = np.zeros(1024) - 100
-            if len(raw_r) == 0: raw_r = np.zeros(1024) - 100
-
-            # Resample
-            idx_l = np.linspace(0, 1023, left_w).astype(int)
-            idx_r = np.linspace(0, 1023, right_w).astype(int)
 
-            db_l = raw_l[idx_l]
-            db_r = raw_r[idx_r]
+            if mid > 0 and len(raw_l) > 0 and len(raw_l) == len(raw_r):
+                # One filterbank pass over the stacked (2, bins) pair
+                mapper = get_band_mapper(mid, sample_rate, len(raw_l), scale, agg, layout)
+                db_lr = mapper.apply(np.stack((raw_l, raw_r)))
+                db_l, db_r = db_lr[0], db_lr[1]
+                if w - mid > mid: db_r = np.append(db_r, db_r[-1]) # Odd width: pad right half
 
-            # Combine: Left then Right
-            raw_db = np.concatenate((db_l, db_r))
+                # Combine: Left then Right
+                raw_db = np.concatenate((db_l, db_r))
+            else:
+                raw_db = np.zeros(w) - 100
         else:
-            indices = np.linspace(0, 1023, w).astype(int)
+            n_bins = len(audio.raw_fft)
 
-            if len(audio.raw_fft) == 1024:
-                raw_db = audio.raw_fft[indices]
+            if n_bins > 0:
+                raw_db = get_band_mapper(w, sample_rate, n_bins, scale, agg, layout).apply(audio.raw_fft)
             else:
                 raw_db = np.zeros(w) - 100
 
@@ -247,82 +244,154 @@ class Renderer:
         s = state.get('smoothing', 0.15)
         self.bands = self.bands * s + norm * (1 - s)
 
+    def draw_subcell_bars(self, fb: FrameBuffer, target_h: Any, theme_t: Any, fg_layer: Any, peaks_on: bool, mode: str) -> None:
+        """
+        Bars on the sub-cell pixel grid: one bar per pixel column, heights in pixel
+        rows, the theme gradient per pixel row. Replaces the bar character ramp.
+        """
+        canvas = self.canvas
+        canvas.begin(fb.w, fb.h, mode)
+        ph, n = canvas.height, canvas.width
+        if ph <= 0 or n <= 0: return
+        px, py = cell_pixels(mode)
+
+        bar_val = target_h[:n]
+        top = ph - 1 - np.minimum(bar_val.astype(int), ph - 1)
+        np.maximum(top, 0, out=top)
+        canvas.lit[...] = np.arange(ph)[:, None] >= top
+        canvas.rgb[...] = gradient_rows(ph, theme_t[0], theme_t[1])[:, None, :]
+        if fg_layer is not None: # FG Texture, each cell colour spread over its pixels
+            i = fg_layer.frame(self.frame_idx // 2)
+            ih, iw = min(fb.h, fg_layer.h), min(fb.w, fg_layer.w)
+            rgb = fg_layer.rgb[i, :ih, :iw].repeat(py, axis=0).repeat(px, axis=1)
+            opaque = fg_layer.opaque[i, :ih, :iw].repeat(py, axis=0).repeat(px, axis=1)
+            np.copyto(canvas.rgb[:ih * py, :iw * px], rgb, where=opaque[..., None])
+
+        if peaks_on:
+            peak_y = ph - 1 - self.peak_heights[:n].astype(int)
+            xs = np.flatnonzero((peak_y >= 0) & (peak_y < ph))
+            canvas.plot(peak_y[xs], xs, WHITE)
+        canvas.compose(fb)
+
+    def generate_frame(self, state: dict, audio: Any, console_w: int, h: int) -> Text:
+        """Render one frame as Rich Text (the Rich output backend)."""
+        if not np:
+            return Text("Numpy missing - Cannot render", style="bold red")
+
+        if h <= 0 or console_w <= 0:
+            return Text("")
+
+        fb = self.draw_frame(state, audio, console_w, h)
+        text = framebuffer_to_text(fb, self.scale)
+        self.profiler.lap("encode")
+        return text
+
+    def draw_frame(self, state: dict, audio: Any, console_w: int, console_h: int) -> FrameBuffer:
+        """
+        Draw one frame into the reused FrameBuffer and return it. The buffer is at
+        the logical render resolution, which may be smaller than the console;
+        `self.scale` maps it to the console size (None if they are equal).
+        """
+        # Logical resolution: bounded by render_max_cells or fixed by render_width/height,
+        # so drawing costs the same on any terminal; the output stretches it to fit
+        try:
+            max_cells = int(state.get('render_max_cells', 0))
+            render_scale = float(state.get('render_scale', 1.0)) # Below 1 when the quality governor sheds load
+            if render_scale < 1.0:
+                screen = console_w * console_h
+                max_cells = max(1, int(min(max_cells or screen, screen) * render_scale))
+            w, h = logical_size(console_w, console_h, max_cells,
+                                int(state.get('render_width', 0)), int(state.get('render_height', 0)))
+        except (ValueError, TypeError):
+            w, h = console_w, console_h
+        self.scale = None if (w, h) == (console_w, console_h) else scale_map(console_w, console_h, w, h)
+
+        # Sub-cell raster: px x py pixels per cell, one bar per pixel column
+        subcell = state.get('subcell_mode', 'off')
+        px, py = cell_pixels(subcell)
+        n_bars, ph = w * px, h * py
+
+        # D. Resize Buffers (Logical Width)
+        if len(self.bands) != n_bars:
+            self.bands = np.zeros(n_bars)
+            self.peak_heights = np.zeros(n_bars)
+
+        # E. Image Layers (loaded in the background into the LRU asset cache; until a new
+        # path or size is ready the previous layer is drawn, clipped to the frame)
+        ASSETS.set_budget(int(state.get('asset_cache_mb', DEFAULT_BUDGET_MB)) << 20)
+        img_chars = CHAR_SETS.get(state.get('img_char_set', 'Blocks'), CHAR_SETS['Blocks'])
+        thresh = state.get('img_thresh', 0.05)
+        bg_layer = self.assets.layer("bg", state['img_bg_path'], w, h, img_chars, thresh) if state['img_bg_on'] and state['img_bg_path'] else None
+        fg_layer = self.assets.layer("fg", state['img_fg_path'], w, h, img_chars, thresh) if state['img_fg_on'] and state['img_fg_path'] else None
+        prof = self.profiler
+        prof.lap("images")
+
+        # Cycle frames (approx 30fps base)
+        self.frame_idx += 1
+
+        # F. Process Audio Data
+        # One consistent snapshot for the whole frame
+        audio = self.snapshot_audio(audio)
+
+        # STEREO LOGIC HERE
+        is_stereo = state.get('stereo', False) and hasattr(audio, 'raw_fft_left')
+        sample_rate = getattr(audio, 'sample_rate', 44100)
+        scale = state.get('freq_scale', 'log')
+        agg = state.get('band_agg', 'max')
+        layout = getattr(audio, 'freq_layout', 'linear') # Linear STFT or log multi-resolution bins
+
+        # Same analysis frame as last render? Keep the smoothed bands as they are.
+        seq = getattr(audio, 'seq', None)
+        spectrum_key = (seq, n_bars, is_stereo, scale, agg, layout)
+        if seq is None or spectrum_key != self.spectrum_key:
+            self.spectrum_key = spectrum_key
+            self.update_bands(state, audio, n_bars, is_stereo, sample_rate, scale, agg, layout)
+
         agc = 1.0
         if state['auto_gain']:
             peak = np.max(self.bands)
             if peak > 0: agc = 1.0 / peak
             agc = min(agc, 5.0)
 
+        # Heights in pixel rows (cell rows unless a sub-cell mode is on)
         try:
-            target_h = self.bands * h * agc * float(state.get('sens', 1.0))
+            target_h = self.bands * ph * agc * float(state.get('sens', 1.0))
         except (ValueError, TypeError):
-            target_h = self.bands * h * agc # Fallback
+            target_h = self.bands * ph * agc # Fallback
+
+        # Physics: peaks jump up to the bar, otherwise fall by peak_gravity (cell rows per frame, in pixel rows here)
+        peak_g = float(state.get('peak_gravity', 0.15)) * py
+        bar_h = np.minimum(target_h, ph)
+        self.peak_heights = np.where(bar_h >= self.peak_heights, bar_h,
+                                     np.maximum(0, self.peak_heights - peak_g))
 
-        # Physics
-        peak_g = float(state.get('peak_gravity', 0.15))
-        for i in range(w):
-            bh = target_h[i]
-            if bh > h: bh = h
-            if bh >= self.peak_heights[i]: self.peak_heights[i] = bh
-            else: self.peak_heights[i] = max(0, self.peak_heights[i] - peak_g)
+        prof.lap("spectrum")
 
         # G. Drawing
-        # Init buffers
-        # We reuse list creation logic (python lists are fast enough for <10k items)
-        # Type: List[List[str]]
-        buf = [[" " for _ in range(w)] for _ in range(h)]
-        # Type: List[List[Tuple[FG_RGB, BG_RGB]]]
-        cbf = [[(WHITE, BLACK) for _ in range(w)] for _ in range(h)]
-
-        # BG Layer
-        if state['img_bg_on'] and self.buf_bg:
-            # Handle Animation
-            cur_bg = self.buf_bg
-
-            # Heuristic: [Frames][Rows][RGB] vs [Rows][RGB]
-            is_animated = False
-            if len(cur_bg) > 0 and isinstance(cur_bg[0], list):
-                if len(cur_bg[0]) > 0 and isinstance(cur_bg[0][0], list):
-                     is_animated = True
-
-            if is_animated:
-                idx = (self.frame_idx // 2) % len(cur_bg)
-                cur_bg = cur_bg[idx]
-
-            # Prepare Char Set
-            img_style = state.get('img_style', 2)
-            img_chars = CHAR_SETS.get(state.get('img_char_set', 'Blocks'), CHAR_SETS['Blocks'])
-            thresh = state.get('img_thresh', 0.05)
-
-            for y in range(h):
-                for x in range(w):
-                    if y < len(cur_bg):
-                        row = cur_bg[y]
-                        if x < len(row):
-                            r,g,b,a = row[x]
-
-                            # Alpha / Luminance Cutoff
-                            lum = (0.299*r + 0.587*g + 0.114*b) / 255.0
-
-                            if a < 50 or lum < thresh:
-                                continue # Transparency (Skip drawing)
-
-                            rgb = (r, g, b)
-
-                            if img_style == 1: # Block (Background color)
-                                cbf[y][x] = col_style(WHITE, rgb)
-                                buf[y][x] = " "
-                            else: # Char (Foreground color)
-                                char_idx = int(lum * (len(img_chars) - 1))
-                                char_idx = max(0, min(char_idx, len(img_chars)-1))
-
-                                cbf[y][x] = col_style(rgb, BLACK)
-                                buf[y][x] = img_chars[char_idx]
+        # One reused FrameBuffer: numpy planes for chars / fg / bg instead of per-cell lists
+        if self.fb is None: self.fb = FrameBuffer()
+        fb = self.fb
+        fb.resize(w, h)
+        fb.clear()
+
+        # BG Layer: one masked assignment per plane (transparent or dark cells are skipped)
+        if bg_layer is not None:
+            i = bg_layer.frame(self.frame_idx // 2)
+            ih, iw = min(h, bg_layer.h), min(w, bg_layer.w)
+            visible = bg_layer.visible[i, :ih, :iw]
+            rgb = bg_layer.rgb[i, :ih, :iw]
+            if state.get('img_style', 2) == 1: # Block (Background color)
+                np.copyto(fb.bg[:ih, :iw], rgb, where=visible[..., None])
+            else: # Char (Foreground color)
+                np.copyto(fb.chars[:ih, :iw], bg_layer.chars[i, :ih, :iw], where=visible)
+                np.copyto(fb.fg[:ih, :iw], rgb, where=visible[..., None])
+
+        prof.lap("bg_image")
 
         # Stars
         if state['stars']:
             # Adjust star count based on resolution
-            target_stars = min(300, max(50, (w * h) // 100))
+            target_stars = int(min(300, max(50, (w * h) // 100)) * state.get('star_density', 1.0))
             if len(self.stars_list) < target_stars:
                 self.stars_list.extend([Star() for _ in range(target_stars - len(self.stars_list))])
             elif len(self.stars_list) > target_stars:
@@ -330,94 +399,75 @@ class Renderer:
 
             for star in self.stars_list:
                 star.move(0.02 + (audio.volume * 0.01))
-                if star.z > 0:
-                    star.draw(buf, cbf, w, h, col_style)
+            draw_stars(fb, self.stars_list)
+
+        prof.lap("stars")
 
         # Bars
         theme_t = THEMES.get(state['theme_name'], THEMES['Vaporeon'])
         chars = state.get('bar_chars', "")
         if not chars: chars = "  ▂▃▄▅▆▇█" # Fallback to default if empty
+        char_codes = codes(chars)
 
         style_mode = state['style']
         peaks_on = state['peaks_on']
         mirror = state['mirror']
 
-        # Pre-calc gradients for performance
-        row_colors = [get_gradient_color(h - 1 - y, h, theme_t[0], theme_t[1]) for y in range(h)]
-
-        for x in range(w):
-            bar_val = target_h[x]
-            peak_val = int(self.peak_heights[x])
-
-            # Optimization: only iterate Y where bars exist
-            # Max Y for this bar
-            max_y_bar = int(bar_val)
-            if max_y_bar >= h: max_y_bar = h - 1
-
-            # Fill Bar
-            # Because coordinates are y=0 (top) to h (bottom), we draw from bottom up.
-            # inv_y = 0 at bottom.
-            # Range of y to draw: h-1 down to h-1 - max_y_bar
-
-            start_y = h - 1
-            end_y = max(0, h - 1 - max_y_bar)
-
-            for y in range(end_y, start_y + 1):
-                inv_y = h - 1 - y
-                final_rgb = row_colors[y]
-
-                # FG Texture (if enabled, slow path)
-                if state['img_fg_on'] and self.buf_fg:
-                     # Handle Animation
-                     cur_fg = self.buf_fg
-
-                     is_anim_fg = False
-                     if len(cur_fg) > 0 and isinstance(cur_fg[0], list):
-                        if len(cur_fg[0]) > 0 and isinstance(cur_fg[0][0], list):
-                             is_anim_fg = True
-
-                     if is_anim_fg:
-                         idx = (self.frame_idx // 2) % len(cur_fg)
-                         cur_fg = cur_fg[idx]
-
-                     if y < len(cur_fg) and x < len(cur_fg[y]):
-                         # FG Texture also updated to RGBA
-                         fr, fg, fb, fa = cur_fg[y][x]
-                         if fa > 50:
-                             final_rgb = (fr, fg, fb)
-
-                if style_mode == 1: # Block
-                    cbf[y][x] = (WHITE, final_rgb) # BG color
-                    buf[y][x] = " "
-                else: # Char
-                    char_idx = int((inv_y/max(bar_val,1)) * (len(chars)-1))
-                    if char_idx >= len(chars): char_idx = len(chars)-1
-                    cbf[y][x] = (final_rgb, BLACK)
-                    buf[y][x] = chars[char_idx]
+        if subcell != 'off':
+            self.draw_subcell_bars(fb, target_h, theme_t, fg_layer, peaks_on, subcell)
+        else:
+            # Pre-calc gradients for performance: (h, 3), row 0 at the top
+            row_colors = gradient_rows(h, theme_t[0], theme_t[1])
+
+            # Bar tops: the bar in column x covers rows top[x]..h-1 (y=0 is the top)
+            # and always lights at least the bottom row
+            bar_val = target_h[:w]
+            top = h - 1 - np.minimum(bar_val.astype(int), h - 1)
+            np.maximum(top, 0, out=top)
+            rows = np.arange(h)[:, None]
+            fill = rows >= top # (h, w) row-index grid against the heights
+
+            colors = np.broadcast_to(row_colors[:, None, :], (h, w, 3))
+            if fg_layer is not None: # FG Texture (replaces the gradient where the image is opaque)
+                i = fg_layer.frame(self.frame_idx // 2)
+                ih, iw = min(h, fg_layer.h), min(w, fg_layer.w)
+                colors = colors.copy()
+                np.copyto(colors[:ih, :iw], fg_layer.rgb[i, :ih, :iw], where=fg_layer.opaque[i, :ih, :iw, None])
+
+            fill3 = fill[..., None]
+            if style_mode == 1: # Block
+                np.copyto(fb.chars, SPACE, where=fill)
+                np.copyto(fb.fg, np.uint8(255), where=fill3) # White
+                np.copyto(fb.bg, colors, where=fill3) # BG color
+            else: # Char: ramp position of each cell within its bar
+                inv_y = (h - 1) - rows
+                char_idx = (inv_y / np.maximum(bar_val, 1) * (len(chars) - 1)).astype(int)
+                np.minimum(char_idx, len(chars) - 1, out=char_idx)
+                np.copyto(fb.chars, char_codes[char_idx], where=fill)
+                np.copyto(fb.fg, colors, where=fill3)
+                np.copyto(fb.bg, np.uint8(0), where=fill3) # Black
 
             # Draw Peak
             if peaks_on:
-                peak_y = h - 1 - peak_val
-                if 0 <= peak_y < h:
-                     cbf[peak_y][x] = (WHITE, (200,200,200))
-                     buf[peak_y][x] = " "
+                peak_y = h - 1 - self.peak_heights[:w].astype(int)
+                xs = np.flatnonzero((peak_y >= 0) & (peak_y < h))
+                ys = peak_y[xs]
+                fb.chars[ys, xs] = SPACE
+                fb.fg[ys, xs] = WHITE
+                fb.bg[ys, xs] = (200, 200, 200)
+
+        prof.lap("bars")
 
         # Mirror (Post-Process)
         if mirror:
-             # Simple approach: Mirror left half to right half
+             # Simple approach: Mirror left half to right half (the odd middle column stays)
              mid = w // 2
-             is_odd = (w % 2 != 0)
+             if mid > 0:
+                 for plane in (fb.chars, fb.fg, fb.bg):
+                     plane[:, w - mid:] = plane[:, :mid][:, ::-1]
+                 if subcell == 'braille': mirror_braille(fb.chars[:, w - mid:]) # Dot columns flip too
 
-             def apply_mirror(row_data):
-                 left_part = row_data[:mid]
-                 right_part = left_part[::-1]
-                 if is_odd:
-                     return left_part + [row_data[mid]] + right_part
-                 return left_part + right_part
-
-             for y in range(h):
-                 buf[y] = apply_mirror(buf[y])
-                 cbf[y] = apply_mirror(cbf[y])
+        prof.lap("mirror")
 
         # Text Overlay
         if state['text_on']:
@@ -467,118 +517,294 @@ class Renderer:
                         if random.random() < 0.02: # 2% chance scramble
                             c = random.choice("!@#$%^&*?")
 
-                    if 0 <= dx < w:
-                        if c != " ":
-                            cbf[line_y][dx] = (WHITE, BLACK)
-                            buf[line_y][dx] = c
+                    if c != " ":
+                        fb.put(line_y, dx, c, WHITE, BLACK)
+
+        prof.lap("text")
 
-        # Effects
+        # Effects (list-based effects draw through write-through row proxies)
         for effect in self.effects:
             effect.update(state, audio)
-            try: effect.draw(buf, cbf, w, h, col_style)
+            try:
+                if getattr(effect, 'api_version', 1) >= 2:
+                    effect.draw(fb)
+                elif getattr(effect, 'enabled', True):
+                    buf, cbf = fb.legacy_view()
+                    effect.draw(buf, cbf, w, h, col_style)
             except: pass
+            if getattr(effect, 'enabled', True): prof.lap(type(effect).__name__)
+            else: prof.skip()
 
-        # Build Rich Text (Optimized)
-        # Rich Text.append is slow.
-        # We can construct lines with shared styles.
-        screen_text = Text()
-
-        for y in range(h):
-            line = Text()
-
-            # Optimization: Run Length Encoding for styles
-            current_style = None
-            current_text = []
-
-            for x in range(w):
-                char = buf[y][x]
-                fg, bg = cbf[y][x]
+        return fb
 
-                # Simple style key
-                # Cache style strings?
-                # Using rgb values directly
-                style_key = (fg, bg)
-
-                if style_key != current_style:
-                    # Flush previous
-                    if current_text:
-                        s_fg, s_bg = current_style
-                        style_str = f"rgb({s_fg[0]},{s_fg[1]},{s_fg[2]})"
-                        if s_bg != BLACK:
-                            style_str += f" on rgb({s_bg[0]},{s_bg[1]},{s_bg[2]})"
+    def wait_next_frame(self, state: dict, audio_provider: Any, last_start: float) -> None:
+        """
+        Frame pacing on time.monotonic().
 
-                        chunk = "".join(current_text)
-                        if scale_x > 1:
-                            # Expand horizontal pixels
-                            chunk = "".join([c * scale_x for c in chunk])
+        'audio' sync: render as soon as the analyzer publishes a new frame, but no faster
+        than `fps` and no slower than `min_fps` (so the HUD and animations keep moving in
+        silence). 'fixed' sync: a fixed `fps` grid with drift compensation.
+        """
+        fps = state.get('fps', 30)
+        if fps <= 0: fps = 30
+        min_fps = min(fps, max(1, state.get('min_fps', 10)))
+        period = 1.0 / fps
+
+        now = time.monotonic()
+        if state.get('render_sync', 'audio') == 'audio' and hasattr(audio_provider, 'wait_for_frame'):
+            # Max fps cap, then wait for fresh audio until the min fps deadline
+            earliest = last_start + period
+            if earliest > now:
+                time.sleep(earliest - now)
+            timeout = last_start + 1.0 / min_fps - time.monotonic()
+            audio_provider.wait_for_frame(self.last_seq, timeout)
+            self.next_deadline = time.monotonic()
+        else:
+            # Next slot on the grid; if we fell more than a frame behind, restart the grid
+            self.next_deadline += period
+            if now - self.next_deadline > period:
+                self.next_deadline = now
+            wait = self.next_deadline - now
+            if wait > 0:
+                time.sleep(wait)
+
+    def state_depth(self, state: dict) -> str:
+        depth = state.get('color_depth', 'auto')
+        return depth if depth in RICH_COLOR_SYSTEMS else 'auto'
+
+    def paced(self, state: dict) -> dict:
+        """State for frame pacing, with the target fps lowered by backpressure."""
+        scale = self.backpressure.fps_scale
+        if scale >= 1.0: return state
+        fps = state.get('fps', 30)
+        if fps <= 0: fps = 30
+        return dict(state, fps=max(1, int(fps * scale)))
+
+    def governed(self, state: dict) -> dict:
+        """State to draw with: the quality governor's cuts applied, unless it is switched off."""
+        if not state.get('quality_governor', True):
+            self.governor.reset()
+            return state
+        return self.governor.apply(state)
+
+    def count_frame(self, presented: bool) -> None:
+        """Account one generated frame; rates are refreshed about once a second."""
+        self.frames_generated += 1
+        if presented: self.frames_presented += 1
+        now = time.monotonic()
+        t, gen, pres = self.rate_mark
+        if now - t >= 1.0:
+            self.generated_fps = (self.frames_generated - gen) / (now - t)
+            self.presented_fps = (self.frames_presented - pres) / (now - t)
+            self.rate_mark = (now, self.frames_generated, self.frames_presented)
+
+    def hud_line(self, state: dict, audio_provider: Any) -> str:
+        fps = state.get('fps', 30)
+        if fps <= 0: fps = 30
+        vol_bar = "#" * int(min(20, audio_provider.volume))
+        out = f"OUT: {self.presented_fps:.0f}/{self.generated_fps:.0f} DROP: {self.frames_dropped}" # Presented / generated per second
+        if self.backpressure.level > 0:
+            depth, scale = self.backpressure.levels[self.backpressure.level]
+            out += f" SLOW: {depth}" + (f" x{scale:g}" if scale < 1.0 else "")
+        if self.governor.level > 0:
+            out += f" LOAD: -{self.governor.level} {self.governor.name}" # Quality steps shed
+        return f"DEVICE: {audio_provider.connected_device:<30} | VOL: {vol_bar:<20} | STATE: {audio_provider.status} | FPS: {fps} | {out}"
+
+    def hud_lines(self, state: dict, audio_provider: Any) -> List[str]:
+        """The HUD line, plus the profiler's slowest stages when 'profile_hud' is on."""
+        lines = [self.hud_line(state, audio_provider)]
+        if state.get('profile_hud', False): lines.append(self.profiler.hud_line())
+        return lines
+
+    def check_profile_dump(self, state: dict) -> None:
+        """Log the profiler summary when 'profile_dump' goes up (the controller's button bumps it)."""
+        request = state.get('profile_dump', 0)
+        if self.dump_request is not None and request > self.dump_request:
+            logger.info("Frame profile (last %d frames per stage):\n%s", self.profiler.WINDOW, self.profiler.summary())
+        self.dump_request = request
 
-                        line.append(chunk, style=style_str)
+    def render_loop(self, state_provider: Callable, audio_provider: Any) -> None:
+        """
+        Main loop. Frames go out through the raw ANSI emitter or Rich Live,
+        per the 'output_backend' setting (re-checked every frame). A failed
+        terminal write restarts the ANSI pipeline; a terminal that can't be
+        reopened ends the loop.
+        """
+        try: self.out_fd = sys.stdout.fileno()
+        except Exception: self.out_fd = -1
+        self.next_deadline = time.monotonic()
+        while True:
+            if self.backend(state_provider()) == "ansi":
+                try:
+                    self.ansi_loop(state_provider, audio_provider)
+                except OSError as e:
+                    # Could not even enter the alternate screen: the terminal is gone
+                    logger.error(f"Terminal output unavailable, stopping: {e}")
+                    return
+            else:
+                self.rich_loop(state_provider, audio_provider)
 
-                    current_style = style_key
-                    current_text = [char]
-                else:
-                    current_text.append(char)
+    def backend(self, state: dict) -> str:
+        if np is None or self.out_fd < 0: return "rich"
+        return resolve_backend(state.get('output_backend', 'auto'), self.out_fd)
 
-            # Flush last chunk
-            if current_text:
-                s_fg, s_bg = current_style
-                style_str = f"rgb({s_fg[0]},{s_fg[1]},{s_fg[2]})"
-                if s_bg != BLACK:
-                    style_str += f" on rgb({s_bg[0]},{s_bg[1]},{s_bg[2]})"
+    def ansi_loop(self, state_provider: Callable, audio_provider: Any) -> None:
+        """
+        Two-stage pipeline: this thread composes and encodes frames, a FrameWriter
+        thread writes them to the terminal (one os.write each). Only cells that
+        changed since the previous frame are sent, unless more than
+        'repaint_threshold' of the screen changed. If the terminal falls behind,
+        the newest frame replaces the queued one, and Backpressure trades colour
+        depth and then frame rate for bandwidth.
+        """
+        presenter = DiffPresenter()
+        self.backpressure = Backpressure()
+        terminal_depth = detect_depth() # For color_depth 'auto'; the environment does not change while running
+        t0 = 0.0
+        last_size = None
+        prof = self.profiler
+        with TerminalWriter(self.out_fd) as term, FrameWriter(term) as writer:
+            # Write times are measured on the writer thread but recorded on this one, like every other stage
+            write_times: Any = collections.deque(maxlen=prof.WINDOW)
+            writer.on_write = write_times.append
+            while True:
+                try:
+                    if writer.error is not None: raise writer.error # Also when no frame has been submitted since
+                    # Update State
+                    prof.start()
+                    state = state_provider()
+                    if self.backend(state) != "ansi": return
+                    state = self.governed(state)
+                    self.check_profile_dump(state)
+                    prof.lap("state")
+
+                    # Output budget
+                    writer.max_bandwidth = max(0, int(state.get('max_bandwidth', 0)))
+                    self.backpressure.update(writer.busy_time)
+                    depth = state.get('color_depth', 'auto')
+                    depth = terminal_depth if depth == 'auto' else resolve_depth(depth)
+                    presenter.encoder.set_depth(poorer_depth(depth, self.backpressure.depth))
 
-                chunk = "".join(current_text)
-                if scale_x > 1:
-                    chunk = "".join([c * scale_x for c in chunk])
-                line.append(chunk, style=style_str)
+                    # Frame Pacing
+                    self.wait_next_frame(self.paced(state), audio_provider, t0)
+                    t0 = time.monotonic()
+                    prof.skip()
+
+                    # Dimensions (one row for the HUD, two with the profiler line)
+                    size = tuple(os.get_terminal_size(self.out_fd))
+                    w, rows = size
+                    hud_rows = 2 if state.get('profile_hud', False) else 1
+                    h = rows - hud_rows
+                    if (size, hud_rows) != last_size:
+                        presenter.invalidate() # Next frame clears and repaints
+                        last_size = (size, hud_rows)
+                    if h <= 0 or w <= 0:
+                        continue
 
-            screen_text.append(line)
-            screen_text.append("\n")
+                    # Generate Frame
+                    fb = self.draw_frame(state, audio_provider, w, h)
+                    hud = "\n".join(line[:w].ljust(w) for line in self.hud_lines(state, audio_provider))
+
+                    # Newest frame wins: drop a frame still queued and diff against what the writer last took
+                    base = writer.discard_pending()
+                    if base is not False:
+                        presenter.rebase(base[0] if base is not None and base[1] == size else None)
+                    threshold = state.get('repaint_threshold', 0.5)
+                    data = presenter.present(fb, self.scale, hud=hud, threshold=threshold)
+
+                    # Hand over to the writer, skipped if nothing changed
+                    if data:
+                        if sync_supported(state.get('sync_output', 'auto')):
+                            data = SYNC_BEGIN.encode() + data + SYNC_END.encode()
+                        writer.submit(data, (presenter.snapshot, size))
+                    prof.lap("encode")
+                    while write_times: prof.add("write", write_times.popleft())
+                    self.frames_presented = writer.written
+                    self.frames_dropped = writer.dropped
+                    self.bytes_written = writer.bytes_written
+                    self.output_rate = writer.throughput
+                    self.count_frame(False)
+                    self.governor.update(time.monotonic() - t0, self.paced(state).get('fps', 30) or 30)
 
-        return screen_text
+                except Exception as e:
+                    if writer.error is not None:
+                        # The writer thread stopped on a failed write: start over with a fresh writer (see render_loop)
+                        logger.warning(f"Terminal write failed: {writer.error}")
+                        return
+                    # Log error but don't crash (Rich still draws the error panel)
+                    writer.drain()
+                    try: term.write(b"\x1b[0m\x1b[H\x1b[2J")
+                    except OSError as write_error:
+                        logger.warning(f"Terminal write failed: {write_error}")
+                        return
+                    self.console.print(Panel(Text(f"RENDER ERROR: {e}", style="bold red"), title="Error"))
+                    last_size = None
+                    time.sleep(1)
 
-    def render_loop(self, state_provider: Callable, audio_provider: Any) -> None:
+    def rich_loop(self, state_provider: Callable, audio_provider: Any) -> None:
         """
-        Main loop using Rich Live
+        Main loop using Rich Live.
+        Live's own refresh thread is disabled: each finished frame is presented
+        exactly once, from this thread, inside a synchronized update.
         """
-        # Note: Live refresh rate is just for terminal update capping.
-        # We control actual frame generation speed manually.
-        with Live(console=self.console, refresh_per_second=60, screen=True) as live:
+        t0 = 0.0
+        self.backpressure = Backpressure(RATE_LEVELS) # Rich picks its own colours; only the rate adapts
+        # Colour depth override (Rich detects the terminal itself for 'auto')
+        depth_mode = self.state_depth(state_provider())
+        if depth_mode != getattr(self, 'console_depth', 'auto'):
+            self.console = Console(color_system=RICH_COLOR_SYSTEMS.get(depth_mode, "auto"))
+            self.console_depth = depth_mode
+        present_time = 0.0
+        with Live(console=self.console, auto_refresh=False, screen=True) as live:
             while True:
-                t0 = time.time()
                 try:
                     # Update State
+                    self.profiler.start()
                     state = state_provider()
-                    fps = state.get('fps', 30)
-                    if fps <= 0: fps = 30
+                    if self.backend(state) != "rich" or self.state_depth(state) != depth_mode: return
+                    state = self.governed(state) # Colour depth cuts do not apply: Rich picks its own colours
+                    self.check_profile_dump(state)
+                    self.profiler.lap("state")
+                    self.backpressure.update(present_time)
+
+                    # Frame Pacing
+                    self.wait_next_frame(self.paced(state), audio_provider, t0)
+                    t0 = time.monotonic()
+                    self.profiler.skip()
 
                     # Dimensions
+                    hud_rows = 2 if state.get('profile_hud', False) else 1
                     w = self.console.width
-                    h = self.console.height - 2
+                    h = self.console.height - 1 - hud_rows
 
                     # Generate Frame
                     frame_text = self.generate_frame(state, audio_provider, w, h)
 
                     # HUD
-                    vol_bar = "#" * int(min(20, audio_provider.volume))
-                    hud_text = Text(f"DEVICE: {audio_provider.connected_device:<30} | VOL: {vol_bar:<20} | STATE: {audio_provider.status} | FPS: {fps}", style="bold white on black")
+                    hud_text = Text("\n".join(self.hud_lines(state, audio_provider)), style="bold white on black")
 
                     # Layout
                     layout = Layout()
                     layout.split(
-                        Layout(hud_text, size=1),
+                        Layout(hud_text, size=hud_rows),
                         Layout(frame_text)
                     )
 
-                    live.update(layout)
-
-                    # Frame Pacing
-                    dt = time.time() - t0
-                    wait = (1.0 / fps) - dt
-                    if wait > 0:
-                        time.sleep(wait)
+                    # Present
+                    p0 = time.monotonic()
+                    sync = sync_supported(state.get('sync_output', 'auto'))
+                    if sync: self.console.file.write(SYNC_BEGIN)
+                    live.update(layout, refresh=True)
+                    if sync:
+                        self.console.file.write(SYNC_END)
+                        self.console.file.flush()
+                    present_time += time.monotonic() - p0
+                    self.profiler.lap("write")
+                    self.count_frame(True)
+                    self.governor.update(time.monotonic() - t0, self.paced(state).get('fps', 30) or 30)
 
                 except Exception as e:
                     # Log error but don't crash
                     error_text = Text(f"RENDER ERROR: {e}", style="bold red")
-                    live.update(Panel(error_text, title="Error"))
+                    live.update(Panel(error_text, title="Error"), refresh=True)
                     time.sleep(1)
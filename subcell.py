@@ -0,0 +1,123 @@
+from typing import Any, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SUBCELL_MODES = ("off", "half", "braille")
+CELL_PIXELS = {"off": (1, 1), "half": (1, 2), "braille": (2, 4)} # (x, y) pixels per cell
+
+UPPER_HALF = 0x2580 # ▀
+LOWER_HALF = 0x2584 # ▄
+BRAILLE = 0x2800 # Empty braille pattern; the low byte holds the eight dots
+
+# Dot bit of each pixel in a 2x4 braille cell (rows top to bottom, then left/right column)
+BRAILLE_BITS = np.array([[0x01, 0x08], [0x02, 0x10], [0x04, 0x20], [0x40, 0x80]], dtype=np.uint32) if np else None
+
+def cell_pixels(mode: str) -> Tuple[int, int]:
+    """(x, y) pixels per cell of a sub-cell mode (unknown modes draw whole cells)."""
+    return CELL_PIXELS.get(mode, (1, 1))
+
+def _mirrored_braille() -> Any:
+    """Codepoint table swapping the dot columns of every braille pattern."""
+    dots = np.arange(256, dtype=np.uint32)
+    out = np.zeros(256, dtype=np.uint32)
+    for left, right in BRAILLE_BITS.tolist():
+        out |= np.where(dots & left, right, 0).astype(np.uint32)
+        out |= np.where(dots & right, left, 0).astype(np.uint32)
+    return out + BRAILLE
+
+MIRROR_BRAILLE = _mirrored_braille() if np else None
+
+def mirror_braille(chars: Any) -> None:
+    """Flip braille cells of a (mirrored) codepoint plane in place so their dots mirror too."""
+    dots = (chars >= BRAILLE) & (chars < BRAILLE + 256)
+    chars[dots] = MIRROR_BRAILLE[chars[dots] - BRAILLE]
+
+class PixelCanvas:
+    """
+    A pixel grid over a w x h cell frame: 1x2 pixels per cell for half blocks
+    (▀/▄, each half with its own colour) or 2x4 for braille (one colour per cell,
+    the mean of its lit dots).
+
+    - lit: (h * py, w * px) bool
+    - rgb: (h * py, w * px, 3) uint8, only meaningful where lit
+
+    Drawing sets pixels through masks and fancy indexing; `compose()` packs the
+    grid into codepoints with whole-frame array ops and writes only the cells with a lit pixel,
+    so whatever is already in the frame shows through the rest.
+    """
+    def __init__(self, mode: str = "half") -> None:
+        self.mode = mode
+        self.w = self.h = 0
+        self.lit = np.zeros((0, 0), dtype=bool)
+        self.rgb = np.zeros((0, 0, 3), dtype=np.uint8)
+
+    @property
+    def width(self) -> int: return self.lit.shape[1]
+
+    @property
+    def height(self) -> int: return self.lit.shape[0]
+
+    def begin(self, w: int, h: int, mode: str = None) -> None:
+        """Start a frame of w x h cells with no pixel lit."""
+        if mode is not None: self.mode = mode
+        px, py = cell_pixels(self.mode)
+        shape = (max(0, h) * py, max(0, w) * px)
+        if self.lit.shape != shape:
+            self.lit = np.zeros(shape, dtype=bool)
+            self.rgb = np.zeros(shape + (3,), dtype=np.uint8)
+        else:
+            self.lit.fill(False)
+        self.w, self.h = max(0, w), max(0, h)
+
+    def plot(self, ys: Any, xs: Any, color: Any) -> None:
+        """Light the pixels (ys[i], xs[i]); points outside the grid are dropped."""
+        ys, xs = np.asarray(ys, dtype=int), np.asarray(xs, dtype=int)
+        keep = (ys >= 0) & (ys < self.height) & (xs >= 0) & (xs < self.width)
+        color = np.asarray(color, dtype=np.uint8)
+        if color.ndim > 1: color = color[keep]
+        ys, xs = ys[keep], xs[keep]
+        self.lit[ys, xs] = True
+        self.rgb[ys, xs] = color
+
+    def vspans(self, start: Any, end: Any, color: Any) -> None:
+        """Light rows start[x]..end[x] (inclusive) of every pixel column x."""
+        rows = np.arange(self.height)[:, None]
+        mask = (rows >= start) & (rows <= end)
+        self.lit |= mask
+        np.copyto(self.rgb, np.asarray(color, dtype=np.uint8), where=mask[..., None])
+
+    def compose(self, fb: Any) -> None:
+        """Pack the grid into the top-left w x h cells of `fb`."""
+        h, w = min(self.h, fb.h), min(self.w, fb.w)
+        if h <= 0 or w <= 0: return
+        chars, fg, bg = fb.chars[:h, :w], fb.fg[:h, :w], fb.bg[:h, :w]
+        if self.mode == "braille":
+            # Eight strided passes, one per dot position, each over the whole frame
+            bits = np.zeros((h, w), dtype=np.uint32)
+            total = np.zeros((h, w, 3), dtype=np.uint16)
+            count = np.zeros((h, w), dtype=np.uint16)
+            for dy in range(4):
+                for dx in range(2):
+                    dots = self.lit[dy:h * 4:4, dx:w * 2:2]
+                    np.bitwise_or(bits, BRAILLE_BITS[dy, dx], out=bits, where=dots)
+                    np.add(total, self.rgb[dy:h * 4:4, dx:w * 2:2], out=total, where=dots[..., None])
+                    count += dots
+            on = bits > 0
+            # Mean colour of the lit dots of each cell
+            np.copyto(chars, BRAILLE + bits, where=on)
+            np.copyto(fg, (total // np.maximum(count, 1)[..., None]).astype(np.uint8), where=on[..., None])
+        elif self.mode == "half":
+            top, bottom = self.lit[0:h * 2:2, :w], self.lit[1:h * 2:2, :w]
+            top_rgb, bottom_rgb = self.rgb[0:h * 2:2, :w], self.rgb[1:h * 2:2, :w]
+            on = top | bottom
+            # ▀ in the top colour when the top half is lit (over the bottom colour if both are), else ▄
+            np.copyto(chars, np.where(top, UPPER_HALF, LOWER_HALF).astype(np.uint32), where=on)
+            np.copyto(fg, np.where(top[..., None], top_rgb, bottom_rgb), where=on[..., None])
+            np.copyto(bg, bottom_rgb, where=(top & bottom)[..., None])
+        else:
+            on = self.lit[:h, :w]
+            np.copyto(chars, np.uint32(0x2588), where=on) # █
+            np.copyto(fg, self.rgb[:h, :w], where=on[..., None])
@@ -0,0 +1,152 @@
+import threading
+import time
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ansi import AnsiEncoder, Backpressure, DiffPresenter, FrameWriter, detect_depth, palette_lut, quantize, resolve_backend, resolve_depth
+from framebuffer import FrameBuffer, scale_map
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestAnsiEncoder(unittest.TestCase):
+    def test_runs_are_coalesced(self):
+        fb = FrameBuffer(6, 2)
+        fb.text(0, 0, "abcdef", (255, 0, 0))
+        fb.text(0, 3, "DEF", (255, 0, 0), (0, 0, 255))
+        out = AnsiEncoder().encode(fb).decode('utf-8')
+        self.assertEqual(out.count("\x1b[38;2;255;0;0m"), 1) # fg unchanged across the bg switch
+        self.assertEqual(out.count("\x1b[48;2;0;0;255m"), 1)
+        self.assertIn("abc\x1b[48;2;0;0;255mDEF", out)
+        self.assertIn("\x1b[2;1H", out) # Every row is positioned explicitly
+
+    def test_scale_and_hud(self):
+        fb = FrameBuffer(2, 1)
+        fb.text(0, 0, "xy", (1, 2, 3))
+        out = AnsiEncoder().encode(fb, scale_map(4, 1, 2, 1), hud="HI").decode('utf-8')
+        self.assertTrue(out.startswith("\x1b[1;1H"))
+        self.assertIn("\x1b[2;1H", out)
+        self.assertIn("xxyy", out)
+
+    def test_reduced_depths(self):
+        fb = FrameBuffer(2, 1)
+        fb.put(0, 0, "a", (255, 0, 0), (0, 0, 0))
+        fb.put(0, 1, "b", (128, 128, 128), (0, 0, 255))
+        out = AnsiEncoder("256").encode(fb).decode('utf-8')
+        self.assertIn("\x1b[38;5;196m\x1b[49ma", out) # Black background stays the terminal default
+        self.assertIn("\x1b[38;5;102m\x1b[48;5;21mb", out)
+        out = AnsiEncoder("16").encode(fb).decode('utf-8')
+        self.assertIn("\x1b[91m\x1b[49ma", out)
+        self.assertIn("\x1b[90m\x1b[44mb", out)
+
+    def test_palette_lut_is_nearest(self):
+        lut = palette_lut("256")
+        self.assertEqual(lut.shape, (32, 32, 32))
+        grey = quantize(np.array([[198, 198, 198]], dtype=np.uint8), "256")[0]
+        self.assertEqual(grey, 251) # Grey ramp entry 19 (8 + 10 * 19 = 198), not the cube
+
+    def test_detect_depth(self):
+        self.assertEqual(detect_depth({"COLORTERM": "truecolor", "TERM": "xterm"}), "truecolor")
+        self.assertEqual(detect_depth({"TERM": "screen-256color"}), "256")
+        self.assertEqual(detect_depth({"TERM": "linux"}), "16")
+        self.assertEqual(resolve_depth("16", {"COLORTERM": "truecolor"}), "16")
+
+    def test_resolve_backend(self):
+        self.assertEqual(resolve_backend("rich", 1), "rich")
+        self.assertEqual(resolve_backend("bogus", 1), "rich")
+        self.assertEqual(resolve_backend("auto", -1), "rich") # Not a tty
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestDiffPresenter(unittest.TestCase):
+    def test_only_changed_cells_are_sent(self):
+        fb = FrameBuffer(20, 4)
+        fb.text(1, 0, "x" * 20, (9, 9, 9))
+        p = DiffPresenter()
+        self.assertIn("x" * 20, p.present(fb).decode('utf-8'))
+        self.assertTrue(p.full)
+        self.assertEqual(p.present(fb), b"") # Nothing changed
+
+        fb.put(2, 10, "#", (255, 0, 0))
+        out = p.present(fb).decode('utf-8')
+        self.assertFalse(p.full)
+        self.assertIn("\x1b[3;11H", out)
+        self.assertNotIn("x", out)
+
+    def test_upscaled_diff(self):
+        fb = FrameBuffer(4, 2)
+        p = DiffPresenter()
+        scale = scale_map(10, 3, 4, 2) # Non-integer factors
+        p.present(fb, scale)
+        fb.put(1, 2, "#", (255, 0, 0))
+        out = p.present(fb, scale).decode('utf-8')
+        self.assertFalse(p.full)
+        self.assertEqual(out.count("###"), 1) # Logical cell (1, 2) covers screen row 2, columns 5-7
+        self.assertIn("\x1b[3;6H", out)
+
+    def test_full_repaint_threshold_and_invalidate(self):
+        fb = FrameBuffer(10, 2)
+        p = DiffPresenter()
+        p.present(fb)
+        fb.text(0, 0, "abcdefghij", (1, 1, 1))
+        p.present(fb, threshold=0.4) # Half the screen changed
+        self.assertTrue(p.full)
+        p.invalidate()
+        p.present(fb)
+        self.assertTrue(p.full)
+
+    def test_short_gaps_are_bridged(self):
+        fb = FrameBuffer(20, 1)
+        p = DiffPresenter()
+        p.present(fb)
+        fb.put(0, 2, "a", (255, 255, 255))
+        fb.put(0, 5, "b", (255, 255, 255))
+        out = p.present(fb, threshold=1.0).decode('utf-8')
+        self.assertEqual(out.count("H"), 1) # One cursor move for both cells
+        self.assertIn("a  b", out)
+
+class _BlockingTerm:
+    """Terminal stand-in whose writes wait until released."""
+    def __init__(self):
+        self.out = []
+        self.gate = threading.Event()
+    def write(self, data):
+        self.gate.wait(2.0)
+        self.out.append(data)
+
+class TestFrameWriter(unittest.TestCase):
+    def test_newest_frame_wins(self):
+        term = _BlockingTerm()
+        with FrameWriter(term) as writer:
+            writer.submit(b"1", "s1")
+            while writer.pending is not None: time.sleep(0.001) # Writer took frame 1 and blocks on it
+            writer.submit(b"2", "s2")
+            self.assertEqual(writer.discard_pending(), "s1") # Screen will show frame 1
+            self.assertFalse(writer.discard_pending())
+            writer.submit(b"3", "s3")
+            writer.submit(b"4", "s4")
+            term.gate.set()
+            writer.drain()
+        self.assertEqual(term.out, [b"1", b"4"])
+        self.assertEqual((writer.written, writer.dropped), (2, 2))
+
+class TestBackpressure(unittest.TestCase):
+    def test_steps_down_when_busy_and_recovers(self):
+        bp = Backpressure()
+        bp.mark = (0.0, 0.0)
+        bp.calm_since = 0.0
+        busy, t = 0.0, 0.0
+        for _ in range(3): # Writer busy the whole time
+            t += 0.5; busy += 0.5
+            bp.update(busy, t)
+        self.assertEqual(bp.level, 3)
+        self.assertEqual(bp.depth, "16")
+        for _ in range(6): # 3 s idle: one step back
+            t += 0.5
+            bp.update(busy, t)
+        self.assertEqual(bp.level, 2)
+        self.assertEqual(bp.fps_scale, 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
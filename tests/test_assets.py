@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+
+from assets import AssetCache, AssetLoader, image_layer
+
+class TestAssetCache(unittest.TestCase):
+    def test_lru_eviction_by_bytes(self):
+        cache = AssetCache(budget=100)
+        cache.put("a", 1, 40)
+        cache.put("b", 2, 40)
+        cache.get("a") # "b" is now least recently used
+        cache.put("c", 3, 40)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.used, 80)
+
+    def test_oversized_entry_is_kept(self):
+        cache = AssetCache(budget=10)
+        cache.put("a", 1, 5)
+        cache.put("big", 2, 50)
+        self.assertEqual(list(cache.entries), ["big"])
+        cache.set_budget(100)
+        self.assertEqual(cache.used, 50)
+
+@unittest.skipIf(np is None or not hasattr(Image, "fromarray"), "numpy / pillow not installed")
+class TestImageLayer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "img.png")
+        px = np.zeros((2, 3, 4), dtype=np.uint8)
+        px[0, 0] = (255, 255, 255, 255) # Bright, opaque
+        px[0, 1] = (255, 255, 255, 0) # Transparent
+        px[1, 2] = (10, 10, 10, 255) # Opaque but below the threshold
+        Image.fromarray(px, "RGBA").save(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_planes(self):
+        cache = AssetCache()
+        layer = image_layer(self.path, 3, 2, " #", 0.05, cache)
+        self.assertEqual(layer.rgb.shape, (1, 2, 3, 3))
+        self.assertEqual(layer.visible[0].tolist(), [[True, False, False], [False, False, False]])
+        self.assertTrue(layer.opaque[0, 1, 2])
+        self.assertEqual(chr(layer.chars[0, 0, 0]), "#")
+        # A new threshold reuses the decoded frames
+        image_layer(self.path, 3, 2, " #", 0.01, cache)
+        self.assertEqual(sum(1 for k in cache.entries if k[0] == "frames"), 1)
+
+    def test_loader_keeps_previous_layer_until_ready(self):
+        cache = AssetCache()
+        loader = AssetLoader(cache)
+        self.assertIsNone(loader.layer("bg", self.path, 3, 2, " #", 0.05)) # Nothing to show yet
+        self.wait(loader)
+        first = loader.layer("bg", self.path, 3, 2, " #", 0.05)
+        self.assertEqual((first.h, first.w), (2, 3))
+        # A new size is loaded in the background; the old layer is drawn meanwhile
+        shown = loader.layer("bg", self.path, 6, 4, " #", 0.05)
+        self.assertIn(shown, (first, cache.get(("layer", self.path, 6, 4, " #", 0.05))))
+        self.wait(loader)
+        self.assertEqual(loader.layer("bg", self.path, 6, 4, " #", 0.05).w, 6)
+
+    def test_superseded_job_is_dropped(self):
+        loader = AssetLoader(AssetCache())
+        with loader.cond: # Hold the worker off while the requests pile up
+            loader._submit("bg", ("k1",), (self.path, 3, 2, " #", 0.05))
+            loader._submit("bg", ("k2",), (self.path, 4, 2, " #", 0.05))
+            self.assertEqual(list(loader.pending), ["bg"])
+            self.assertEqual(loader.pending["bg"][0], ("k2",))
+        self.wait(loader)
+
+    def wait(self, loader):
+        deadline = time.monotonic() + 5.0
+        while loader.busy() and time.monotonic() < deadline: time.sleep(0.005)
+
+    def test_missing_file(self):
+        self.assertIsNone(image_layer(os.path.join(self.tmp.name, "nope.png"), 3, 2, " #", 0.05, AssetCache()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,11 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import sys
 
-# Mock sounddevice and numpy before importing audio_engine
-sys.modules['sounddevice'] = MagicMock()
-sys.modules['numpy'] = MagicMock()
-
-from audio_engine import AudioPump
+# Mock sounddevice and numpy while importing audio_engine
+# (scoped, so later test modules import the real packages)
+with patch.dict(sys.modules, {'sounddevice': MagicMock(), 'numpy': MagicMock()}):
+    from audio_engine import AudioPump
 
 class TestAudioEngine(unittest.TestCase):
     def test_initialization(self):
@@ -0,0 +1,57 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from audio_engine import AudioRing
+
+def ramp(start, n, channels=2):
+    """(n, channels) block whose frames hold their absolute index."""
+    return np.repeat(np.arange(start, start + n, dtype=np.float32)[:, None], channels, axis=1)
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestAudioRing(unittest.TestCase):
+    def test_wraparound(self):
+        ring = AudioRing(8, 2)
+        for start in range(0, 30, 3): # Blocks that straddle the end of the ring
+            ring.write(ramp(start, 3))
+        self.assertEqual(ring.written, 30)
+        np.testing.assert_array_equal(ring.window(8), ramp(22, 8))
+        np.testing.assert_array_equal(ring.window(4, end=26), ramp(22, 4))
+        self.assertTrue(ring.data_ready.is_set())
+
+    def test_mirrored_window_is_contiguous(self):
+        ring = AudioRing(8, 2)
+        ring.write(ramp(0, 6))
+        ring.write(ramp(6, 5)) # Wraps: frames 8..10 land at the start
+        view = ring.window(8)
+        np.testing.assert_array_equal(view, ramp(3, 8))
+        self.assertTrue(np.shares_memory(view, ring.data)) # A view, not a copy
+        self.assertTrue(view.flags['C_CONTIGUOUS'])
+        # Both halves hold the same samples
+        np.testing.assert_array_equal(ring.data[:8], ring.data[8:])
+
+    def test_overflow_keeps_the_newest_frames(self):
+        ring = AudioRing(8, 1)
+        ring.write(ramp(0, 5, 1))
+        ring.write(ramp(5, 20, 1)) # Larger than the ring
+        self.assertEqual(ring.written, 25) # Every frame is counted, kept or not
+        np.testing.assert_array_equal(ring.window(8), ramp(17, 8, 1))
+        ring.write(ramp(25, 2, 1)) # Positions stay aligned after the overflow
+        np.testing.assert_array_equal(ring.window(8), ramp(19, 8, 1))
+
+    def test_time_at(self):
+        ring = AudioRing(1024, 1)
+        ring.write(np.zeros((1000, 1), dtype=np.float32))
+        # Live input: counted back from the last write
+        self.assertAlmostEqual(ring.time_at(1000, 1000), ring.write_time)
+        self.assertAlmostEqual(ring.time_at(500, 1000), ring.write_time - 0.5)
+        # Offline sources: by sample position, whatever the wall clock says
+        ring.clock_start = 100.0
+        self.assertAlmostEqual(ring.time_at(500, 1000), 100.5)
+        self.assertAlmostEqual(ring.time_at(48000, 48000), 101.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from audio_engine import AudioFrame
+from audio_share import N_SLOTS, SharedAudioClient, SharedAudioServer, analyzer_running, shared_memory
+
+def make_frame(seq, value):
+    fft = np.full(1024, value, dtype=np.float32)
+    pcm = np.full(2048, -value, dtype=np.float32)
+    return AudioFrame(seq, 10.0 + seq, 48000, fft, fft + 1, fft + 2, pcm, pcm - 1, pcm - 2,
+                      value, seq % 2 == 0, 0.5, 120.0, 0.25, seq // 2, "log")
+
+@unittest.skipIf(np is None or shared_memory is None, "numpy / shared_memory not available")
+class TestSharedAudio(unittest.TestCase):
+    def setUp(self):
+        self.name = f"pyviz_test_{os.getpid()}"
+        self.server = SharedAudioServer(self.name)
+        self.client = SharedAudioClient(self.name)
+        self.reregister()
+
+    def reregister(self):
+        if sys.version_info < (3, 13):
+            # Attaching unregistered the block from this process's tracker, which also owns the server
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self.server.shm._name, "shared_memory")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_round_trip(self):
+        self.assertTrue(analyzer_running(self.name))
+        self.reregister()
+        self.assertEqual(self.client.frame.seq, 0) # Nothing published yet
+        self.server.heartbeat("CONNECTED", "Mic", 3)
+        self.server.write(make_frame(5, 2.0))
+        frame = self.client.frame
+        self.assertEqual((frame.seq, frame.timestamp, frame.sample_rate, frame.beat_count), (5, 15.0, 48000, 2))
+        self.assertEqual((frame.is_beat, frame.bpm, frame.freq_layout), (False, 120.0, "log"))
+        np.testing.assert_array_equal(frame.raw_fft_right, np.full(1024, 4.0))
+        np.testing.assert_array_equal(frame.raw_pcm_left, np.full(2048, -3.0))
+        self.assertIs(self.client.frame, frame) # Cached until the next publish
+        self.assertEqual((self.client.status, self.client.connected_device, self.client.overflow_count),
+                         ("SHARED CONNECTED", "Mic", 3))
+
+    def test_held_frame_survives_slot_reuse(self):
+        self.server.write(make_frame(1, 1.0))
+        held = self.client.frame
+        for seq in range(2, 2 + N_SLOTS): # Wraps the ring: slot 1 is rewritten
+            self.server.write(make_frame(seq, float(seq)))
+        np.testing.assert_array_equal(held.raw_fft, np.full(1024, 1.0))
+        np.testing.assert_array_equal(held.raw_pcm, np.full(2048, -1.0))
+        self.assertEqual(self.client.frame.seq, 1 + N_SLOTS)
+
+    def test_slot_being_written_is_skipped(self):
+        self.server.write(make_frame(1, 1.0))
+        first = self.client.frame
+        self.server.write(make_frame(2, 2.0))
+        self.server.slots[2 % N_SLOTS]['seq'] = -1 # Writer is mid-update
+        self.assertIs(self.client.frame, first)
+        self.server.slots[2 % N_SLOTS]['seq'] = 2
+        self.assertEqual(self.client.frame.seq, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+import wave
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from audio_engine import AudioPump, AudioRing
+from audio_sources import FileSource, PipeSource, SyntheticSource, create_source
+
+def drain(source, hop=512, limit=100):
+    """Everything a source writes into a fresh ring, as (frames, channels)."""
+    ring = AudioRing(1 << 16, source.channels)
+    source.open(ring)
+    for _ in range(limit):
+        if not source.fill(hop): break
+    return ring.window(ring.written).copy()
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestAudioSources(unittest.TestCase):
+    def test_file_source_wav_and_raw(self):
+        pcm = (np.arange(1000, dtype=np.int16) * 30).reshape(500, 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tone.wav")
+            with wave.open(path, "wb") as w:
+                w.setnchannels(2)
+                w.setsampwidth(2)
+                w.setframerate(22050)
+                w.writeframes(pcm.tobytes())
+            src = FileSource(path, realtime=False)
+            self.assertEqual((src.sample_rate, src.channels, src.frames), (22050, 2, 500))
+            np.testing.assert_allclose(drain(src, hop=128), pcm / 32768.0)
+
+            raw = os.path.join(tmp, "tone.f32")
+            np.linspace(-1, 1, 300, dtype='<f4').tofile(raw)
+            src = FileSource(raw, loop=True, realtime=False, channels=1)
+            out = drain(src, hop=100, limit=5) # Loops back to the start after three hops
+            self.assertEqual(len(out), 500)
+            np.testing.assert_array_equal(out[300:, 0], out[:200, 0])
+
+    def test_pipe_source(self):
+        data = np.arange(2 * 700, dtype='<f4').reshape(700, 2)
+        src = PipeSource(io.BytesIO(data.tobytes()))
+        np.testing.assert_array_equal(drain(src, hop=512), data) # Short last block, then EOF
+
+    def test_synthetic_source_is_deterministic(self):
+        a = drain(SyntheticSource("noise", realtime=False, seed=7), limit=4)
+        b = drain(SyntheticSource("noise", realtime=False, seed=7), limit=4)
+        np.testing.assert_array_equal(a, b)
+        self.assertEqual(a.shape, (2048, 2))
+        self.assertRaises(ValueError, SyntheticSource, "square")
+        self.assertIsInstance(create_source("synth:sine", realtime=False), SyntheticSource)
+
+    def test_fast_clicks_track_beats(self):
+        # 12 s of a 120 BPM click track, pumped as fast as it can be analysed
+        src = SyntheticSource("clicks", realtime=False, bpm=120.0)
+        pump = AudioPump(src)
+        start = time.monotonic()
+        pump._run_source(src, lambda: src.t < 12 * src.sample_rate)
+        self.assertGreaterEqual(pump._beat_count, 22)
+        self.assertLessEqual(pump._beat_count, 25)
+        self.assertAlmostEqual(pump._beat_tracker.bpm, 120.0, delta=2.0)
+        # Frames are timed by sample position, not by when they were pumped
+        self.assertAlmostEqual(pump.frame.timestamp - start, 12.0, delta=0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from beat import BeatTracker
+
+SR, HOP, BINS = 44100, 512, 1024
+
+def click_track(bpm, seconds, seed=0):
+    """(time, dB spectrum) per hop: a quiet noise floor with a decaying broadband click on every beat."""
+    rng = np.random.default_rng(seed)
+    rate = SR / HOP
+    period = 60.0 / bpm
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        since = t % period
+        spec = -60.0 + rng.standard_normal(BINS).astype(np.float32)
+        spec += 40.0 * np.exp(-since / 0.03)
+        yield 1.0 + t, spec
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestBeatTracker(unittest.TestCase):
+    def track(self, bpm, seconds):
+        tracker = BeatTracker(SR, HOP, BINS)
+        beats = []
+        for t, spec in click_track(bpm, seconds):
+            if tracker.process(spec, t): beats.append(t)
+        return tracker, beats
+
+    def test_tempo_and_beat_count(self):
+        for bpm in (60.0, 90.0, 120.0, 150.0):
+            tracker, beats = self.track(bpm, 10.0)
+            self.assertAlmostEqual(tracker.bpm, bpm, delta=2.0)
+            self.assertLessEqual(abs(len(beats) - int(10.0 * bpm / 60.0)), 1)
+            # Once the threshold statistics have settled, every click and nothing else
+            settled = np.array(beats)[np.array(beats) > 3.0]
+            np.testing.assert_allclose(np.diff(settled), 60.0 / bpm, atol=2 * HOP / SR) # Within two hops
+
+    def test_octave_resolved_towards_prior(self):
+        tracker, _ = self.track(190.0, 10.0)
+        self.assertAlmostEqual(tracker.bpm, 95.0, delta=2.0) # Half time is nearer PRIOR_BPM
+
+    def test_phase_follows_the_grid(self):
+        tracker = BeatTracker(SR, HOP, BINS)
+        phases = []
+        for t, spec in click_track(120.0, 8.0):
+            tracker.process(spec, t)
+            if t >= 7.0: phases.append(((t - 1.0) % 0.5 / 0.5, tracker.beat_phase))
+        grid, phase = np.array(phases).T
+        # Phase rises with the click grid (modulo one beat), a hop or two behind at most
+        err = (phase - grid + 0.5) % 1.0 - 0.5
+        self.assertLess(np.abs(err).max(), 0.05)
+        # The predicted next beat is on the click grid too
+        self.assertLess(abs(((tracker.next_beat_time - 1.0) / 0.5 + 0.5) % 1.0 - 0.5), 0.05)
+
+    def test_silence_has_no_beats(self):
+        tracker = BeatTracker(SR, HOP, BINS)
+        spec = np.full(BINS, -90.0, dtype=np.float32)
+        for i in range(500):
+            self.assertFalse(tracker.process(spec, 1.0 + i * HOP / SR))
+        self.assertEqual((tracker.bpm, tracker.beat_phase), (0.0, 0.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+from effects.base import BaseEffect
+
+class TestBeatTrigger(unittest.TestCase):
+    def run_frames(self, effect, bpm, n=60):
+        """Frames at 30 fps on a 120 BPM grid (15 frames per beat); returns the frames on_beat fired on."""
+        fired = []
+        for i in range(n):
+            phase = (i % 15) / 15.0
+            audio = SimpleNamespace(bpm=bpm, beat_phase=phase if bpm else 0.0, is_beat=i % 15 == 0)
+            if effect.on_beat({'fps': 30}, audio): fired.append(i)
+        return fired
+
+    def test_predicted_beat_only_while_tempo_locked(self):
+        # The first beat as detected, then one frame ahead of every detected beat, never also on the detected one
+        self.assertEqual(self.run_frames(BaseEffect(), 120.0), [0, 14, 29, 44, 59])
+
+    def test_jittered_detections(self):
+        # Detections up to two frames off the grid reset the phase, as BeatTracker does
+        random.seed(1)
+        for step in (1, 2): # Rendering at 'fps', and at half of it
+            effect, fired, phase = BaseEffect(), [], 0.0
+            beats = [0] + [b * 15 + random.randint(-2, 2) for b in range(1, 21)]
+            for i in range(beats[-1] + 8):
+                is_beat = i in beats
+                phase = 0.0 if is_beat else (phase + 1 / 15.0) % 1.0
+                if i % step: continue # Frame not rendered; a detection on it is missed
+                audio = SimpleNamespace(bpm=120.0, beat_phase=phase, is_beat=is_beat)
+                if effect.on_beat({'fps': 30}, audio): fired.append(i)
+            self.assertEqual(len(fired), len(beats), step)
+            self.assertGreaterEqual(min(b - a for a, b in zip(fired, fired[1:])), 8, step) # Once per beat
+
+    def test_early_detection_is_not_lost(self):
+        effect = BaseEffect()
+        fired = [effect.on_beat({'fps': 30}, SimpleNamespace(bpm=120.0, beat_phase=p, is_beat=b))
+                 for p, b in ((0.85, False), (0.92, False), (0.02, True), (0.09, False))]
+        self.assertEqual(fired, [False, False, True, False])
+
+    def test_detected_beat_without_tempo(self):
+        self.assertEqual(self.run_frames(BaseEffect(), 0.0), [0, 15, 30, 45])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import filterbank
+from filterbank import BandMapper, SCALES, _to_scale, get_band_mapper
+
+SR, BINS = 44100, 1024
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestBandMapper(unittest.TestCase):
+    def test_tone_lands_in_its_band_on_every_scale(self):
+        bin_hz = SR / 2.0 / BINS
+        for scale in SCALES:
+            mapper = BandMapper(16, SR, BINS, scale, "max")
+            lo = _to_scale(0.0 if scale == "linear" else filterbank.MIN_FREQ, scale)
+            hi = _to_scale(filterbank.MAX_FREQ, scale)
+            for f in (300.0, 1000.0, 4000.0, 12000.0):
+                k = int(round(f / bin_hz))
+                spec = np.full(BINS, -100.0)
+                spec[k] = 0.0
+                # Edges are evenly spaced in scale units
+                expected = int((_to_scale(k * bin_hz, scale) - lo) / (hi - lo) * 16)
+                self.assertEqual(int(np.argmax(mapper.apply(spec))), expected, (scale, f))
+
+    def test_max_and_mean(self):
+        spec = np.arange(16, dtype=np.float32) # dB rising by one per bin
+        hi = BandMapper(4, 8000, 16, "linear", "max").apply(spec) # 250 Hz bins, four bins per band
+        lo = BandMapper(4, 8000, 16, "linear", "mean").apply(spec)
+        np.testing.assert_allclose(hi[:3], [3, 7, 11])
+        np.testing.assert_allclose(lo[:3], [1.5, 5.5, 9.5])
+
+    def test_sub_bin_low_bands_are_never_empty(self):
+        # 128 log bands over 1024 bins: the lowest bands are narrower than a bin
+        spec = np.linspace(-60.0, 0.0, BINS)
+        for agg in ("max", "mean"):
+            mapper = BandMapper(128, SR, BINS, "log", agg)
+            out = mapper.apply(spec)
+            self.assertTrue(np.all(np.isfinite(out)))
+            step = spec[1] - spec[0] # Box means are bin aligned, so neighbours may differ by up to a bin
+            self.assertTrue(np.all(np.diff(out) >= -step), agg) # A rising spectrum stays rising
+        np.testing.assert_allclose(mapper.weights.sum(axis=0), 1.0, rtol=1e-5) # Every band has weight
+        self.assertTrue(np.any(np.diff(mapper.starts) == 0)) # ... including bands inside one bin
+
+    def test_stacked_input(self):
+        rng = np.random.default_rng(0)
+        stereo = rng.uniform(-80, 0, (2, BINS)).astype(np.float32)
+        for agg in ("max", "mean"):
+            mapper = BandMapper(40, SR, BINS, "mel", agg)
+            both = mapper.apply(stereo)
+            self.assertEqual(both.shape, (2, 40))
+            np.testing.assert_allclose(both[1], mapper.apply(stereo[1]), rtol=1e-5)
+
+    def test_mapper_cache(self):
+        a = get_band_mapper(32, SR, BINS, "bark", "mean")
+        self.assertIs(get_band_mapper(32, SR, BINS, "bark", "mean"), a)
+        self.assertIsNot(get_band_mapper(32, SR, BINS, "bark", "max"), a)
+        self.assertEqual(get_band_mapper(32, SR, BINS, "log", "max", "log").layout, "log")
+        for n in range(40): get_band_mapper(n + 1, SR, BINS)
+        self.assertLessEqual(len(filterbank._MAPPER_CACHE), 33) # Bounded
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from framebuffer import FrameBuffer, logical_size, scale_map
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestFrameBuffer(unittest.TestCase):
+    def test_text_is_clipped(self):
+        fb = FrameBuffer(5, 2)
+        fb.text(0, 3, "abc", (1, 2, 3))
+        self.assertEqual(fb.chars[0].tobytes().decode('utf-32-le'), "   ab")
+        self.assertEqual(fb.fg[0, 4].tolist(), [1, 2, 3])
+        fb.text(1, -2, "xyz", (0, 0, 0))
+        self.assertEqual(fb.chars[1].tobytes().decode('utf-32-le'), "z    ")
+
+    def test_legacy_view_writes_through(self):
+        fb = FrameBuffer(4, 3)
+        buf, cbf = fb.legacy_view()
+        self.assertEqual((len(buf), len(buf[0])), (3, 4))
+        buf[2][1] = "█"
+        cbf[2][1] = ((300, 128, -5), (0, 0, 9)) # Out of range values are clamped
+        self.assertEqual(chr(fb.chars[2, 1]), "█")
+        self.assertEqual(fb.fg[2, 1].tolist(), [255, 128, 0])
+        self.assertEqual(cbf[2][1], ((255, 128, 0), (0, 0, 9)))
+
+    def test_resize_keeps_planes_when_unchanged(self):
+        fb = FrameBuffer(4, 3)
+        chars = fb.chars
+        self.assertFalse(fb.resize(4, 3))
+        self.assertIs(fb.chars, chars)
+        self.assertTrue(fb.resize(5, 3))
+        self.assertEqual(fb.bg.shape, (3, 5, 3))
+
+    def test_logical_size_and_scale_map(self):
+        self.assertEqual(logical_size(200, 50), (200, 50))
+        self.assertEqual(logical_size(200, 50, max_cells=2500), (100, 25))
+        self.assertEqual(logical_size(200, 50, fixed_w=80, fixed_h=80), (80, 50))
+        m = scale_map(5, 2, 2, 1)
+        self.assertIs(m, scale_map(5, 2, 2, 1))
+        fb = FrameBuffer(2, 1)
+        fb.text(0, 0, "ab", (1, 2, 3))
+        up = m.apply(fb.chars)
+        self.assertEqual([r.tobytes().decode('utf-32-le') for r in up], ["aaabb", "aaabb"])
+        self.assertEqual(m.apply(fb.fg).shape, (2, 5, 3))
+
+if __name__ == '__main__':
+    unittest.main()
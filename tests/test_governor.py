@@ -0,0 +1,44 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from governor import QualityGovernor
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestQualityGovernor(unittest.TestCase):
+    def run_frames(self, gov, n, frame_time, t):
+        """Feed n frames at 30 fps, each taking frame_time."""
+        for _ in range(n):
+            t += 1.0 / 30
+            gov.update(frame_time, 30, t)
+        return t
+
+    def test_steps_down_under_load_and_recovers(self):
+        gov = QualityGovernor()
+        gov.checked = gov.calm_since = 0.0
+        t = self.run_frames(gov, 32, 0.05, 0.0) # 50 ms frames at a 33 ms budget: one step per check
+        self.assertEqual(gov.level, 2)
+        self.assertEqual(gov.name, "life")
+        t = self.run_frames(gov, 30, 0.025, t) # Within budget, but without headroom: hold
+        self.assertEqual(gov.level, 2)
+        t = self.run_frames(gov, 180, 0.005, t) # Slow frames leave the window, then RECOVER_SEC of headroom
+        self.assertEqual(gov.level, 1)
+
+    def test_apply_cuts(self):
+        gov = QualityGovernor()
+        state = {'img_fg_on': True, 'color_depth': 'auto'}
+        self.assertIs(gov.apply(state), state)
+        gov.level = 3
+        cut = gov.apply(state)
+        self.assertEqual((cut['star_density'], cut['life_every'], cut['img_fg_on']), (0.5, 6, False))
+        self.assertNotIn('render_scale', cut)
+        self.assertTrue(state['img_fg_on']) # Settings are left alone
+        gov.level = 5
+        self.assertEqual(gov.apply(state)['color_depth'], '256')
+        self.assertEqual(gov.apply(dict(state, color_depth='16'))['color_depth'], '16')
+
+if __name__ == '__main__':
+    unittest.main()
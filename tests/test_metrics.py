@@ -0,0 +1,64 @@
+import os
+import socket
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from metrics import MetricsExporter, fetch, parse_endpoint, parse_prometheus
+
+def fake_engine():
+    from ansi import Backpressure
+    from governor import QualityGovernor
+    from profiler import StageProfiler
+    renderer = SimpleNamespace(frames_generated=120, frames_presented=110, frames_dropped=10, generated_fps=30.0,
+                               presented_fps=27.5, bytes_written=4096, output_rate=2.5e6,
+                               backpressure=Backpressure(), governor=QualityGovernor(), profiler=StageProfiler())
+    renderer.governor.level = 2
+    renderer.profiler.add("bars", 2000000)
+    audio = SimpleNamespace(frame=SimpleNamespace(seq=42), status="CONNECTED", overflow_count=3,
+                            reconnect_count=1, analysis_time=0.0005, analysis_latency=0.012)
+    return renderer, audio
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestMetricsExporter(unittest.TestCase):
+    def test_page_and_snapshot(self):
+        exporter = MetricsExporter(*fake_engine())
+        page = exporter.prometheus()
+        self.assertIn("# TYPE pyviz_frames_dropped_total counter", page)
+        m = parse_prometheus(page)
+        self.assertEqual(m['pyviz_frames_dropped_total'], 10)
+        self.assertEqual(m['pyviz_audio_overflows_total'], 3)
+        self.assertEqual(m['pyviz_quality_level'], 2)
+        self.assertEqual(m['pyviz_output_bytes_per_second'], 2.5e6)
+        self.assertEqual(m['pyviz_audio_connected'], 1)
+        self.assertAlmostEqual(m['pyviz_stage_seconds{percentile="95",stage="bars"}'], 0.002)
+        self.assertEqual(exporter.snapshot()['pyviz_audio_frames_total'], 42)
+
+    def test_endpoints(self):
+        self.assertIsNone(parse_endpoint(""))
+        self.assertEqual(parse_endpoint("9464"), (socket.AF_INET, ("127.0.0.1", 9464)))
+        with self.assertRaises(OSError): fetch("localhost:nine")
+        exporter = MetricsExporter(*fake_engine())
+        try:
+            self.assertTrue(exporter.serve("127.0.0.1:0"))
+            port = exporter.server.server_address[1]
+            self.assertEqual(fetch(f"127.0.0.1:{port}")['pyviz_presented_fps'], 27.5)
+        finally:
+            exporter.close()
+        if hasattr(socket, "AF_UNIX"):
+            path = os.path.join(tempfile.mkdtemp(), "metrics.sock")
+            exporter = MetricsExporter(*fake_engine())
+            try:
+                self.assertTrue(exporter.serve("unix:" + path))
+                self.assertEqual(fetch("unix:" + path)['pyviz_frames_generated_total'], 120)
+            finally:
+                exporter.close()
+            self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
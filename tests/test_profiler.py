@@ -0,0 +1,33 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from profiler import StageProfiler
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestStageProfiler(unittest.TestCase):
+    def test_percentiles_over_rolling_window(self):
+        prof = StageProfiler()
+        for i in range(prof.WINDOW + 100):
+            prof.add("bars", 1000000 if i < 100 else (i % 100 + 1) * 10000) # The first 100 (1 ms) roll out
+        p50, p95, p99 = prof.percentiles("bars")
+        self.assertAlmostEqual(p50, 0.505, places=2)
+        self.assertAlmostEqual(p95, 0.95, places=2)
+        self.assertLess(p99, 1.0)
+        self.assertEqual(prof.percentiles("missing"), (0.0, 0.0, 0.0))
+
+    def test_laps_summary_and_hud(self):
+        prof = StageProfiler()
+        prof.start()
+        prof.lap("state")
+        prof.skip()
+        prof.add("write", 5000000)
+        self.assertEqual([name for name, _, _ in prof.stats()], ["write", "state"]) # Slowest first
+        self.assertIn("write", prof.summary().splitlines()[1])
+        self.assertTrue(prof.hud_line(now=1.0).startswith("PROF p50/p95/p99 ms: write 5.0/5.0/5.0"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from framebuffer import FrameBuffer
+from subcell import PixelCanvas, mirror_braille, BRAILLE, UPPER_HALF, LOWER_HALF
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestSubcell(unittest.TestCase):
+    def test_braille_packing(self):
+        fb = FrameBuffer(2, 1)
+        canvas = PixelCanvas("braille")
+        canvas.begin(2, 1)
+        self.assertEqual((canvas.height, canvas.width), (4, 4))
+        canvas.plot([0, 3, 1], [0, 1, 3], [(200, 0, 0), (0, 0, 100), (9, 9, 9)])
+        canvas.compose(fb)
+        self.assertEqual(fb.chars[0].tolist(), [BRAILLE + 0x01 + 0x80, BRAILLE + 0x10])
+        self.assertEqual(fb.fg[0, 0].tolist(), [100, 0, 50]) # Mean of the cell's lit dots
+        mirror_braille(fb.chars[0])
+        self.assertEqual(fb.chars[0].tolist(), [BRAILLE + 0x08 + 0x40, BRAILLE + 0x02])
+
+    def test_half_blocks_keep_unlit_cells(self):
+        fb = FrameBuffer(3, 1)
+        fb.bg[...] = (1, 2, 3)
+        canvas = PixelCanvas("half")
+        canvas.begin(3, 1)
+        canvas.vspans(np.array([0, 1, 2]), np.array([1, 1, 2]), (0, 255, 0))
+        canvas.rgb[1, 0] = (0, 0, 255)
+        canvas.compose(fb)
+        self.assertEqual(fb.chars[0].tolist(), [UPPER_HALF, LOWER_HALF, 32])
+        self.assertEqual(fb.fg[0, 0].tolist(), [0, 255, 0])
+        self.assertEqual(fb.bg[0, 0].tolist(), [0, 0, 255]) # Both halves: bottom colour as background
+        self.assertEqual(fb.bg[0, 1].tolist(), [1, 2, 3])
+        self.assertEqual(fb.bg[0, 2].tolist(), [1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
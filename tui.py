@@ -9,16 +9,20 @@ import sys
 import shutil
 import subprocess
 import time
+from typing import Callable
 try:
     import psutil
 except ImportError:
     psutil = None
 
 from config import CONFIG_FILE, DEFAULT_STATE, THEMES, CHAR_SETS
+from metrics import fetch as fetch_metrics
 from logger import setup_logger
 
 logger = setup_logger("TUI")
 
+ANALYZER_WAIT_SEC = 2.0 # A shared engine launch waits this long for a starting analyzer
+
 # Extracted CSS for better readability
 MAIN_CSS = """
 Screen {
@@ -233,7 +237,9 @@ class PyVizController(App):
     """
     Main TUI Controller for PyViz.
     """
-    engine_process = None
+    analyzer_process = None
+    engine_cpu_mark = None # (time, process_cpu_seconds_total) of the last metrics scrape
+    cpu_scrape_busy = False # A metrics scrape is running on a worker thread
     CSS = MAIN_CSS
 
     TITLE = "PyViz Controller"
@@ -250,6 +256,13 @@ class PyVizController(App):
                         yield Label("Audio Source")
                         yield Select([], id="dev_select", prompt="Select Input Device", tooltip="Select the audio input device (requires restart if engine running)")
                         yield Button("Refresh Devices", id="refresh_dev", variant="primary", tooltip="Reload list of audio devices")
+                        yield Label("Capture Mode")
+                        yield Select([("Blocking", "blocking"), ("Callback (Low Latency)", "callback")], id="capture_select", tooltip="Blocking reads or PortAudio callback into a ring buffer")
+                        yield Label("Analysis")
+                        yield Select([("STFT", "stft"), ("Multi-Resolution (Bass Detail)", "multires")], id="analysis_select", tooltip="Single FFT window, or a long window for bass plus a short one for treble")
+                        with Horizontal(classes="control-row"):
+                            yield Label("Shared Analyzer", classes="control-label")
+                            yield Switch(value=False, id="shared_switch", tooltip="One background analyzer feeds every engine window (allows several engines)")
 
                     with Vertical(classes="box"):
                         yield Label("Preset Manager")
@@ -281,6 +294,12 @@ class PyVizController(App):
                         yield Label("Visual Style")
                         yield Select([("Char", "2"), ("Block", "1"), ("Line", "0")], id="style_select", tooltip="Rendering style (Characters, Solid Blocks, or Line)")
 
+                        yield Label("Sub-cell Resolution")
+                        yield Select([("Off", "off"), ("Half Blocks (1x2)", "half"), ("Braille (2x4)", "braille")], id="subcell_select", tooltip="Draw bars, scope and Lissajous on a finer pixel grid (needs a font with block / braille glyphs)")
+
+                        yield Label("Frequency Scale")
+                        yield Select([("Log", "log"), ("Mel", "mel"), ("Bark", "bark"), ("Linear", "linear")], id="freq_scale_select", tooltip="How FFT bins are grouped into bars")
+
                         yield Label("Character Preset")
                         char_opts = [(k, v) for k, v in CHAR_SETS.items()]
                         yield Select(char_opts, id="char_preset_select", prompt="Select Preset", tooltip="Select a predefined character set (Overwrites Bar Characters)")
@@ -358,6 +377,9 @@ class PyVizController(App):
                             yield Label("Flip", classes="control-label")
                             yield Switch(value=False, id="fg_img_flip")
 
+                        yield Label("Image Cache (MB)")
+                        yield Input(value="64", id="asset_cache_input", classes="adjust-input", tooltip="Memory budget for decoded images and GIF frames; least recently used ones are dropped first")
+
             # TAB 4: Effects (Global Physics, Glitch, FPS)
             with TabPane("Effects", id="tab_effects"):
                 with ScrollableContainer():
@@ -414,13 +436,38 @@ class PyVizController(App):
 
                         yield Label("Target FPS")
                         yield Input(value="30", id="fps_input", classes="adjust-input", tooltip="Target Frames Per Second (default 30)")
+                        yield Label("Output")
+                        yield Select([("Auto", "auto"), ("Raw ANSI (Fast)", "ansi"), ("Rich", "rich")], id="output_select", tooltip="Terminal output path of the engine")
+                        yield Label("Colour Depth")
+                        yield Select([("Auto (COLORTERM/TERM)", "auto"), ("Truecolor", "truecolor"), ("256 Colours", "256"), ("16 Colours", "16")], id="depth_select", tooltip="Colours the engine emits; fewer colours make much smaller frames")
+                        yield Label("Synchronized Output")
+                        yield Select([("Auto", "auto"), ("On", "on"), ("Off", "off")], id="sync_select", tooltip="Wrap each frame in DEC 2026 synchronized-update sequences to prevent tearing")
+                        yield Label("Max Output (bytes/s, 0 = unlimited)")
+                        yield Input(value="0", id="bandwidth_input", classes="adjust-input", tooltip="Cap on terminal output bandwidth, e.g. for SSH; the engine lowers colour depth and frame rate to fit")
+                        yield Label("Full Repaint Above")
+                        yield Input(value="0.5", id="repaint_input", classes="adjust-input", tooltip="Fraction of changed cells (0.0-1.0) above which the ANSI output repaints the whole screen instead of only changed cells")
+                        yield Label("Max Render Cells (0 = unlimited)")
+                        yield Input(value="12800", id="render_cells_input", classes="adjust-input", tooltip="Larger terminals are drawn at a lower resolution and stretched to fit, so the render cost stays bounded")
+                        yield Label("Render Width / Height (0 = terminal)")
+                        with Horizontal(classes="control-row"):
+                            yield Input(value="0", id="render_width_input", classes="adjust-input", tooltip="Fixed logical width in cells, stretched to the terminal")
+                            yield Input(value="0", id="render_height_input", classes="adjust-input", tooltip="Fixed logical height in cells, stretched to the terminal")
+                        with Horizontal(classes="control-row"):
+                            yield Label("Quality Governor", classes="control-label")
+                            yield Switch(value=True, id="governor_switch", tooltip="Hold the target FPS under load by thinning stars, slowing Life, dropping the FG texture, then lowering resolution and colours")
 
                     with Vertical(classes="box"):
                         yield Label("System Monitor")
                         with Horizontal(classes="control-row"):
                             yield Label("Show CPU", classes="control-label")
-                            yield Switch(value=False, id="cpu_switch")
+                            yield Switch(value=False, id="cpu_switch", tooltip="Engine CPU, frame rates, drops and audio overflows from its metrics endpoint; system CPU without one")
                         yield Static("CPU: --%", id="cpu_widget")
+                        yield Label("Metrics Endpoint (port, HOST:PORT or unix:PATH)")
+                        yield Input(value="", placeholder="off", id="metrics_input", tooltip="Prometheus-format metrics of the engine; applies to engines launched afterwards")
+                        with Horizontal(classes="control-row"):
+                            yield Label("Profiler HUD", classes="control-label")
+                            yield Switch(value=False, id="profile_hud_switch", tooltip="Second HUD line with the slowest render stages (p50/p95/p99 ms)")
+                        yield Button("Dump Profile to Log", id="profile_dump_btn", tooltip="Write per-stage frame timings of the running engine to pyviz.log")
 
             with TabPane("Text & AFK", id="tab_text"):
                 with ScrollableContainer():
@@ -470,13 +517,19 @@ class PyVizController(App):
         yield Footer()
 
     def on_unmount(self) -> None:
-        if self.engine_process:
+        for proc in self.engine_processes:
             try:
-                self.engine_process.terminate()
+                proc.terminate()
                 logger.info("Terminated engine subprocess on exit.")
             except: pass
+        if self.analyzer_process:
+            try:
+                self.analyzer_process.terminate()
+                logger.info("Terminated analyzer subprocess on exit.")
+            except: pass
 
     def on_mount(self) -> None:
+        self.engine_processes = [] # Every engine launched from here (Windows 'start' ones can't be tracked)
         self.load_state_from_file()
         self.refresh_devices()
         self.set_interval(2.0, self.update_cpu)
@@ -490,13 +543,52 @@ class PyVizController(App):
                     return
             except: return
 
-            if psutil:
-                cpu = psutil.cpu_percent()
-                self.query_one("#cpu_widget", Static).update(f"CPU: {cpu}%")
-            else:
-                self.query_one("#cpu_widget", Static).update("CPU: (psutil missing)")
+            endpoint = self.state.get('metrics_endpoint', '')
+            if endpoint:
+                # Scraped on a worker thread so a slow engine can't stall the UI; skip a tick while one is out
+                if not self.cpu_scrape_busy:
+                    self.cpu_scrape_busy = True
+                    self.run_worker(lambda: self.scrape_metrics(endpoint), thread=True, group="metrics", exit_on_error=False)
+                return
+            self.show_system_cpu(" (system)")
+        except: pass
+
+    def scrape_metrics(self, endpoint: str) -> None:
+        """Worker thread: one scrape of the engine's metrics, shown from the UI thread."""
+        try:
+            try: m = fetch_metrics(endpoint, timeout=0.3)
+            except OSError: m = None
+            self.call_from_thread(self.show_engine_metrics, m, time.monotonic())
+        except RuntimeError: pass # App shutting down
+        finally:
+            self.cpu_scrape_busy = False
+
+    def show_engine_metrics(self, m, now: float) -> None:
+        """The engine's own numbers, CPU as the rate of its process CPU time (m is None if unreachable)."""
+        try:
+            if m is None:
+                self.engine_cpu_mark = None
+                self.show_system_cpu(" (system, engine metrics unreachable)")
+                return
+            cpu_s = m.get('process_cpu_seconds_total', 0.0)
+            last, self.engine_cpu_mark = self.engine_cpu_mark, (now, cpu_s)
+            cpu = "--"
+            if last is not None and now > last[0] and cpu_s >= last[1]:
+                cpu = f"{100 * (cpu_s - last[1]) / (now - last[0]):.0f}"
+            self.query_one("#cpu_widget", Static).update(
+                f"ENGINE CPU: {cpu}% | FPS: {m.get('pyviz_presented_fps', 0):.0f}/{m.get('pyviz_generated_fps', 0):.0f}"
+                f" | DROP: {m.get('pyviz_frames_dropped_total', 0):.0f} | XRUN: {m.get('pyviz_audio_overflows_total', 0):.0f}"
+                f" | LOAD: -{m.get('pyviz_quality_level', 0):.0f}")
         except: pass
 
+    def show_system_cpu(self, suffix: str) -> None:
+        widget = self.query_one("#cpu_widget", Static)
+        if psutil:
+            cpu = psutil.cpu_percent()
+            widget.update(f"CPU: {cpu}%{suffix}")
+        else:
+            widget.update("CPU: (psutil missing)")
+
     def update_theme_preview(self, theme_name: str):
         try:
             theme = THEMES.get(theme_name, THEMES['Vaporeon'])
@@ -541,6 +633,9 @@ class PyVizController(App):
         theme_sel = self.query_one("#theme_select", Select)
         theme_sel.value = self.state.get('theme_name', 'Vaporeon')
         self.update_theme_preview(self.state.get('theme_name', 'Vaporeon'))
+        self.query_one("#capture_select", Select).value = self.state.get('capture_mode', 'blocking')
+        self.query_one("#analysis_select", Select).value = self.state.get('analysis_mode', 'stft')
+        self.query_one("#shared_switch", Switch).value = self.state.get('shared_analyzer', False)
 
         # Restore UI Theme (if we saved it, or just default)
         ui_theme = self.state.get('ui_theme', 'Default')
@@ -551,6 +646,8 @@ class PyVizController(App):
         # Visuals
         style_val = str(self.state.get('style', 2))
         self.query_one("#style_select", Select).value = style_val
+        self.query_one("#subcell_select", Select).value = self.state.get('subcell_mode', 'off')
+        self.query_one("#freq_scale_select", Select).value = self.state.get('freq_scale', 'log')
         self.query_one("#bar_chars_input", Input).value = self.state.get('bar_chars', "  ▂▃▄▅▆▇█")
         self.query_one("#stars_switch", Switch).value = self.state.get('stars', True)
         self.query_one("#peaks_switch", Switch).value = self.state.get('peaks_on', True)
@@ -574,6 +671,17 @@ class PyVizController(App):
         self.query_one("#lissajous_switch", Switch).value = self.state.get('lissajous_mode', False)
         self.query_one("#life_switch", Switch).value = self.state.get('life_mode', False)
         self.query_one("#fps_input", Input).value = str(self.state.get('fps', 30))
+        self.query_one("#output_select", Select).value = self.state.get('output_backend', 'auto')
+        self.query_one("#depth_select", Select).value = self.state.get('color_depth', 'auto')
+        self.query_one("#sync_select", Select).value = self.state.get('sync_output', 'auto')
+        self.query_one("#bandwidth_input", Input).value = str(self.state.get('max_bandwidth', 0))
+        self.query_one("#repaint_input", Input).value = str(self.state.get('repaint_threshold', 0.5))
+        self.query_one("#render_cells_input", Input).value = str(self.state.get('render_max_cells', 12800))
+        self.query_one("#render_width_input", Input).value = str(self.state.get('render_width', 0))
+        self.query_one("#render_height_input", Input).value = str(self.state.get('render_height', 0))
+        self.query_one("#governor_switch", Switch).value = self.state.get('quality_governor', True)
+        self.query_one("#profile_hud_switch", Switch).value = self.state.get('profile_hud', False)
+        self.query_one("#metrics_input", Input).value = self.state.get('metrics_endpoint', '')
 
         # Images
         self.query_one("#bg_img_path", Input).value = self.state.get('img_bg_path', '')
@@ -587,6 +695,7 @@ class PyVizController(App):
         self.query_one("#fg_img_path", Input).value = self.state.get('img_fg_path', '')
         self.query_one("#fg_img_switch", Switch).value = self.state.get('img_fg_on', False)
         self.query_one("#fg_img_flip", Switch).value = self.state.get('img_fg_flip', False)
+        self.query_one("#asset_cache_input", Input).value = str(self.state.get('asset_cache_mb', 64))
 
         # Text
         self.query_one("#text_input", Input).value = self.state.get('text_str', '')
@@ -677,6 +786,11 @@ class PyVizController(App):
             self.push_screen(LoadPresetScreen(), self.load_preset)
         elif bid == "help_btn":
             self.push_screen(HelpScreen())
+        elif bid == "profile_dump_btn":
+            # The engine dumps whenever this counter changes
+            self.state['profile_dump'] = self.state.get('profile_dump', 0) + 1
+            self.save_state()
+            self.debug("Requested a frame profile dump (pyviz.log).")
         elif bid == "img_thresh_up":
             self.state['img_thresh'] = round(min(0.95, self.state.get('img_thresh', 0.05) + 0.05), 2)
             self.query_one("#img_thresh_input", Input).value = str(self.state['img_thresh'])
@@ -759,8 +873,22 @@ class PyVizController(App):
             self.update_theme_preview(str(val))
         elif sid == "dev_select":
             self.state['dev_name'] = str(val)
+        elif sid == "capture_select":
+            self.state['capture_mode'] = str(val)
+        elif sid == "analysis_select":
+            self.state['analysis_mode'] = str(val)
+        elif sid == "output_select":
+            self.state['output_backend'] = str(val)
+        elif sid == "depth_select":
+            self.state['color_depth'] = str(val)
+        elif sid == "sync_select":
+            self.state['sync_output'] = str(val)
         elif sid == "style_select":
             self.state['style'] = int(val)
+        elif sid == "subcell_select":
+            self.state['subcell_mode'] = str(val)
+        elif sid == "freq_scale_select":
+            self.state['freq_scale'] = str(val)
         elif sid == "font_select":
             self.state['text_font'] = str(val)
         elif sid == "char_preset_select":
@@ -834,6 +962,26 @@ class PyVizController(App):
         elif iid == "fps_input":
             try: self.state['fps'] = int(val)
             except: pass
+        elif iid == "bandwidth_input":
+            try: self.state['max_bandwidth'] = max(0, int(val))
+            except: pass
+        elif iid == "repaint_input":
+            try: self.state['repaint_threshold'] = min(1.0, max(0.0, float(val)))
+            except: pass
+        elif iid == "render_cells_input":
+            try: self.state['render_max_cells'] = max(0, int(val))
+            except: pass
+        elif iid == "render_width_input":
+            try: self.state['render_width'] = max(0, int(val))
+            except: pass
+        elif iid == "render_height_input":
+            try: self.state['render_height'] = max(0, int(val))
+            except: pass
+        elif iid == "metrics_input":
+            self.state['metrics_endpoint'] = val.strip()
+        elif iid == "asset_cache_input":
+            try: self.state['asset_cache_mb'] = max(1, int(val))
+            except: pass
         elif iid == "img_thresh_input":
             try: self.state['img_thresh'] = float(val)
             except: pass
@@ -858,10 +1006,13 @@ class PyVizController(App):
         elif sid == "scope_switch": self.state['scope_mode'] = val
         elif sid == "lissajous_switch": self.state['lissajous_mode'] = val
         elif sid == "life_switch": self.state['life_mode'] = val
+        elif sid == "governor_switch": self.state['quality_governor'] = val
+        elif sid == "profile_hud_switch": self.state['profile_hud'] = val
         elif sid == "bg_img_switch": self.state['img_bg_on'] = val
         elif sid == "bg_img_flip": self.state['img_bg_flip'] = val
         elif sid == "fg_img_switch": self.state['img_fg_on'] = val
         elif sid == "fg_img_flip": self.state['img_fg_flip'] = val
+        elif sid == "shared_switch": self.state['shared_analyzer'] = val
 
         self.save_state()
 
@@ -887,23 +1038,67 @@ class PyVizController(App):
             self.debug(f"Device Error: {e}")
             self.query_one("#dev_select", Select).set_options([("Error loading devices", "error")])
 
+    def ensure_analyzer(self, py_exe: str, cmd_path: str, then: Callable[[], None]) -> None:
+        """
+        Start the shared audio analyzer unless one is already publishing, then call
+        `then` once it is up (at most ANALYZER_WAIT_SEC later). Polled from timers,
+        so the UI keeps running while the analyzer starts.
+        """
+        from audio_share import analyzer_running
+        if analyzer_running():
+            self.debug("Reusing running shared analyzer.")
+            then()
+            return
+        if not (self.analyzer_process and self.analyzer_process.poll() is None): # Else started by us, still coming up
+            cmd = [py_exe, cmd_path, '--analyzer']
+            logger.info(f"Starting shared analyzer: {cmd}")
+            self.analyzer_process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.debug("Starting shared analyzer...")
+
+        # Wait briefly so the first engine attaches instead of falling back to local audio
+        deadline = time.monotonic() + ANALYZER_WAIT_SEC
+        def poll():
+            if analyzer_running():
+                self.debug("Started shared analyzer.")
+                then()
+            elif time.monotonic() >= deadline:
+                self.debug("Shared analyzer not up yet; the engine may fall back to local audio.")
+                then()
+            else:
+                self.set_timer(0.1, poll)
+        self.set_timer(0.1, poll)
+
     def launch_engine(self):
         cmd_path = os.path.abspath("pyviz.py") # Assume in same dir
         py_exe = sys.executable
+        shared = bool(self.state.get('shared_analyzer', False))
+        engine_args = ['--engine', '--shared'] if shared else ['--engine']
 
-        try:
-            # Check if previous exists
-            if self.engine_process:
-                if self.engine_process.poll() is None:
-                    self.notify("Engine already running!", severity="warning")
-                    return
+        # Forget engines that have exited; several may share one analyzer, otherwise only one runs
+        self.engine_processes = [p for p in self.engine_processes if p.poll() is None]
+        if self.engine_processes and not shared:
+            self.notify("Engine already running!", severity="warning")
+            return
 
+        if shared:
+            try:
+                self.ensure_analyzer(py_exe, cmd_path, lambda: self.start_engine(py_exe, cmd_path, engine_args))
+            except Exception as e:
+                logger.error(f"Failed to start analyzer: {e}", exc_info=True)
+                self.notify(f"Launch Error: {str(e)}", severity="error")
+                self.debug(f"Launch Failed: {e}")
+        else:
+            self.start_engine(py_exe, cmd_path, engine_args)
+
+    def start_engine(self, py_exe: str, cmd_path: str, engine_args: list) -> None:
+        engine_flags = " ".join(engine_args)
+        try:
             if os.name == 'nt':
                  # Windows: start requires a title as the first quoted argument.
                  # cmd /k needs the entire command to be wrapped in quotes if it contains quotes
                  # to prevent it from stripping the first and last quote incorrectly.
                  # We wrap the command in outer quotes with spaces to ensure cmd processing preserves the inner quotes.
-                 cmd_str = f'start "PyViz Engine" cmd /k " "{py_exe}" "{cmd_path}" --engine "'
+                 cmd_str = f'start "PyViz Engine" cmd /k " "{py_exe}" "{cmd_path}" {engine_flags} "'
                  logger.info(f"Launching on Windows with command: {cmd_str}")
                  self.debug("Launching on Windows...")
                  # For Windows 'start', we can't track the PID easily because 'start' exits immediately.
@@ -915,25 +1110,25 @@ class PyVizController(App):
                  for t in terminals:
                      if shutil.which(t):
                          if t == 'gnome-terminal':
-                             term_cmd = [t, '--', py_exe, cmd_path, '--engine']
+                             term_cmd = [t, '--', py_exe, cmd_path] + engine_args
                          elif t == 'x-terminal-emulator' or t == 'xterm':
                              # Ensure paths with spaces are quoted
-                             term_cmd = [t, '-e', f'"{py_exe}" "{cmd_path}" --engine']
+                             term_cmd = [t, '-e', f'"{py_exe}" "{cmd_path}" {engine_flags}']
                          elif t == 'konsole':
-                              term_cmd = [t, '-e', py_exe, cmd_path, '--engine']
+                              term_cmd = [t, '-e', py_exe, cmd_path] + engine_args
                          break
 
                  if term_cmd:
                      logger.info(f"Launching on Linux/Mac with terminal command: {term_cmd}")
                      self.debug(f"Launching in terminal: {t}")
                      # If we launch a terminal, that terminal is the child.
-                     self.engine_process = subprocess.Popen(term_cmd)
+                     self.engine_processes.append(subprocess.Popen(term_cmd))
                  else:
                      self.notify("No terminal found. Running in background.", severity="warning")
-                     bg_cmd = [py_exe, cmd_path, '--engine']
+                     bg_cmd = [py_exe, cmd_path] + engine_args
                      logger.info(f"Launching in background (no terminal found): {bg_cmd}")
                      self.debug("Launching in background (headless)...")
-                     self.engine_process = subprocess.Popen(bg_cmd)
+                     self.engine_processes.append(subprocess.Popen(bg_cmd))
         except Exception as e:
             logger.error(f"Failed to launch engine: {e}", exc_info=True)
             self.notify(f"Launch Error: {str(e)}", severity="error")